@@ -13,17 +13,17 @@ import json
 import os
 
 from dotenv import load_dotenv
-from flask import Flask
+from flask import Flask, Response
 from flask_restful import request, Api, Resource
 
-from modules.common import conf, log
+from modules.common import conf, context, log
 
 load_dotenv(verbose=True)
 
 conf.load()
 
 from modules.chatbot import chat, user
-from modules.common import security, cache
+from modules.common import security, cache, metrics, prewarm, render_cache, trace
 
 # 디버그용
 debugging = False
@@ -35,18 +35,35 @@ today_date = 14
 
 # 초기화
 log.init()
+prewarm.start()
 
 
 # 요청코드 생성
+# 요청코드는 요청 컨텍스트에 보관되므로 동시에 처리되는 다른 요청과 섞이지 않음
+# 로그에는 자동으로 요청코드가 붙음
 def request_id(original_fn):
     def wrapper_fn(*args, **kwargs):
-        global req_id
         # Test ID 있으면 Test ID 사용
-        if test_id:
-            req_id = test_id
-        else:
-            req_id = security.generate_req_id()
-        return original_fn(*args, **kwargs)
+        endpoint = request.url_rule.rule if request.url_rule else ""
+        with context.request(test_id or security.generate_req_id()):
+            try:
+                with trace.span("%s %s" % (request.method, endpoint)):
+                    return original_fn(*args, **kwargs)
+            finally:
+                metrics.observe(
+                    "hdmeal_request_duration_seconds",
+                    context.elapsed(),
+                    endpoint=endpoint,
+                    intent=context.get("intent", ""),
+                )
+                log.info(
+                    "request_id@application.py: Finished in %.1fms %s",
+                    context.elapsed() * 1000,
+                    {
+                        name: round(spent * 1000, 1)
+                        for name, spent in context.timings().items()
+                    },
+                )
 
     return wrapper_fn
 
@@ -56,7 +73,7 @@ def request_id(original_fn):
 def auth(original_fn):
     def wrapper_fn(*args, **kwargs):
         if test_id:
-            log.info("[#%s] Bypassing Authorization")
+            log.info("Bypassing Authorization")
             return original_fn(*args, **kwargs)
         else:
             # 요청 헤더 또는 쿼리 파라미터에서 토큰 가져오기
@@ -65,10 +82,10 @@ def auth(original_fn):
             elif request.args.get("token"):
                 token = request.args.get("token")
             else:
-                log.info("[#%s] Failed to Authorize(No Token)" % req_id)
+                log.info("Failed to Authorize(No Token)")
                 return {"version": "2.0", "data": {"msg": "인증 토큰 없음"}}, 401
             # 토큰 일치여부 확인
-            if security.auth(token, req_id):
+            if security.auth(token, context.req_id()):
                 return original_fn(*args, **kwargs)
             else:
                 return {"version": "2.0", "data": {"msg": "미승인 토큰"}}, 403
@@ -91,6 +108,7 @@ class CacheHealthCheck(Resource):
     @request_id
     @auth
     def get():
+        req_id = context.req_id()
         response = cache.health_check(req_id, debugging)
         if isinstance(response, tuple):
             return response + ({"X-HDMeal-Req-ID": req_id},)
@@ -98,7 +116,33 @@ class CacheHealthCheck(Resource):
             return response, 200, {"X-HDMeal-Req-ID": req_id}
 
 
+# 응답 본문 직렬화(flask_restful과 같은 형식)
+# 만들어둔 응답을 재사용할 때 그대로 보낼 수 있도록 직접 직렬화함
+def serialize(data):
+    return (json.dumps(data, **api.app.config["RESTFUL_JSON"]) + "\n").encode("utf-8")
+
+
+def json_response(body: bytes, req_id: str):
+    return Response(
+        body, mimetype="application/json", headers={"X-HDMeal-Req-ID": req_id}
+    )
+
+
+# 지표(Prometheus 텍스트 형식), 모든 워커의 지표를 합쳐서 응답
+class Metrics(Resource):
+    @staticmethod
+    @request_id
+    @auth
+    def get():
+        return Response(
+            metrics.render(),
+            mimetype="text/plain; version=0.0.4",
+            headers={"X-HDMeal-Req-ID": context.req_id()},
+        )
+
+
 # 내 정보 관리(API)
+# 요청마다 요청코드를 붙인 복사본을 만들어 씀
 cors_headers = {
     "Access-Control-Allow-Origin": os.environ.get("HDMeal_AllowedOrigins", "*"),
     "Access-Control-Allow-Headers": "Content-Type,Access-Control-Allow-Origin,Access-Control-Allow-Headers",
@@ -110,32 +154,35 @@ class UserSettingsREST(Resource):
     @staticmethod
     @request_id
     def get():
-        cors_headers["X-HDMeal-Req-ID"] = req_id
+        req_id = context.req_id()
+        headers = dict(cors_headers, **{"X-HDMeal-Req-ID": req_id})
         response = user.user_settings_rest_get(request, req_id, debugging)
         if isinstance(response, tuple):
-            return response + (cors_headers,)
+            return response + (headers,)
         else:
-            return response, 200, cors_headers
+            return response, 200, headers
 
     @staticmethod
     @request_id
     def post():
-        cors_headers["X-HDMeal-Req-ID"] = req_id
+        req_id = context.req_id()
+        headers = dict(cors_headers, **{"X-HDMeal-Req-ID": req_id})
         response = user.user_settings_rest_post(request, req_id, debugging)
         if isinstance(response, tuple):
-            return response + (cors_headers,)
+            return response + (headers,)
         else:
-            return response, 200, cors_headers
+            return response, 200, headers
 
     @staticmethod
     @request_id
     def delete():
-        cors_headers["X-HDMeal-Req-ID"] = req_id
+        req_id = context.req_id()
+        headers = dict(cors_headers, **{"X-HDMeal-Req-ID": req_id})
         response = user.user_settings_rest_delete(request, req_id, debugging)
         if isinstance(response, tuple):
-            return response + (cors_headers,)
+            return response + (headers,)
         else:
-            return response, 200, cors_headers
+            return response, 200, headers
 
     @staticmethod
     def options():
@@ -148,6 +195,7 @@ class Fulfillment(Resource):
     @request_id
     @auth
     def post():
+        req_id = context.req_id()
         try:  # 요청 파싱
             req_data: dict = request.json
             intent: str = req_data["queryResult"]["intent"]["displayName"]
@@ -227,6 +275,13 @@ class Fulfillment(Resource):
                     ]
         except ValueError:
             params["date"] = None
+        # 같은 입력으로 만들어둔 응답이 있으면 그대로 보냄
+        render = chat.render_key(uid, intent, params, req_id, debugging)
+        if render is not None:
+            render_key = ("Fulfillment",) + render[0]
+            body = render_cache.get(render_key, render[1])
+            if body is not None:
+                return json_response(body, req_id)
         # 요청 수행하기
         respns: tuple = chat.router(prefix, uid, intent, params, req_id, debugging)
         # Fulfillment API 형식으로 변환
@@ -274,7 +329,10 @@ class Fulfillment(Resource):
             )
         except IndexError:
             pass
-        return {"fulfillmentMessages": outputs}, 200, {"X-HDMeal-Req-ID": req_id}
+        body = serialize({"fulfillmentMessages": outputs})
+        if render is not None and context.get("renderable"):
+            render_cache.put(render_key, render[1], body)
+        return json_response(body, req_id)
 
 
 # Skill
@@ -283,6 +341,7 @@ class Skill(Resource):
     @request_id
     @auth
     def post():
+        req_id = context.req_id()
         try:  # 요청 파싱
             req_data: dict = request.json
             uid: str = req_data["userRequest"]["user"]["id"]
@@ -334,6 +393,13 @@ class Skill(Resource):
         enc = hashlib.sha256()
         enc.update(uid.encode("utf-8"))
         uid: str = "KT-" + enc.hexdigest()
+        # 같은 입력으로 만들어둔 응답이 있으면 그대로 보냄
+        render = chat.render_key(uid, intent, params, req_id, debugging)
+        if render is not None:
+            render_key = ("Skill",) + render[0]
+            body = render_cache.get(render_key, render[1])
+            if body is not None:
+                return json_response(body, req_id)
         # 요청 수행하기
         respns: tuple = chat.router("KT", uid, intent, params, req_id, debugging)
         # Kakao i API 형식으로 변환
@@ -380,11 +446,10 @@ class Skill(Resource):
                                         }
                                     )
                     outputs.append(card)
-        return (
-            {"version": "2.0", "template": {"outputs": outputs}},
-            200,
-            {"X-HDMeal-Req-ID": req_id},
-        )
+        body = serialize({"version": "2.0", "template": {"outputs": outputs}})
+        if render is not None and context.get("renderable"):
+            render_cache.put(render_key, render[1], body)
+        return json_response(body, req_id)
 
 
 # URL Router에 맵핑.(Rest URL정의)
@@ -392,6 +457,7 @@ api.add_resource(CacheHealthCheck, "/cache/healthcheck/")
 api.add_resource(UserSettingsREST, "/user/settings/")
 api.add_resource(Fulfillment, "/fulfillment/")
 api.add_resource(Skill, "/skill/")
+api.add_resource(Metrics, "/metrics")
 
 # 서버 실행
 if __name__ == "__main__":
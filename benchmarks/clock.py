@@ -0,0 +1,60 @@
+# ██╗  ██╗██████╗ ███╗   ███╗███████╗ █████╗ ██╗
+# ██║  ██║██╔══██╗████╗ ████║██╔════╝██╔══██╗██║
+# ███████║██║  ██║██╔████╔██║█████╗  ███████║██║
+# ██╔══██║██║  ██║██║╚██╔╝██║██╔══╝  ██╔══██║██║
+# ██║  ██║██████╔╝██║ ╚═╝ ██║███████╗██║  ██║███████╗
+# ╚═╝  ╚═╝╚═════╝ ╚═╝     ╚═╝╚══════╝╚═╝  ╚═╝╚══════╝
+# Copyright 2019-2020, Hyungyo Seo
+# clock.py - 벤치마크 중 서버 시각을 고정하는 스크립트입니다.
+#
+# 브리핑 등은 지금 시각에 따라 응답이 달라지므로(주말, 오후 5시 이후),
+# 언제 실행해도 같은 결과가 나오도록 START부터 시작하는 시계로 바꿈
+# 시계는 실제 시간만큼 흘러가므로 캐시 유효 시간 등은 그대로 동작함
+
+import datetime
+import sys
+import types
+
+from benchmarks import run
+
+# 벤치마크 시작 시각, 조회할 날짜(run.DATE, 월요일) 오전 9시
+START = datetime.datetime.strptime(run.DATE + " 09:00", "%Y-%m-%d %H:%M")
+# 시계를 바꿀 모듈
+MODULES = [
+    "modules.chatbot.chat",
+    "modules.common.get_data",
+    "benchmarks.stub_upstream",
+]
+
+_datetime = datetime.datetime
+_offset = datetime.timedelta(0)
+
+
+# 실제 datetime 객체도 이 클래스의 객체로 보이도록 함(isinstance 검사용)
+class _Meta(type):
+    def __instancecheck__(cls, instance):
+        return isinstance(instance, _datetime)
+
+
+# now()만 고정된 시계를 따르는 datetime
+class FixedDateTime(_datetime, metaclass=_Meta):
+    @classmethod
+    def now(cls, tz=None):
+        return _datetime.now(tz) + _offset
+
+
+# datetime 대신 쓸 모듈, datetime.datetime만 다름
+fixed = types.ModuleType("datetime")
+fixed.__dict__.update(
+    (name, value) for name, value in vars(datetime).items() if not name.startswith("__")
+)
+fixed.datetime = FixedDateTime
+
+
+# 이 프로세스의 시계를 지금부터 START로 맞춤
+def install():
+    global _offset
+    _offset = START - _datetime.now()
+    for name in MODULES:
+        __import__(name)
+        sys.modules[name].datetime = fixed
@@ -0,0 +1,145 @@
+# ██╗  ██╗██████╗ ███╗   ███╗███████╗ █████╗ ██╗
+# ██║  ██║██╔══██╗████╗ ████║██╔════╝██╔══██╗██║
+# ███████║██║  ██║██╔████╔██║█████╗  ███████║██║
+# ██╔══██║██║  ██║██║╚██╔╝██║██╔══╝  ██╔══██║██║
+# ██║  ██║██████╔╝██║ ╚═╝ ██║███████╗██║  ██║███████╗
+# ╚═╝  ╚═╝╚═════╝ ╚═╝     ╚═╝╚══════╝╚═╝  ╚═╝╚══════╝
+# Copyright 2019-2020, Hyungyo Seo
+# fake_upstream.py - NEIS, 기상청, 서울시 오픈API 대신 응답하는 가짜 HTTP 서버입니다.
+#
+# 사용법(저장소 최상위 폴더에서):
+#   python -m benchmarks.fake_upstream --port 8900 --latency 80 --error-rate 0.02
+# 앱은 아래 설정으로 실행하면 외부 서버 대신 이 서버에 요청함
+#   HDMeal_NEISURL=http://127.0.0.1:8900
+#   HDMeal_KMAURL=http://127.0.0.1:8900
+#   HDMeal_SeoulDataURL=http://127.0.0.1:8900
+#
+# 응답 내용은 stub_upstream과 같음
+
+import argparse
+import http.server
+import random
+import threading
+import time
+
+from benchmarks import stub_upstream
+
+# 앱에서 외부 서버 주소를 바꾸는 설정
+URL_SETTINGS = ["HDMeal_NEISURL", "HDMeal_KMAURL", "HDMeal_SeoulDataURL"]
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    # 연결을 유지해야 upstream 세션의 연결 재사용까지 흉내낼 수 있음
+    protocol_version = "HTTP/1.1"
+    # 헤더와 본문을 따로 보내므로 Nagle 알고리즘을 끄지 않으면 응답마다 40ms씩 늦어짐
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        delay = server.latency + random.uniform(0, server.jitter)
+        if delay:
+            time.sleep(delay)
+        if random.random() < server.error_rate:
+            status, content_type, body = (
+                server.error_status,
+                "text/plain",
+                b"Service Unavailable",
+            )
+        else:
+            status, content_type, body = stub_upstream.respond(self.path)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+# 서버 만들기
+# latency, jitter: 응답 지연(초), 지연은 latency ~ latency + jitter 사이에서 고름
+# error_rate: error_status로 응답할 비율(0~1)
+# page_size: NEIS 한 페이지 최대 행 수
+def make_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency: float = 0,
+    jitter: float = 0,
+    error_rate: float = 0,
+    error_status: int = 503,
+    page_size: int = stub_upstream.MAX_PAGE_SIZE,
+    verbose: bool = False,
+):
+    stub_upstream.MAX_PAGE_SIZE = page_size
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.jitter = jitter
+    server.error_rate = error_rate
+    server.error_status = error_status
+    server.verbose = verbose
+    return server
+
+
+# 서버를 별도 쓰레드에서 실행, 서버와 주소 반환
+def start(**kwargs):
+    server = make_server(**kwargs)
+    threading.Thread(
+        target=server.serve_forever, name="fake_upstream", daemon=True
+    ).start()
+    return server, "http://%s:%d" % server.server_address[:2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="외부 서버 대신 응답하는 가짜 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=stub_upstream.LATENCY * 1000,
+        help="응답 지연(ms)",
+    )
+    parser.add_argument("--jitter", type=float, default=0, help="추가 지연 범위(ms)")
+    parser.add_argument("--error-rate", type=float, default=0, help="실패 비율(0~1)")
+    parser.add_argument(
+        "--error-status", type=int, default=503, help="실패 시 상태 코드"
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=stub_upstream.MAX_PAGE_SIZE,
+        help="NEIS 한 페이지 최대 행 수",
+    )
+    parser.add_argument("--seed", type=int, help="실패를 고르는 난수 시드")
+    parser.add_argument("-v", "--verbose", action="store_true", help="요청 기록 출력")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    server = make_server(
+        args.host,
+        args.port,
+        args.latency / 1000,
+        args.jitter / 1000,
+        args.error_rate,
+        args.error_status,
+        args.page_size,
+        args.verbose,
+    )
+    url = "http://%s:%d" % server.server_address[:2]
+    print("가짜 외부 서버를 시작했습니다: %s" % url)
+    for name in URL_SETTINGS:
+        print("  %s=%s" % (name, url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+# ██╗  ██╗██████╗ ███╗   ███╗███████╗ █████╗ ██╗
+# ██║  ██║██╔══██╗████╗ ████║██╔════╝██╔══██╗██║
+# ███████║██║  ██║██╔████╔██║█████╗  ███████║██║
+# ██╔══██║██║  ██║██║╚██╔╝██║██╔══╝  ██╔══██║██║
+# ██║  ██║██████╔╝██║ ╚═╝ ██║███████╗██║  ██║███████╗
+# ╚═╝  ╚═╝╚═════╝ ╚═╝     ╚═╝╚══════╝╚═╝  ╚═╝╚══════╝
+# Copyright 2019-2020, Hyungyo Seo
+# gunicorn_conf.py - 벤치마크용 gunicorn 설정 파일입니다. 워커마다 서버 시각을 고정하고, 외부 서버 대신 stub_upstream이 응답합니다.
+
+import os
+
+
+# 워커가 만들어진 뒤, 앱을 불러오기 전에 실행됨
+def post_fork(server, worker):
+    from benchmarks import clock, stub_upstream
+
+    clock.install()
+    # 가짜 외부 서버를 쓸 때는 stub_upstream을 붙이지 않음
+    if os.environ.get("HDMeal_BenchUpstream", "stub") == "stub":
+        stub_upstream.install()
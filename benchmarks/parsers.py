@@ -0,0 +1,112 @@
+# ██╗  ██╗██████╗ ███╗   ███╗███████╗ █████╗ ██╗
+# ██║  ██║██╔══██╗████╗ ████║██╔════╝██╔══██╗██║
+# ███████║██║  ██║██╔████╔██║█████╗  ███████║██║
+# ██╔══██║██║  ██║██║╚██╔╝██║██╔══╝  ██╔══██║██║
+# ██║  ██║██████╔╝██║ ╚═╝ ██║███████╗██║  ██║███████╗
+# ╚═╝  ╚═╝╚═════╝ ╚═╝     ╚═╝╚══════╝╚═╝  ╚═╝╚══════╝
+# Copyright 2019-2020, Hyungyo Seo
+# parsers.py - 기록해둔 외부 서버 응답으로 파서별 성능을 측정하는 스크립트입니다.
+#
+# 사용법(저장소 최상위 폴더에서):
+#   python -m benchmarks.parsers --record           # 외부 서버 응답을 benchmarks/fixtures에 기록
+#   python -m benchmarks.parsers                    # 기록된 응답으로 측정(지연 없음)
+#   python -m benchmarks.parsers --timing           # 기록된 응답 시간만큼 기다리며 측정
+#
+# 기록할 때는 실제 인증키(HDMeal_NEIS_Token 등)나 가짜 서버 주소(HDMeal_NEISURL 등)를 설정해야 함
+# 인증키는 기록 파일에 남지 않으므로 재생할 때는 필요 없음
+
+import argparse
+import datetime
+import os
+import shutil
+import sys
+
+from benchmarks import run
+
+FIXTURES = os.path.join(run.ROOT, "benchmarks", "fixtures")
+
+
+# 측정할 파서, {이름: 함수}
+def parsers():
+    from modules.common.parsers import (
+        menu_parser,
+        schedule_parser,
+        timetable_parser,
+        water_temp_parser,
+        weather_parser,
+    )
+
+    date = datetime.datetime.strptime(run.DATE, "%Y-%m-%d").date()
+    return {
+        "menu": lambda: menu_parser.parse(
+            date.year, date.month, date.day, "benchmark", False
+        ),
+        "schedule": lambda: schedule_parser.parse(
+            date.year, date.month, "benchmark", False
+        ),
+        "timetable": lambda: timetable_parser.parse(
+            1, 1, date.year, date.month, date.day, "benchmark", False
+        ),
+        "weather": lambda: weather_parser.parse("benchmark", False),
+        "water_temp": lambda: water_temp_parser.get("benchmark", False),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="파서 벤치마크")
+    parser.add_argument("--record", action="store_true", help="외부 서버 응답 기록")
+    parser.add_argument(
+        "--timing", action="store_true", help="기록된 응답 시간만큼 기다림"
+    )
+    parser.add_argument(
+        "-n", "--requests", type=int, default=50, help="파서별 실행 횟수"
+    )
+    parser.add_argument("--fixtures", default=FIXTURES, help="기록 폴더")
+    args = parser.parse_args()
+
+    for key, value in run.ENVIRONMENT.items():
+        os.environ.setdefault(key, value)
+    fixtures = os.path.abspath(args.fixtures)
+    path = run.workspace()
+    os.chdir(path)
+    sys.path.insert(0, run.ROOT)
+
+    from modules.common import upstream
+
+    upstream.FIXTURES = fixtures
+    upstream.REPLAY_TIMING = args.timing
+    try:
+        if args.record:
+            upstream.MODE = "record"
+            for name, fn in parsers().items():
+                fn()
+                print("기록했습니다: %s" % name)
+            return
+
+        upstream.MODE = "replay"
+        for name, fn in parsers().items():
+
+            def send():
+                fn()
+                return 200
+
+            result = run.measure(send, args.requests, 1, run.purge_cache)
+            print(
+                "%-12s mean %7s p50 %7s p95 %7s p99 %7s%s"
+                % (
+                    name,
+                    result["mean_ms"],
+                    result["p50_ms"],
+                    result["p95_ms"],
+                    result["p99_ms"],
+                    " (errors: %d)" % result["errors"] if result["errors"] else "",
+                ),
+                flush=True,
+            )
+    finally:
+        os.chdir(run.ROOT)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
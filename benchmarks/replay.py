@@ -0,0 +1,211 @@
+# ██╗  ██╗██████╗ ███╗   ███╗███████╗ █████╗ ██╗
+# ██║  ██║██╔══██╗████╗ ████║██╔════╝██╔══██╗██║
+# ███████║██║  ██║██╔████╔██║█████╗  ███████║██║
+# ██╔══██║██║  ██║██║╚██╔╝██║██╔══╝  ██╔══██║██║
+# ██║  ██║██████╔╝██║ ╚═╝ ██║███████╗██║  ██║███████╗
+# ╚═╝  ╚═╝╚═════╝ ╚═╝     ╚═╝╚══════╝╚═╝  ╚═╝╚══════╝
+# Copyright 2019-2020, Hyungyo Seo
+# replay.py - 저장해둔 Skill/Fulfillment 요청을 다시 보내 실제와 비슷한 부하를 만드는 스크립트입니다.
+#
+# 사용법(저장소 최상위 폴더에서):
+#   python -m benchmarks.replay traffic.jsonl                   # 앱을 띄우지 않고 테스트 클라이언트로
+#   python -m benchmarks.replay traffic.jsonl --url http://127.0.0.1:5000 --speed 60 -c 16
+#
+# 입력 파일은 한 줄에 요청 하나(JSON)이며, 다음 두 형식을 받음
+#   카카오 i 오픈빌더 요청 본문(userRequest) 또는 Dialogflow 요청 본문(queryResult) 그대로
+#   {"time": 요청 시각(유닉스 시간 또는 ISO 8601), "body": 요청 본문}
+# 요청 시각이 있으면 --speed배 빠르게 원래 간격대로 보내고, 없으면 최대한 빨리 보냄
+
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+from benchmarks import run
+
+
+# 요청 시각을 유닉스 시간으로
+def timestamp(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+# 입력 파일 읽기, [(요청 시각, 엔드포인트, 의도, 본문)] 반환
+def load(path: str, limit: int = None):
+    entries = []
+    with open(path, encoding="utf-8") as traffic_file:
+        for line in traffic_file:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            body = item.get("body", item)
+            if "userRequest" in body:
+                endpoint, intent = "/skill/", body.get("intent", {}).get("name")
+            elif "queryResult" in body:
+                endpoint = "/fulfillment/"
+                intent = body["queryResult"].get("intent", {}).get("displayName")
+            else:
+                continue
+            entries.append(
+                (
+                    timestamp(item.get("time", item.get("timestamp"))),
+                    endpoint,
+                    intent or "Unknown",
+                    body,
+                )
+            )
+            if limit and len(entries) >= limit:
+                break
+    return entries
+
+
+# 요청 보내는 함수 만들기, send(엔드포인트, 본문)는 상태 코드 반환
+def sender(url: str, token: str):
+    local = threading.local()
+    if url:
+        import requests
+
+        def send(endpoint, body):
+            if not hasattr(local, "session"):
+                local.session = requests.Session()
+            return local.session.post(
+                url.rstrip("/") + endpoint,
+                json=body,
+                headers={"X-HDMeal-Token": token},
+                timeout=30,
+            ).status_code
+
+    else:
+        import application
+        from benchmarks import stub_upstream
+
+        stub_upstream.install()
+
+        def send(endpoint, body):
+            if not hasattr(local, "client"):
+                local.client = application.app.test_client()
+            return local.client.post(
+                endpoint, json=body, headers={"X-HDMeal-Token": token}
+            ).status_code
+
+    return send
+
+
+# 요청 다시 보내기, {(엔드포인트, 의도): 통계} 반환
+# 원래 간격대로 보낼 때는 보내기로 한 시각부터 잼(밀려서 늦게 보낸 시간도 응답 시간에 포함)
+def replay(entries: list, send, concurrency: int, speed: float):
+    latencies = {}
+    errors = {}
+    lock = threading.Lock()
+    paced = speed > 0 and all(entry[0] is not None for entry in entries)
+    if paced:  # 여러 워커의 기록을 합친 파일은 시각 순서가 조금씩 섞여 있음
+        entries = sorted(entries, key=lambda entry: entry[0])
+    first = entries[0][0] if paced else None
+
+    def worker(scheduled, endpoint, intent, body):
+        try:
+            ok = send(endpoint, body) == 200
+        except Exception:
+            ok = False
+        spent = time.perf_counter() - scheduled
+        with lock:
+            if ok:
+                latencies.setdefault((endpoint, intent), []).append(spent)
+            else:
+                errors[(endpoint, intent)] = errors.get((endpoint, intent), 0) + 1
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for at, endpoint, intent, body in entries:
+            scheduled = time.perf_counter()
+            if paced:
+                scheduled = started + (at - first) / speed
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(worker, scheduled, endpoint, intent, body)
+    elapsed = time.perf_counter() - started
+
+    keys = sorted(set(latencies) | set(errors))
+    results = {
+        key: run.summarize(latencies.get(key, []), errors.get(key, 0), elapsed)
+        for key in keys
+    }
+    results[("*", "*")] = run.summarize(
+        [spent for spents in latencies.values() for spent in spents],
+        sum(errors.values()),
+        elapsed,
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Skill/Fulfillment 요청 재생")
+    parser.add_argument("file", help="요청 파일(JSON Lines)")
+    parser.add_argument("--url", help="요청을 보낼 서버, 없으면 테스트 클라이언트 사용")
+    parser.add_argument("--token", default=run.TOKEN, help="X-HDMeal-Token 값")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="동시 요청 수")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1,
+        help="원래 간격보다 몇 배 빠르게 보낼지, 0이면 간격 없이 보냄",
+    )
+    parser.add_argument("--limit", type=int, help="보낼 요청 수")
+    parser.add_argument("--json", action="store_true", help="결과를 JSON으로 출력")
+    args = parser.parse_args()
+
+    entries = load(args.file, args.limit)
+    if not entries:
+        sys.exit("보낼 요청이 없습니다.")
+
+    path = None
+    if not args.url:
+        for key, value in run.ENVIRONMENT.items():
+            os.environ.setdefault(key, value)
+        path = run.workspace()
+        os.chdir(path)
+        sys.path.insert(0, run.ROOT)
+    try:
+        results = replay(
+            entries, sender(args.url, args.token), args.concurrency, args.speed
+        )
+    finally:
+        if path:
+            os.chdir(run.ROOT)
+            shutil.rmtree(path, ignore_errors=True)
+
+    if args.json:
+        print(
+            json.dumps(
+                {"%s %s" % key: result for key, result in results.items()},
+                ensure_ascii=False,
+                indent=2,
+            )
+        )
+        return
+    for (endpoint, intent), result in results.items():
+        print(
+            "%-14s %-24s %6d req %4d err p50 %7s p95 %7s p99 %7s"
+            % (
+                endpoint,
+                intent,
+                result["count"],
+                result["errors"],
+                result["p50_ms"],
+                result["p95_ms"],
+                result["p99_ms"],
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+# ██╗  ██╗██████╗ ███╗   ███╗███████╗ █████╗ ██╗
+# ██║  ██║██╔══██╗████╗ ████║██╔════╝██╔══██╗██║
+# ███████║██║  ██║██╔████╔██║█████╗  ███████║██║
+# ██╔══██║██║  ██║██║╚██╔╝██║██╔══╝  ██╔══██║██║
+# ██║  ██║██████╔╝██║ ╚═╝ ██║███████╗██║  ██║███████╗
+# ╚═╝  ╚═╝╚═════╝ ╚═╝     ╚═╝╚══════╝╚═╝  ╚═╝╚══════╝
+# Copyright 2019-2020, Hyungyo Seo
+# run.py - Skill, Fulfillment API의 의도별 처리량과 응답 시간(p50/p95/p99)을 재는 벤치마크 스크립트입니다.
+#
+# 사용법(저장소 최상위 폴더에서):
+#   python -m benchmarks.run                      # Flask 테스트 클라이언트와 gunicorn 모두
+#   python -m benchmarks.run --target client      # Flask 테스트 클라이언트만
+#   python -m benchmarks.run --save main          # benchmarks/baselines/main.json 으로 저장
+#   python -m benchmarks.run --compare main       # 저장된 결과와 비교, 느려졌으면 종료 코드 1
+#   python -m benchmarks.run --upstream server    # 가짜 외부 서버에 실제로 HTTP 요청
+#
+# 외부 서버는 stub_upstream(또는 fake_upstream)이 대신 응답하며,
+# data 폴더는 임시 폴더에 따로 만들어 씀
+# 서버 시각은 clock.START(DATE 오전 9시)로 고정하므로 언제 실행해도 결과를 비교할 수 있음
+
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES = os.path.join(ROOT, "benchmarks", "baselines")
+INTENTS = ["Briefing", "Meal", "Timetable", "Schedule", "WaterTemperature"]
+ENDPOINTS = ["/skill/", "/fulfillment/"]
+TOKEN = "benchmark"
+# 조회할 날짜(월요일), 결과가 매번 같도록 고정
+DATE = "2020-06-01"
+# 벤치마크에서 쓰는 설정, 이미 설정된 값은 그대로 둠
+ENVIRONMENT = {
+    "HDMeal_AuthTokens": json.dumps([TOKEN]),
+    "HDMeal_JWTSecret": "benchmark",
+    "HDMeal_BaseURL": "http://127.0.0.1/",
+    "HDMeal_KMAZone": "4113565500",
+    "HDMeal_LogLevel": "WARNING",
+    "HDMeal_NEIS_ATPT_OFCDC_SC_CODE": "J10",
+    "HDMeal_NEIS_SD_SCHUL_CODE": "7530079",
+    "HDMeal_NEIS_Token": "benchmark",
+    "HDMeal_NumOfClasses": "10",
+    "HDMeal_PrewarmTimes": "",
+    "HDMeal_SeoulData_Token": "benchmark",
+}
+
+
+# 의도별 요청 본문
+def skill_body(intent: str):
+    params = {}
+    if intent in ("Meal", "Schedule"):
+        params["date"] = json.dumps({"date": DATE})
+    elif intent == "Timetable":
+        params = {"grade": "1", "class": "1", "date": json.dumps({"date": DATE})}
+    return {
+        "userRequest": {"user": {"id": "benchmark"}, "utterance": intent},
+        "intent": {"name": intent},
+        "action": {"params": params},
+    }
+
+
+def fulfillment_body(intent: str):
+    params = {}
+    if intent in ("Meal", "Schedule", "Timetable"):
+        params["date"] = DATE + "T12:00:00+09:00"
+    if intent == "Timetable":
+        params.update(grade="1", **{"class": "1"})
+    return {
+        "queryResult": {
+            "intent": {"displayName": intent},
+            "parameters": params,
+            "queryText": intent,
+        },
+        "originalDetectIntentRequest": {
+            "payload": {"data": {"from": {"id": "benchmark"}}}
+        },
+    }
+
+
+def body(endpoint: str, intent: str):
+    return skill_body(intent) if endpoint == "/skill/" else fulfillment_body(intent)
+
+
+# 임시 작업 폴더 만들기, data 폴더 구조만 복사함
+def workspace():
+    path = tempfile.mkdtemp(prefix="hdmeal-bench-")
+    os.makedirs(os.path.join(path, "data", "cache"))
+    os.makedirs(os.path.join(path, "data", "logs"))
+    shutil.copy(os.path.join(ROOT, "data", "delicious.txt"), os.path.join(path, "data"))
+    return path
+
+
+# 응답 시간 목록을 통계로 정리
+def summarize(latencies: list, errors: int, elapsed: float):
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        if not latencies:
+            return None
+        index = max(int(round(p / 100 * len(latencies))) - 1, 0)
+        return round(latencies[index] * 1000, 2)
+
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "mean_ms": (
+            round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None
+        ),
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+    }
+
+
+# 요청 여러 개를 동시에 보내고 통계 반환
+# send(): 요청 하나를 보내고 상태 코드 반환, before(): 요청 전마다 실행(시간에 포함 안 됨)
+def measure(send, count: int, concurrency: int, before=None):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def worker(n):
+        nonlocal errors
+        for _ in range(n):
+            if before is not None:
+                before()
+            started = time.perf_counter()
+            try:
+                ok = send() == 200
+            except Exception:
+                ok = False
+            spent = time.perf_counter() - started
+            with lock:
+                if ok:
+                    latencies.append(spent)
+                else:
+                    errors += 1
+
+    shares = [
+        count // concurrency + (i < count % concurrency) for i in range(concurrency)
+    ]
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, shares))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+# 캐시(저장소와 이 프로세스의 메모리 캐시) 비우기
+# gunicorn 워커의 메모리 캐시는 저장소 스탬프가 바뀌므로 다음 요청에서 버려짐
+def purge_cache():
+    from modules.common import cache_store, memory_cache, render_cache
+
+    cache_store.purge()
+    memory_cache.clear()
+    render_cache.clear()
+
+
+# 의도별로 cold(매 요청 전 캐시 비움), warm(캐시 채운 뒤) 측정
+def run_suite(target: str, send_factory, args):
+    results = {}
+    for endpoint in ENDPOINTS:
+        for intent in INTENTS:
+            send = send_factory(endpoint, intent)
+            name = "%s %s %s" % (target, endpoint, intent)
+            results[name + " cold"] = measure(send, args.cold_requests, 1, purge_cache)
+            send()  # 캐시 채우기
+            results[name + " warm"] = measure(send, args.requests, args.concurrency)
+            print_row(name, results[name + " cold"], results[name + " warm"])
+    return results
+
+
+def print_row(name: str, cold: dict, warm: dict):
+    print(
+        "%-42s cold p50 %7s p95 %7s | warm p50 %7s p95 %7s p99 %7s %8s req/s%s"
+        % (
+            name,
+            cold["p50_ms"],
+            cold["p95_ms"],
+            warm["p50_ms"],
+            warm["p95_ms"],
+            warm["p99_ms"],
+            warm["throughput"],
+            (
+                " (errors: %d)" % (cold["errors"] + warm["errors"])
+                if cold["errors"] or warm["errors"]
+                else ""
+            ),
+        ),
+        flush=True,
+    )
+
+
+# Flask 테스트 클라이언트로 측정
+def run_client(args):
+    import application
+    from benchmarks import clock, stub_upstream
+
+    clock.install()
+    if args.upstream == "stub":
+        stub_upstream.install()
+    local = threading.local()
+
+    def send_factory(endpoint, intent):
+        payload = body(endpoint, intent)
+
+        def send():
+            if not hasattr(local, "client"):
+                local.client = application.app.test_client()
+            return local.client.post(
+                endpoint, json=payload, headers={"X-HDMeal-Token": TOKEN}
+            ).status_code
+
+        return send
+
+    return run_suite("client", send_factory, args)
+
+
+# gunicorn을 띄워서 측정
+def run_gunicorn(args, path: str):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    base_url = "http://127.0.0.1:%d" % port
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "--config",
+            os.path.join(ROOT, "benchmarks", "gunicorn_conf.py"),
+            "--bind",
+            "127.0.0.1:%d" % port,
+            "--workers",
+            str(args.workers),
+            "--threads",
+            str(args.threads),
+            "application:app",
+        ],
+        cwd=path,
+        env=dict(os.environ, PYTHONPATH=ROOT, HDMeal_BenchUpstream=args.upstream),
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                requests.get(base_url + "/", timeout=1)
+                break
+            except requests.ConnectionError:
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("gunicorn을 실행할 수 없었습니다.")
+                time.sleep(0.2)
+
+        local = threading.local()
+
+        def send_factory(endpoint, intent):
+            payload = body(endpoint, intent)
+
+            def send():
+                if not hasattr(local, "session"):
+                    local.session = requests.Session()
+                return local.session.post(
+                    base_url + endpoint,
+                    json=payload,
+                    headers={"X-HDMeal-Token": TOKEN},
+                    timeout=30,
+                ).status_code
+
+            return send
+
+        return run_suite("gunicorn", send_factory, args)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+# 기준 결과와 비교, 느려진 항목 목록 반환
+# p95가 threshold배 넘게, 그리고 min_ms 넘게 늘어났을 때만 느려진 것으로 봄(잡음 제외)
+def compare(results: dict, baseline: dict, threshold: float, min_ms: float):
+    regressions = []
+    for name, current in sorted(results.items()):
+        before = baseline["results"].get(name)
+        if not before or before["p95_ms"] is None or current["p95_ms"] is None:
+            continue
+        if (
+            current["p95_ms"] > before["p95_ms"] * threshold
+            and current["p95_ms"] - before["p95_ms"] > min_ms
+        ):
+            regressions.append((name, before["p95_ms"], current["p95_ms"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Skill/Fulfillment API 벤치마크")
+    parser.add_argument(
+        "--target", choices=["client", "gunicorn", "all"], default="all"
+    )
+    parser.add_argument("-n", "--requests", type=int, default=200, help="warm 요청 수")
+    parser.add_argument("--cold-requests", type=int, default=20, help="cold 요청 수")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="동시 요청 수")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn 워커 수")
+    parser.add_argument(
+        "--threads", type=int, default=4, help="gunicorn 워커당 쓰레드 수"
+    )
+    parser.add_argument(
+        "--upstream",
+        choices=["stub", "server"],
+        default="stub",
+        help="stub: 요청을 보내지 않고 응답, server: 가짜 외부 서버에 요청",
+    )
+    parser.add_argument("--save", metavar="NAME", help="결과를 기준 결과로 저장")
+    parser.add_argument("--compare", metavar="NAME", help="기준 결과와 비교")
+    parser.add_argument("--threshold", type=float, default=1.25, help="허용 배율(p95)")
+    parser.add_argument("--min-ms", type=float, default=2.0, help="허용 차이(p95, ms)")
+    args = parser.parse_args()
+
+    for key, value in ENVIRONMENT.items():
+        os.environ.setdefault(key, value)
+    if args.upstream == "server":
+        from benchmarks import fake_upstream, stub_upstream
+
+        _, url = fake_upstream.start(latency=stub_upstream.LATENCY)
+        for name in fake_upstream.URL_SETTINGS:
+            os.environ[name] = url
+    path = workspace()
+    os.chdir(path)
+    sys.path.insert(0, ROOT)
+
+    results = {}
+    try:
+        if args.target in ("client", "all"):
+            results.update(run_client(args))
+        if args.target in ("gunicorn", "all"):
+            results.update(run_gunicorn(args, path))
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(path, ignore_errors=True)
+
+    from benchmarks import clock
+
+    report = {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            # 고정한 서버 시각, 브리핑 등은 시각에 따라 응답이 달라지므로 같아야 비교 가능
+            "clock": clock.START.isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "requests": args.requests,
+            "cold_requests": args.cold_requests,
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "threads": args.threads,
+            "upstream": args.upstream,
+        },
+        "results": results,
+    }
+
+    if args.save:
+        os.makedirs(BASELINES, exist_ok=True)
+        with open(os.path.join(BASELINES, args.save + ".json"), "w") as baseline_file:
+            json.dump(report, baseline_file, indent=2, sort_keys=True)
+        print("저장했습니다: benchmarks/baselines/%s.json" % args.save)
+
+    if args.compare:
+        with open(os.path.join(BASELINES, args.compare + ".json")) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline["meta"].get("clock") != report["meta"]["clock"]:
+            print(
+                "기준 결과와 서버 시각이 달라 비교할 수 없습니다. 기준 결과를 다시 저장해 주세요."
+            )
+            sys.exit(2)
+        regressions = compare(results, baseline, args.threshold, args.min_ms)
+        for name, before, after in regressions:
+            print("느려짐: %s p95 %.2fms -> %.2fms" % (name, before, after))
+        if regressions:
+            sys.exit(1)
+        print("기준 결과(%s)보다 느려진 항목이 없습니다." % args.compare)
+
+
+if __name__ == "__main__":
+    main()
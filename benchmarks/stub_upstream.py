@@ -0,0 +1,206 @@
+# ██╗  ██╗██████╗ ███╗   ███╗███████╗ █████╗ ██╗
+# ██║  ██║██╔══██╗████╗ ████║██╔════╝██╔══██╗██║
+# ███████║██║  ██║██╔████╔██║█████╗  ███████║██║
+# ██╔══██║██║  ██║██║╚██╔╝██║██╔══╝  ██╔══██║██║
+# ██║  ██║██████╔╝██║ ╚═╝ ██║███████╗██║  ██║███████╗
+# ╚═╝  ╚═╝╚═════╝ ╚═╝     ╚═╝╚══════╝╚═╝  ╚═╝╚══════╝
+# Copyright 2019-2020, Hyungyo Seo
+# stub_upstream.py - 벤치마크에서 외부 서버(NEIS, 기상청, 서울 열린데이터 광장) 대신 응답하는 스크립트입니다.
+
+import datetime
+import json
+import os
+import time
+import urllib.parse
+
+import requests
+from requests.adapters import BaseAdapter
+
+# 외부 서버 응답 지연(밀리초), 실제 네트워크 지연을 흉내낼 때 사용
+LATENCY = float(os.environ.get("HDMeal_BenchUpstreamLatency", "0")) / 1000
+# NEIS 한 페이지 최대 행 수(실제 서버는 1000), 줄이면 여러 페이지로 나눠서 받게 됨
+MAX_PAGE_SIZE = int(os.environ.get("HDMeal_BenchUpstreamPageSize", "1000"))
+
+GRADE_COLUMNS = [
+    "ONE_GRADE_EVENT_YN",
+    "TW_GRADE_EVENT_YN",
+    "THREE_GRADE_EVENT_YN",
+    "FR_GRADE_EVENT_YN",
+    "FIV_GRADE_EVENT_YN",
+    "SIX_GRADE_EVENT_YN",
+]
+
+
+def ymd(value: str):
+    return datetime.datetime.strptime(value, "%Y%m%d").date()
+
+
+def days(date_from: datetime.date, date_to: datetime.date):
+    day = date_from
+    while day <= date_to:
+        yield day
+        day += datetime.timedelta(days=1)
+
+
+# NEIS 오픈API 형식으로 나눠서 응답
+def neis_page(name: str, rows: list, query: dict):
+    size = min(int(query.get("pSize", 100)), MAX_PAGE_SIZE)
+    index = int(query.get("pIndex", 1))
+    part = rows[(index - 1) * size : index * size]
+    if not part:
+        return {
+            "RESULT": {"CODE": "INFO-200", "MESSAGE": "해당하는 데이터가 없습니다."}
+        }
+    return {
+        name: [
+            {
+                "head": [
+                    {"list_total_count": len(rows)},
+                    {"RESULT": {"CODE": "INFO-000", "MESSAGE": "정상 처리되었습니다."}},
+                ]
+            },
+            {"row": part},
+        ]
+    }
+
+
+# 급식식단정보, 평일마다 같은 식단
+def meal(query: dict):
+    if "MLSV_YMD" in query:
+        date_from = date_to = ymd(query["MLSV_YMD"])
+    else:
+        date_from, date_to = ymd(query["MLSV_FROM_YMD"]), ymd(query["MLSV_TO_YMD"])
+    rows = [
+        {
+            "MLSV_YMD": day.strftime("%Y%m%d"),
+            "DDISH_NM": "현미밥<br/>돼지고기김치찌개9.10.13.<br/>"
+            "닭갈비5.6.13.15.<br/>배추김치9.13.<br/>우유2.",
+            "CAL_INFO": "812.4 Kcal",
+        }
+        for day in days(date_from, date_to)
+        if day.weekday() < 5
+    ]
+    return neis_page("mealServiceDietInfo", rows, query)
+
+
+# 학사일정, 매달 1일/15일 행사와 토요휴업일
+def schedule(query: dict):
+    rows = []
+    for day in days(ymd(query["AA_FROM_YMD"]), ymd(query["AA_TO_YMD"])):
+        if day.day in (1, 15):
+            rows.append(
+                dict(
+                    {column: "Y" for column in GRADE_COLUMNS[:3]},
+                    AA_YMD=day.strftime("%Y%m%d"),
+                    EVENT_NM="행사 %d일" % day.day,
+                )
+            )
+        elif day.weekday() == 5:
+            rows.append(
+                dict(
+                    {column: "N" for column in GRADE_COLUMNS},
+                    AA_YMD=day.strftime("%Y%m%d"),
+                    EVENT_NM="토요휴업일",
+                )
+            )
+    return neis_page("SchoolSchedule", rows, query)
+
+
+# 고등학교 시간표, 3개 학년 10개 반 7교시
+def timetable(query: dict):
+    if "ALL_TI_YMD" in query:
+        date_from = date_to = ymd(query["ALL_TI_YMD"])
+    else:
+        date_from, date_to = ymd(query["TI_FROM_YMD"]), ymd(query["TI_TO_YMD"])
+    rows = [
+        {
+            "ALL_TI_YMD": day.strftime("%Y%m%d"),
+            "GRADE": str(grade),
+            "CLASS_NM": str(class_),
+            "PERIO": str(period),
+            "ITRT_CNTNT": "과목%d" % period,
+        }
+        for day in days(date_from, date_to)
+        if day.weekday() < 5
+        for grade in range(1, 4)
+        for class_ in range(1, 11)
+        for period in range(1, 8)
+    ]
+    return neis_page("hisTimetable", rows, query)
+
+
+# 기상청 동네예보 RSS
+def weather():
+    items = "".join(
+        "<data seq='%d'><hour>%d</hour><temp>21.0</temp><tmx>26.0</tmx>"
+        "<tmn>14.0</tmn><sky>1</sky><pty>0</pty><pop>10</pop><reh>55</reh></data>"
+        % (seq, hour)
+        for seq, hour in enumerate([6, 9, 12, 15, 18, 21, 24])
+    )
+    return (
+        "<rss><channel><item><description><body>%s</body></description>"
+        "</item></channel></rss>" % items
+    )
+
+
+# 서울시 실시간 수질 정보
+def water_temp():
+    now = datetime.datetime.now()
+    return {
+        "WPOSInformationTime": {
+            "row": [
+                {
+                    "MSR_DATE": now.strftime("%Y%m%d"),
+                    "MSR_TIME": "%02d:00" % now.hour,
+                    "W_TEMP": temp,
+                }
+                for temp in ("17.2", "18.1", "점검중")
+            ]
+        }
+    }
+
+
+# URL에 맞는 응답, (상태 코드, Content-Type, 본문)
+def respond(url: str):
+    parts = urllib.parse.urlsplit(url)
+    query = dict(urllib.parse.parse_qsl(parts.query))
+    if parts.path.endswith("/mealServiceDietInfo"):
+        body = meal(query)
+    elif parts.path.endswith("/SchoolSchedule"):
+        body = schedule(query)
+    elif parts.path.endswith("/hisTimetable"):
+        body = timetable(query)
+    elif parts.path.endswith("/queryDFSRSS.jsp"):
+        return 200, "text/xml; charset=utf-8", weather().encode("utf-8")
+    elif "/WPOSInformationTime/" in parts.path:
+        body = water_temp()
+    else:
+        return 404, "text/plain", b"Not Found"
+    return 200, "application/json", json.dumps(body, ensure_ascii=False).encode()
+
+
+# requests 어댑터, upstream 세션에 붙여 네트워크 없이 응답
+class StubAdapter(BaseAdapter):
+    def send(self, request, **kwargs):
+        if LATENCY:
+            time.sleep(LATENCY)
+        status, content_type, body = respond(request.url)
+        response = requests.Response()
+        response.status_code = status
+        response.headers["Content-Type"] = content_type
+        response._content = body
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+# 이 프로세스의 upstream 세션에 붙이기
+def install():
+    from modules.common import upstream
+
+    session = upstream.session()
+    session.mount("https://", StubAdapter())
+    session.mount("http://", StubAdapter())
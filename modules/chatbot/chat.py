@@ -10,12 +10,26 @@
 import datetime
 import hashlib
 import os
-import time
 from itertools import groupby
-from threading import Thread
 
 from modules.chatbot import user
-from modules.common import security, log, get_data
+from modules.common import cache_store, context, security, log, get_data, fan_out, trace
+
+# 브리핑 항목별 제한 시간(초)
+# 카카오 i 오픈빌더 스킬 제한 시간(5초) 안에 응답할 수 있도록 늦는 항목은 빼고 응답함
+BRIEFING_TIMEOUTS = {"schdl": 3.5, "weather": 3.0, "meal": 3.5, "tt": 3.5}
+# 학사일정 기간 조회 최대 일수(1학년도)
+SCHDL_MAX_DAYS = 366
+# 라우터가 구분하는 의도, 순서대로 비교함
+INTENTS = (
+    "Briefing",
+    "Meal",
+    "Timetable",
+    "Schedule",
+    "WaterTemperature",
+    "UserSettings",
+    "ModifyUserInfo",
+)
 
 
 # Skill 응답용 JSON 생성
@@ -45,28 +59,20 @@ def wday(date):
         return "일"
 
 
-# 알러지정보
-allergy_string = [
-    "",
-    "난류",
-    "우유",
-    "메밀",
-    "땅콩",
-    "대두",
-    "밀",
-    "고등어",
-    "게",
-    "새우",
-    "돼지고기",
-    "복숭아",
-    "토마토",
-    "아황산류",
-    "호두",
-    "닭고기",
-    "쇠고기",
-    "오징어",
-    "조개류",
-]
+# 학사일정 표시
+# (행사명, 학년 비트마스크) 리스트를 한 줄에 하나씩 "행사명(1학년, 2학년)" 형태로 만듦
+def schdl_text(events):
+    if not events:
+        return "일정이 없습니다."
+    lines = []
+    for name, grades in events:
+        related_grade = ", ".join(
+            "%s학년" % (bit + 1)
+            for bit in range(get_data.SCHDL_GRADES)
+            if grades >> bit & 1
+        )
+        lines.append(("%s(%s)" % (name, related_grade)).replace("()", ""))
+    return "\n".join(lines)
 
 
 def getuserid(uid):
@@ -75,9 +81,12 @@ def getuserid(uid):
     return "KT-" + enc.hexdigest()
 
 
+@trace.traced()
 def router(
     platform: str, uid: str, intent: str, params: dict, req_id: str, debugging: bool
 ):
+    # 요청 처리 시간 지표에 쓰임, 의도 이름이 제각각이어도 라우터가 구분하는 이름으로 기록
+    context.put("intent", next((name for name in INTENTS if name in intent), "Unknown"))
     try:
         if "Briefing" in intent:
             return briefing(uid, req_id, debugging)
@@ -96,10 +105,34 @@ def router(
         else:
             return ["잘못된 요청입니다.\n요청 ID: " + req_id], None
     except OSError as e:
-        log.err("[#%s] router@chat.py: Uncaught Error %s" % (req_id, e))
+        log.err("router@chat.py: Uncaught Error %s", e)
         return ["알 수 없는 오류가 발생했습니다.\n요청 ID: " + req_id], None
 
 
+# 미리 만들어둔 응답을 찾는 데 쓰는 (키, 스탬프), 응답을 재사용할 수 없는 요청이면 None
+# 키에 담긴 값과 스탬프에 해당하는 캐시 항목만으로 응답이 정해지는 요청만 해당됨
+def render_key(uid: str, intent: str, params: dict, req_id: str, debugging: bool):
+    name = next((name for name in INTENTS if name in intent), "Unknown")
+    context.put("intent", name)  # 만들어둔 응답을 보내면 라우터를 거치지 않음
+    date = params.get("date")
+    if not isinstance(date, datetime.datetime):
+        return None
+    if name == "Meal" and date.weekday() < 5:
+        preference = user.get_user(uid, req_id, debugging)[2].get("AllergyInfo")
+        stamp = cache_store.stamp("meal", date.strftime("%Y-%m-%d"))
+        return (name, date.date(), preference), (stamp,)
+    if name == "Schedule":
+        try:
+            grade = int(params["grade"]) if params.get("grade") else None
+        except ValueError:
+            return None
+        if grade is not None and not 1 <= grade <= get_data.SCHDL_GRADES:
+            return None  # 라우터에서 오류 메시지로 응답
+        stamp = cache_store.stamp("schdl", date.strftime("%Y-%m"))
+        return (name, date.date(), grade), (stamp,)
+    return None
+
+
 # 식단조회
 def meal(uid: str, params: dict, req_id: str, debugging: bool):
     try:
@@ -111,36 +144,26 @@ def meal(uid: str, params: dict, req_id: str, debugging: bool):
                 return ["급식을 실시하지 않습니다. (주말)"], None
             meal = get_data.meal(date.year, date.month, date.day, req_id, debugging)
             if "message" not in meal:  # 파서 메시지 있는지 확인, 없으면 만들어서 응답
-                # 사용자 설정 불러오기
+                # 사용자 설정 불러오기, 설정별 메뉴는 파싱할 때 만들어 둠
                 user_preferences = user.get_user(uid, req_id, debugging)[2]
-                if user_preferences.get("AllergyInfo") == "None":
-                    menus = [i[0] for i in meal["menu"]]
-                elif user_preferences.get("AllergyInfo") == "FullText":
-                    menus = []
-                    for i in meal["menu"]:
-                        if i[1]:
-                            menus.append(
-                                "%s(%s)"
-                                % (i[0], ", ".join(allergy_string[x] for x in i[1]))
-                            )
-                        else:
-                            menus.append(i[0])
-                else:
-                    menus = []
-                    for i in meal["menu"]:
-                        if i[1]:
-                            menus.append(
-                                "%s(%s)" % (i[0], ", ".join(str(x) for x in i[1]))
-                            )
-                        else:
-                            menus.append(i[0])
+                allergy_info = user_preferences.get("AllergyInfo")
+                if allergy_info not in ("None", "FullText"):
+                    allergy_info = "Number"
+                # 급식 캐시 항목만으로 정해지는 응답
+                context.put("renderable", True)
                 return [
                     "%s:\n%s\n\n열량: %s kcal"
-                    % (meal["date"], "\n".join(menus), meal["kcal"])
+                    % (meal["date"], meal["rendered"][allergy_info], meal["kcal"])
                 ], None
             if meal["message"] == "등록된 데이터가 없습니다.":
-                cal = get_data.schdl(date.year, date.month, date.day, req_id, debugging)
-                if not cal == "일정이 없습니다.":
+                if "reason" in meal:  # 급식 없음 캐시에 기록된 이유 사용
+                    cal = meal["reason"]
+                else:
+                    events = get_data.schdl(
+                        date.year, date.month, date.day, req_id, debugging
+                    )
+                    cal = ", ".join(name for name, _ in events) or None
+                if cal:
                     return ["급식을 실시하지 않습니다. (%s)" % cal], None
             return [meal["message"]], None
         else:
@@ -153,7 +176,7 @@ def meal(uid: str, params: dict, req_id: str, debugging: bool):
 def timetable(platform: str, uid: str, params: dict, req_id: str, debugging: bool):
     suggest_to_register = False
     try:
-        log.info("[#%s] tt_registered@chat.py: New Request" % req_id)
+        log.info("tt_registered@chat.py: New Request")
         print(params)
         if (
             "grade" in params
@@ -216,9 +239,17 @@ def timetable(platform: str, uid: str, params: dict, req_id: str, debugging: boo
 
 # 학사일정 조회
 def schdl(params: dict, req_id: str, debugging: bool):
-    global msg
     try:
-        log.info("[#%s] cal@chat.py: New Request" % req_id)
+        log.info("cal@chat.py: New Request")
+        # 학년을 말한 경우 그 학년 일정만 조회
+        grade = None
+        if params.get("grade"):
+            try:
+                grade = int(params["grade"])
+            except ValueError:
+                return ["올바른 숫자를 입력해 주세요."], None
+            if not 1 <= grade <= get_data.SCHDL_GRADES:
+                return ["올바른 숫자를 입력해 주세요."], None
         if "date" in params:
             if not params["date"]:
                 return ["언제의 학사일정을 조회하시겠어요?"], None
@@ -227,14 +258,15 @@ def schdl(params: dict, req_id: str, debugging: bool):
                 try:
                     date: datetime = params["date"]
                 except Exception:
-                    log.err("[#%s] cal@chat.py: Error while Parsing Date" % req_id)
+                    log.err("cal@chat.py: Error while Parsing Date")
                     return ["오류가 발생했습니다.\n요청 ID: " + req_id], None
 
-                prsnt_schdl = get_data.schdl(
-                    date.year, date.month, date.day, req_id, debugging
+                prsnt_schdl = schdl_text(
+                    get_data.schdl(
+                        date.year, date.month, date.day, req_id, debugging, grade
+                    )
                 )
 
-                prsnt_schdl = prsnt_schdl
                 if prsnt_schdl:
                     msg = "%s-%s-%s(%s):\n%s" % (
                         str(date.year).zfill(4),
@@ -245,6 +277,8 @@ def schdl(params: dict, req_id: str, debugging: bool):
                     )  # YYYY-MM-DD(Weekday)
                 else:
                     msg = "일정이 없습니다."
+                # 학사일정 캐시 항목만으로 정해지는 응답
+                context.put("renderable", True)
             # 특정일자 조회 끝
             # 기간 조회
             elif isinstance(params["date"], list):  # 기간
@@ -252,26 +286,31 @@ def schdl(params: dict, req_id: str, debugging: bool):
                 try:
                     start: datetime = params["date"][0]  # 시작일 파싱
                 except Exception:
-                    log.err("[#%s] cal@chat.py: Error while Parsing StartDate" % req_id)
+                    log.err("cal@chat.py: Error while Parsing StartDate")
                     return ["오류가 발생했습니다.\n요청 ID: " + req_id], None
                 try:
                     end: datetime = params["date"][1]  # 종료일 파싱
                 except Exception:
-                    log.err("[#%s] cal@chat.py: Error while Parsing EndDate" % req_id)
+                    log.err("cal@chat.py: Error while Parsing EndDate")
                     return ["오류가 발생했습니다.\n요청 ID: " + req_id], None
 
-                if (end - start).days > 90:  # 90일 이상을 조회요청한 경우,
+                if (end - start).days > SCHDL_MAX_DAYS:  # 1년 넘게 조회요청한 경우,
+                    end = start + datetime.timedelta(days=SCHDL_MAX_DAYS)  # 종료일 앞당김
                     head = (
-                        "서버 성능상의 이유로 최대 90일까지만 조회가 가능합니다."
+                        "한 번에 최대 1년(%s일)까지만 조회가 가능합니다."
                         "\n조회기간이 %s부터 %s까지로 제한되었습니다.\n\n"
-                        % (start.date(), (start + datetime.timedelta(days=90)).date())
+                        % (SCHDL_MAX_DAYS, start.date(), end.date())
                     )
-                    end = start + datetime.timedelta(days=90)  # 종료일 앞당김
                 else:
                     head = "%s부터 %s까지 조회합니다.\n\n" % (start.date(), end.date())
+                if grade:
+                    head = head.replace("조회합니다.", "%s학년 일정을 조회합니다." % grade)
 
-                schdls = get_data.schdl_mass(start, end, req_id, debugging)
                 # 년, 월, 일, 일정 정보를 담은 튜플이 리스트로 묶여서 반환됨
+                schdls = [
+                    (*i[:3], schdl_text(i[3]))
+                    for i in get_data.schdl_mass(start, end, req_id, debugging, grade)
+                ]
 
                 # body 쓰기, 연속되는 일정은 묶어 처리함
                 for content, group in groupby(schdls, lambda k: k[3]):
@@ -297,7 +336,7 @@ def schdl(params: dict, req_id: str, debugging: bool):
                 # 기간 조회 끝
 
         else:  # 아무런 파라미터도 넘겨받지 못한 경우
-            log.info("[#%s] cal@chat.py: No Parameter" % req_id)
+            log.info("cal@chat.py: No Parameter")
             return ["언제의 학사일정을 조회하시겠어요?"], None
 
         return [msg], None
@@ -306,15 +345,9 @@ def schdl(params: dict, req_id: str, debugging: bool):
 
 
 # 급식봇 브리핑
+@trace.traced()
 def briefing(uid: str, req_id: str, debugging: bool):
-    log.info("[#%s] briefing@chat.py: New Request" % req_id)
-    global briefing_header, hd_err, briefing_schdl, briefing_weather, briefing_meal, briefing_meal_ga, briefing_tt
-    briefing_header = "알 수 없는 오류로 헤더를 불러올 수 없었습니다.\n나중에 다시 시도해 보세요."
-    briefing_schdl = "알 수 없는 오류로 학사일정을 불러올 수 없었습니다.\n나중에 다시 시도해 보세요."
-    briefing_weather = "알 수 없는 오류로 날씨를 불러올 수 없었습니다.\n나중에 다시 시도해 보세요."
-    briefing_meal = "알 수 없는 오류로 식단을 불러올 수 없었습니다.\n나중에 다시 시도해 보세요."
-    briefing_meal_ga = "알 수 없는 오류로 식단을 불러올 수 없었습니다.\n나중에 다시 시도해 보세요."
-    briefing_tt = "알 수 없는 오류로 시간표를 불러올 수 없었습니다.\n나중에 다시 시도해 보세요."
+    log.info("briefing@chat.py: New Request")
 
     if datetime.datetime.now().time() >= datetime.time(17):  # 오후 5시 이후이면
         # 내일을 기준일로 설정
@@ -325,94 +358,65 @@ def briefing(uid: str, req_id: str, debugging: bool):
         date = datetime.datetime.now()
         date_ko = "오늘"
 
-    log.info("[#%s] briefing@chat.py: Date: %s" % (req_id, date))
-
-    def logging_time(original_fn):
-        def wrapper_fn(*args, **kwargs):
-            result = original_fn(*args, **kwargs)
-            if debugging:
-                start_time = time.time()
-                print("{} 실행.".format(original_fn.__name__))
-                end_time = time.time()
-                print(
-                    "{} 종료. 실행시간: {} 초".format(
-                        original_fn.__name__, end_time - start_time
-                    )
-                )
-            return result
-
-        return wrapper_fn
+    log.info("briefing@chat.py: Date: %s", date)
 
     # 첫 번째 말풍선
     # 헤더
-    @logging_time
-    def f_header():
-        global briefing_header, hd_err
-        if date.weekday() >= 5:  # 주말이면
-            log.info("[#%s] briefing@chat.py: Weekend" % req_id)
-            hd_err = "%s은 주말 입니다." % date_ko
-        else:
-            briefing_header = "%s은 %s(%s) 입니다." % (
-                date_ko,
-                date.date().isoformat(),
-                wday(date),
-            )
-            hd_err = None
+    if date.weekday() >= 5:  # 주말이면
+        log.info("briefing@chat.py: Weekend")
+        hd_err = "%s은 주말 입니다." % date_ko
+        return [hd_err], None, "안녕하세요, 흥덕고 급식입니다.\n" + hd_err
+    briefing_header = "%s은 %s(%s) 입니다." % (
+        date_ko,
+        date.date().isoformat(),
+        wday(date),
+    )
 
     # 학사일정
-    @logging_time
     def f_cal():
-        global briefing_schdl
         try:
-            briefing_schdl = get_data.schdl(
-                date.year, date.month, date.day, req_id, debugging
-            )
-            if not briefing_schdl:
-                log.info("[#%s] briefing@chat.py: No Schedule" % req_id)
-                briefing_schdl = "%s은 학사일정이 없습니다." % date_ko
-            else:
-                briefing_schdl = "%s 학사일정:\n%s" % (date_ko, briefing_schdl)
+            schdl = get_data.schdl(date.year, date.month, date.day, req_id, debugging)
+            if not schdl:
+                log.info("briefing@chat.py: No Schedule")
+                return "%s은 학사일정이 없습니다." % date_ko
+            return "%s 학사일정:\n%s" % (date_ko, schdl_text(schdl))
         except ConnectionError:
-            briefing_schdl = "학사일정 서버에 연결하지 못했습니다.\n나중에 다시 시도해 보세요."
+            return "학사일정 서버에 연결하지 못했습니다.\n나중에 다시 시도해 보세요."
 
     # 두 번째 말풍선
     # 날씨
-    @logging_time
     def f_weather():
-        global briefing_weather
         try:
-            briefing_weather = get_data.weather(date_ko, req_id, debugging)
+            return get_data.weather(date_ko, req_id, debugging)
         except ConnectionError:
-            briefing_weather = "날씨 서버에 연결하지 못했습니다.\n나중에 다시 시도해 보세요."
+            return "날씨 서버에 연결하지 못했습니다.\n나중에 다시 시도해 보세요."
 
     # 세 번째 말풍선
-    # 급식
-    @logging_time
+    # 급식, (카카오 응답, 구글어시스턴트 응답) 반환
     def f_meal():
-        global briefing_meal, briefing_meal_ga
         try:
             meal = get_data.meal(date.year, date.month, date.day, req_id, debugging)
             if not "message" in meal:  # 파서 메시지 있는지 확인, 없으면 만들어서 응답
-                briefing_meal_ga = "%s 급식은 %s 입니다." % (
-                    date_ko,
-                    ", ".join(i[0] for i in meal["menu"]).replace("⭐", ""),
-                )
-                briefing_meal = "%s 급식:\n%s" % (
-                    date_ko,
-                    "\n".join(i[0] for i in meal["menu"]),
+                menus = meal["rendered"]["None"]
+                return (
+                    "%s 급식:\n%s" % (date_ko, menus),
+                    "%s 급식은 %s 입니다."
+                    % (date_ko, menus.replace("\n", ", ").replace("⭐", "")),
                 )
             elif meal["message"] == "등록된 데이터가 없습니다.":
-                log.info("[#%s] briefing@chat.py: No Meal" % req_id)
-                briefing_meal_ga = date_ko + "은 급식을 실시하지 않습니다."
-                briefing_meal = date_ko + "은 급식을 실시하지 않습니다."
+                log.info("briefing@chat.py: No Meal")
+                return (
+                    date_ko + "은 급식을 실시하지 않습니다.",
+                    date_ko + "은 급식을 실시하지 않습니다.",
+                )
         except ConnectionError:
-            briefing_meal_ga = "급식 서버에 연결하지 못했습니다.\n나중에 다시 시도해 보세요."
-            briefing_meal = "급식 서버에 연결하지 못했습니다.\n나중에 다시 시도해 보세요."
+            return (
+                "급식 서버에 연결하지 못했습니다.\n나중에 다시 시도해 보세요.",
+                "급식 서버에 연결하지 못했습니다.\n나중에 다시 시도해 보세요.",
+            )
 
     # 시간표
-    @logging_time
     def f_tt():
-        global briefing_tt
         try:
             user_data = user.get_user(uid, req_id, debugging)  # 사용자 정보 불러오기
             tt_grade = user_data[0]
@@ -421,43 +425,48 @@ def briefing(uid: str, req_id: str, debugging: bool):
             if tt_grade is not None or tt_class is not None:  # 사용자 정보 있을 때
                 tt = get_data.tt(tt_grade, tt_class, date, req_id, debugging)
                 if tt == "등록된 데이터가 없습니다.":
-                    briefing_tt = "등록된 시간표가 없습니다."
-                else:
-                    briefing_tt = "%s 시간표:\n%s" % (
-                        date_ko,
-                        tt.split("):\n")[1],
-                    )  # 헤더부분 제거
+                    return "등록된 시간표가 없습니다."
+                return "%s 시간표:\n%s" % (date_ko, tt.split("):\n")[1])  # 헤더부분 제거
             else:
-                log.info("[#%s] briefing@chat.py: Non-Registered User" % req_id)
-                briefing_tt = "등록된 사용자만 시간표를 볼 수 있습니다."
+                log.info("briefing@chat.py: Non-Registered User")
+                return "등록된 사용자만 시간표를 볼 수 있습니다."
         except ConnectionError:
-            briefing_tt = "시간표 서버에 연결하지 못했습니다.\n나중에 다시 시도해 보세요."
-        except Exception as e:
-            log.err(
-                "[#%s] briefing@chat.py: Failed to Fetch Timetable because %s"
-                % (req_id, e)
+            return "시간표 서버에 연결하지 못했습니다.\n나중에 다시 시도해 보세요."
+
+    # 공용 쓰레드 풀에서 동시에 실행, 제한 시간 안에 끝난 항목만 사용
+    results = fan_out.run(
+        {
+            name: (fn, BRIEFING_TIMEOUTS[name])
+            for name, fn in (
+                ("schdl", f_cal),
+                ("weather", f_weather),
+                ("meal", f_meal),
+                ("tt", f_tt),
             )
+        },
+        req_id,
+        debugging,
+    )
 
-    # 쓰레드 정의
-    th_header = Thread(target=f_header)
-    th_cal = Thread(target=f_cal)
-    th_weather = Thread(target=f_weather)
-    th_meal = Thread(target=f_meal)
-    th_tt = Thread(target=f_tt)
-    # 쓰레드 실행
-    th_header.start()
-    th_cal.start()
-    th_weather.start()
-    th_meal.start()
-    th_tt.start()
-    # 전 쓰레드 종료 시까지 기다리기
-    th_header.join()
-    if hd_err:
-        return [hd_err], None, "안녕하세요, 흥덕고 급식입니다.\n" + hd_err
-    th_cal.join()
-    th_weather.join()
-    th_meal.join()
-    th_tt.join()
+    # 제한 시간을 넘겼거나 오류가 난 항목은 안내 메시지로 대신함
+    def result(name, server, subject):
+        value = results.get(name)
+        if value is fan_out.TIMEOUT:
+            reason = "%s 서버의 응답이 늦어" % server
+        elif value is None:
+            reason = "알 수 없는 오류로"
+        else:
+            return value
+        return "%s %s 불러올 수 없었습니다.\n나중에 다시 시도해 보세요." % (reason, subject)
+
+    briefing_schdl = result("schdl", "학사일정", "학사일정을")
+    briefing_weather = result("weather", "날씨", "날씨를")
+    briefing_tt = result("tt", "시간표", "시간표를")
+    meal = result("meal", "급식", "식단을")
+    if isinstance(meal, tuple):
+        briefing_meal, briefing_meal_ga = meal
+    else:
+        briefing_meal = briefing_meal_ga = meal
 
     # 구글어시스턴트 응답
     ga_respns = "안녕하세요, 흥덕고 급식입니다.\n" + briefing_meal_ga
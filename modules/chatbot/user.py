@@ -13,12 +13,11 @@ import os
 
 import pytz
 
-from modules.common import security, log
+from modules.chatbot import user_store
+from modules.common import context, security, log, trace
 
 timezone_local = pytz.timezone("Asia/Seoul")
 
-path = "./data/users.json"
-
 # 학급수 불러오기
 classes = int(os.environ.get("HDMeal_NumOfClasses"))
 # 오류 메세지
@@ -65,6 +64,7 @@ errors_conf = {
 preferences_default = {"AllergyInfo": "Number"}
 preferences_values = {"AllergyInfo": ["None", "Number", "FullText"]}
 
+
 # 오류 발생 처리
 def hdm_error(code: str):
     return {"message": errors_conf[code][0]}, errors_conf[code][1]
@@ -78,34 +78,52 @@ def json_default(value):
 
 
 # 사용자 정보 읽기
+@trace.traced()
+# 한 번 읽은 사용자 정보는 요청 컨텍스트에 보관해, 같은 요청 안에서는 저장소를 다시 확인하지 않음
+# 요청이 끝나면 함께 버려지며, 요청 사이에는 user_store의 캐시를 씀
 def get_user(uid: str, req_id: str, debugging: bool):
-    log.info("[#%s] get_user@modules/user.py: Started Fetching User Info" % req_id)
+    users = context.get("users")
+    if users is not None and uid in users:
+        grade, class_, preferences = users[uid]
+        return [grade, class_, dict(preferences)]
+    return_data = fetch_user(uid, req_id, debugging)
+    if isinstance(return_data, list) and context.req_id() is not None:
+        if users is None:
+            users = {}
+            context.put("users", users)
+        users[uid] = return_data[:2] + [dict(return_data[2])]
+    return return_data
+
+
+# 요청 컨텍스트에 보관한 사용자 정보 지우기
+def forget_user(uid: str):
+    users = context.get("users")
+    if users is not None:
+        users.pop(uid, None)
+
+
+# 저장소(와 메모리에 올려둔 사용자 정보)에서 사용자 정보 읽기
+def fetch_user(uid: str, req_id: str, debugging: bool):
+    log.info("get_user@modules/user.py: Started Fetching User Info")
     try:
-        with open(path, encoding="utf-8") as data_file:
-            data = json.load(data_file)
-        if debugging:
-            print(data)
-        if not uid in data:  # 사용자 정보 없을 때
+        data = user_store.get(uid)
+        if data is None:  # 사용자 정보 없을 때
             return_data = [None, None, {}]
-            log.info("[#%s] get_user@modules/user.py: No User Info" % req_id)
+            log.info("get_user@modules/user.py: No User Info")
             return return_data
         if debugging:
-            print(data[uid])
-        if data[uid]["Grade"] != "" or data[uid]["Class"] != "":  # 사용자 정보 있을 때
+            print(data)
+        if data["Grade"] != "" or data["Class"] != "":  # 사용자 정보 있을 때
             return_data = [
-                data[uid]["Grade"],
-                data[uid]["Class"],
-                data[uid]["Preferences"],
+                data["Grade"],
+                data["Class"],
+                data["Preferences"],
             ]
-            log.info("[#%s] get_user@modules/user.py: Succeeded" % req_id)
+            log.info("get_user@modules/user.py: Succeeded")
         else:  # 사용자 정보 없을 때
             return_data = [None, None, {}]
-            log.info("[#%s] get_user@modules/user.py: No User Info" % req_id)
+            log.info("get_user@modules/user.py: No User Info")
         return return_data
-    except FileNotFoundError:
-        with open(path, "w", encoding="utf-8") as write_file:
-            json.dump({}, write_file, ensure_ascii=False, indent="\t")
-        return [None, None, {}]
     except Exception as e:
         return e
 
@@ -119,87 +137,73 @@ def manage_user(
     req_id: str,
     debugging: bool,
 ):
-    log.info("[#%s] manage_user@user.py: Started Managing User Info" % req_id)
+    log.info("manage_user@user.py: Started Managing User Info")
     try:
-        try:
-            with open(path, encoding="utf-8") as data_file:
-                data = json.load(data_file)
-        except FileNotFoundError:
-            data = {}
-        if debugging:
-            print(data)
-        if uid in data:  # 사용자 정보 있을 때
-            current_settings = data[uid]
-            if preferences:
-                new_settings = {
-                    "Grade": user_grade,
-                    "Class": user_class,
-                    "Preferences": preferences,
-                }
-            else:
-                new_settings = {
-                    "Grade": user_grade,
-                    "Class": user_class,
-                    "Preferences": current_settings.get(
-                        "Preferences", preferences_default
-                    ),
-                }
-            if debugging:
-                print(current_settings)
-            if current_settings == new_settings:  # 사용자 정보 똑같을 때
-                log.info("[#%s] manage_user@user.py: Same" % req_id)
-                return "Same"
-            else:  # 사용자 정보 있고 같지도 않을 때 - 업데이트
-                del data[uid]
-                data[uid] = new_settings
+        # 다른 요청이 그 사이에 바꾸지 못하도록 읽고 쓰는 동안 잠금
+        with user_store.transaction():
+            current_settings = user_store.get(uid, cached=False)
+            if current_settings is not None:  # 사용자 정보 있을 때
+                if preferences:
+                    new_settings = {
+                        "Grade": user_grade,
+                        "Class": user_class,
+                        "Preferences": preferences,
+                    }
+                else:
+                    new_settings = {
+                        "Grade": user_grade,
+                        "Class": user_class,
+                        "Preferences": current_settings.get(
+                            "Preferences", preferences_default
+                        ),
+                    }
                 if debugging:
-                    print("DEL USER")
-                log.info("[#%s] manage_user@user.py: Updated" % req_id)
+                    print(current_settings)
+                if current_settings == new_settings:  # 사용자 정보 똑같을 때
+                    log.info("manage_user@user.py: Same")
+                    return "Same"
+                # 사용자 정보 있고 같지도 않을 때 - 업데이트
+                log.info("manage_user@user.py: Updated")
                 return_msg = "Updated"
-        else:  # 사용자 정보 없을 때 - 생성
-            if preferences:
-                new_settings = {
-                    "Grade": user_grade,
-                    "Class": user_class,
-                    "Preferences": preferences,
-                }
-            else:
-                new_settings = {
-                    "Grade": user_grade,
-                    "Class": user_class,
-                    "Preferences": preferences_default,
-                }
-            log.info("[#%s] manage_user@user.py: Registered" % req_id)
-            return_msg = "Registered"
-            data[uid] = new_settings
-        with open(path, "w", encoding="utf-8") as write_file:
-            json.dump(data, write_file, ensure_ascii=False, indent="\t")
-            log.info("[#%s] manage_user@user.py: Succeeded" % req_id)
-            return return_msg
+            else:  # 사용자 정보 없을 때 - 생성
+                if preferences:
+                    new_settings = {
+                        "Grade": user_grade,
+                        "Class": user_class,
+                        "Preferences": preferences,
+                    }
+                else:
+                    new_settings = {
+                        "Grade": user_grade,
+                        "Class": user_class,
+                        "Preferences": preferences_default,
+                    }
+                log.info("manage_user@user.py: Registered")
+                return_msg = "Registered"
+            user_store.put(uid, new_settings)
+        forget_user(uid)
+        log.info("manage_user@user.py: Succeeded")
+        return return_msg
     except Exception as e:
-        log.err("[#%s] manage_user@user.py: Failed" % req_id)
+        log.err("manage_user@user.py: Failed")
         return e
 
 
 # 사용자 삭제
 def delete_user(uid: str, req_id: str, debugging: bool):
-    log.info("[#%s] delete_user@user.py: Started Deleting User Info" % req_id)
+    log.info("delete_user@user.py: Started Deleting User Info")
     try:
-        with open(path, encoding="utf-8") as data_file:
-            data = json.load(data_file)
-        if uid in data:  # 사용자 정보 있을 때
-            if debugging:
-                print("DEL USER")
-            del data[uid]
-        else:  # 사용자 정보 없을 때
-            log.info("[#%s] delete_user@user.py: No User Info" % req_id)
+        deleted = user_store.delete(uid)
+        forget_user(uid)
+        if not deleted:  # 사용자 정보 없을 때
+            log.info("delete_user@user.py: No User Info")
             return "NotExist"
-        with open(path, "w", encoding="utf-8") as write_file:
-            json.dump(data, write_file, ensure_ascii=False, indent="\t")
-            log.info("[#%s] delete_user@user.py: Succeeded" % req_id)
-            return "Deleted"
+        if debugging:
+            print("DEL USER")
+        log.info("delete_user@user.py: Succeeded")
+        return "Deleted"
     except Exception as e:
-        log.err("[#%s] delete_user@user.py: Failed" % req_id)
+        log.err("delete_user@user.py: Failed")
         return e
 
 
@@ -210,25 +214,25 @@ def auth_admin(uid, req_id, debugging):
         print(uid)
         print(data)
     if uid in data:
-        log.info("[#%s] auth_admin@user.py: Match" % req_id)
+        log.info("auth_admin@user.py: Match")
         return True
     else:
-        log.info("[#%s] auth_admin@user.py: Not Match" % req_id)
+        log.info("auth_admin@user.py: Not Match")
         return False
 
 
 # 요청 데이터 해석
+# 해석한 데이터와 인증 정보는 동시에 들어온 다른 요청과 섞이지 않도록 요청 컨텍스트에 보관
 def decode_data(original_fn):
     def wrapper_fn(*args, **kwargs):
-        global req_data, req_args
         if args[0].data:
             try:
-                req_data = json.loads(args[0].data)
+                context.put("req_data", json.loads(args[0].data))
             except Exception:
                 return hdm_error("InvalidRequest")
         else:
-            req_data = {}
-        req_args = args[0].args
+            context.put("req_data", {})
+        context.put("req_args", args[0].args)
         return original_fn(*args, **kwargs)
 
     return wrapper_fn
@@ -237,7 +241,8 @@ def decode_data(original_fn):
 # JWT 토큰 검증
 def validate_token(original_fn):
     def wrapper_fn(*args, **kwargs):
-        global uid, token, scope
+        req_data = context.get("req_data", {})
+        req_args = context.get("req_args", {})
         if "token" in req_data:
             token = req_data["token"]
         elif "token" in req_args:
@@ -247,8 +252,8 @@ def validate_token(original_fn):
         if token:
             validation: tuple = security.validate_token(token, args[1])
             if validation[0]:
-                uid = validation[1]
-                scope = validation[2]
+                context.put("uid", validation[1])
+                context.put("scope", validation[2])
                 return original_fn(*args, **kwargs)
             else:
                 return hdm_error(validation[1])
@@ -261,7 +266,8 @@ def validate_token(original_fn):
 # 리캡챠 토큰 검증
 def validate_recaptcha(original_fn):
     def wrapper_fn(*args, **kwargs):
-        global token
+        req_data = context.get("req_data", {})
+        req_args = context.get("req_args", {})
         if "recaptcha" in req_data:
             recaptcha = req_data["recaptcha"]
         elif "recaptcha" in req_args:
@@ -275,7 +281,7 @@ def validate_recaptcha(original_fn):
             else:
                 return hdm_error(validation[1])
         else:
-            log.info("[#%s] validate_recaptcha@user.py: No Recaptcha Token" % args[1])
+            log.info("validate_recaptcha@user.py: No Recaptcha Token")
             return hdm_error("NoRecaptchaToken")
 
     return wrapper_fn
@@ -285,11 +291,12 @@ def validate_recaptcha(original_fn):
 @decode_data
 @validate_token
 def user_settings_rest_get(req, req_id, debugging):
-    if uid and "GetUserInfo" in scope:
+    uid = context.get("uid")
+    if uid and "GetUserInfo" in context.get("scope", []):
         try:
             user = get_user(uid, req_id, debugging)
         except Exception as error:
-            log.err("[#%s] user_settings_rest_get@user.py: %s" % (req_id, error))
+            log.err("user_settings_rest_get@user.py: %s", error)
             return hdm_error("ServerError")
         return {
             "classes": list(range(1, classes + 1)),
@@ -306,7 +313,9 @@ def user_settings_rest_get(req, req_id, debugging):
 @validate_recaptcha
 @validate_token
 def user_settings_rest_post(req, req_id, debugging):
-    if not uid or not "ManageUserInfo" in scope:
+    uid = context.get("uid")
+    req_data = context.get("req_data", {})
+    if not uid or not "ManageUserInfo" in context.get("scope", []):
         return hdm_error("InvalidToken")
     if "user_grade" in req_data and "user_class" in req_data:
         user_grade = int(req_data["user_grade"])
@@ -329,9 +338,7 @@ def user_settings_rest_post(req, req_id, debugging):
                         debugging,
                     )
                 except Exception as error:
-                    log.err(
-                        "[#%s] user_settings_rest_post@user.py: %s" % (req_id, error)
-                    )
+                    log.err("user_settings_rest_post@user.py: %s", error)
                     return hdm_error("ServerError")
             return {"message": "저장했습니다."}
     return hdm_error("InvalidRequest")
@@ -342,12 +349,13 @@ def user_settings_rest_post(req, req_id, debugging):
 @validate_recaptcha
 @validate_token
 def user_settings_rest_delete(req, req_id, debugging):
-    if not uid or not "ManageUserInfo" in scope:
+    uid = context.get("uid")
+    if not uid or not "ManageUserInfo" in context.get("scope", []):
         return hdm_error("InvalidToken")
     try:
         delete_user(uid, req_id, debugging)
     except Exception as error:
-        log.err("[#%s] user_settings_rest_delete@user.py: %s" % (req_id, error))
+        log.err("user_settings_rest_delete@user.py: %s", error)
         return hdm_error("ServerError")
     return {"message": "삭제했습니다."}
 
@@ -360,8 +368,6 @@ if __name__ == "__main__":
     user_id = "uid"
     user_grade = 1
     user_class = 1
-
-    path = "../data/users.json"
     if flag == 0:
         print(get_user(user_id, "****DEBUG****", True))
     elif flag == 1:
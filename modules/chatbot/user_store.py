@@ -0,0 +1,227 @@
+# ██╗  ██╗██████╗ ███╗   ███╗███████╗ █████╗ ██╗
+# ██║  ██║██╔══██╗████╗ ████║██╔════╝██╔══██╗██║
+# ███████║██║  ██║██╔████╔██║█████╗  ███████║██║
+# ██╔══██║██║  ██║██║╚██╔╝██║██╔══╝  ██╔══██║██║
+# ██║  ██║██████╔╝██║ ╚═╝ ██║███████╗██║  ██║███████╗
+# ╚═╝  ╚═╝╚═════╝ ╚═╝     ╚═╝╚══════╝╚═╝  ╚═╝╚══════╝
+# Copyright 2019-2020, Hyungyo Seo
+# user_store.py - 사용자 정보를 SQLite 파일에 저장하는 스크립트입니다.
+
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from modules.common import log
+
+PATH = os.environ.get("HDMeal_UserDB", "data/users.sqlite3")
+JSON_PATH = "data/users.json"  # 예전 사용자 정보 파일, 처음 한 번만 옮겨옴
+SCHEMA_VERSION = 2
+CACHE_SIZE = 4096  # 메모리에 올려둘 사용자 수
+CHANGES_KEPT = 10000  # 변경 기록을 남겨둘 개수
+
+_local = threading.local()
+_lock = threading.Lock()
+_cache = OrderedDict()  # uid: 사용자 정보(없는 사용자는 None)
+_cache_pid = None
+_last_change = None  # 캐시에 반영한 마지막 변경 번호
+_invalidations = 0  # 캐시에서 지운 횟수, 읽는 사이에 바뀌었는지 확인하는 데 씀
+
+
+# 쓰레드(와 프로세스)마다 연결을 따로 만듦
+def connect():
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+    conn = sqlite3.connect(PATH, timeout=10, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    migrate(conn)
+    _local.conn = conn
+    _local.pid = os.getpid()
+    _local.data_version = None
+    return conn
+
+
+# 테이블 만들기 및 users.json 옮겨오기
+# 여러 프로세스가 동시에 시작해도 한 번만 실행되도록 쓰기 잠금을 잡고 버전을 확인함
+def migrate(conn):
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS users ("
+                "uid TEXT PRIMARY KEY, "
+                "grade, "
+                "class, "
+                "preferences TEXT NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            try:
+                with open(JSON_PATH, encoding="utf-8") as data_file:
+                    data = json.load(data_file)
+            except FileNotFoundError:
+                data = {}
+            conn.executemany(
+                "INSERT OR IGNORE INTO users (uid, grade, class, preferences) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (
+                        uid,
+                        settings.get("Grade"),
+                        settings.get("Class"),
+                        json.dumps(settings.get("Preferences", {}), ensure_ascii=False),
+                    )
+                    for uid, settings in data.items()
+                ],
+            )
+            log.info("migrate@user_store.py: Migrated %d User(s)", len(data))
+        if version < 2:
+            # 바뀐 사용자 기록, 다른 프로세스가 자기 캐시에서 지울 항목을 찾는 데 씀
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS changes ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "uid TEXT NOT NULL"
+                ")"
+            )
+        conn.execute("PRAGMA user_version = %d" % SCHEMA_VERSION)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+# 트랜잭션, 안에서 읽고 쓴 내용이 한 번에 반영됨
+# 이미 트랜잭션 안이면 바깥 트랜잭션에 합쳐짐
+@contextlib.contextmanager
+def transaction():
+    conn = connect()
+    if conn.in_transaction:
+        yield
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+# 다른 연결이 쓴 변경 사항을 캐시에 반영
+# PRAGMA data_version은 다른 연결이 커밋했을 때만 바뀌므로, 바뀌지 않았으면 테이블을 읽지 않음
+def sync(conn):
+    global _cache_pid, _last_change, _invalidations
+    version = conn.execute("PRAGMA data_version").fetchone()[0]
+    if getattr(_local, "data_version", None) == version:
+        return
+    with _lock:
+        if _cache_pid != os.getpid():  # fork된 뒤 처음 - 부모 프로세스의 캐시는 버림
+            _cache.clear()
+            _cache_pid = os.getpid()
+            _last_change = None
+        if _last_change is None:
+            _last_change = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM changes"
+            ).fetchone()[0]
+        else:
+            rows = conn.execute(
+                "SELECT seq, uid FROM changes WHERE seq > ? ORDER BY seq",
+                (_last_change,),
+            ).fetchall()
+            # 기록이 정리돼 빠진 변경이 있으면 무엇이 바뀌었는지 알 수 없으므로 전부 버림
+            if rows and rows[0][0] != _last_change + 1:
+                _cache.clear()
+            for seq, uid in rows:
+                _cache.pop(uid, None)
+                _last_change = seq
+            if rows:
+                _invalidations += 1
+    _local.data_version = version
+
+
+# 사용자 정보 읽기
+# {"Grade": 학년, "Class": 반, "Preferences": 설정} 반환, 없으면 None
+# cached가 참이면 메모리에 올려둔 정보를 먼저 찾음, 트랜잭션 안에서는 False로 호출
+def get(uid: str, cached: bool = True):
+    if not cached:
+        return read(uid)
+    sync(connect())
+    with _lock:
+        if uid in _cache:
+            _cache.move_to_end(uid)
+            return duplicate(_cache[uid])
+        invalidations = _invalidations
+    data = read(uid)
+    with _lock:
+        if invalidations != _invalidations:  # 읽는 사이에 누가 씀, 캐시에 넣지 않음
+            return data
+        _cache[uid] = duplicate(data)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return data
+
+
+# 캐시에 넣은 사용자 정보를 호출한 쪽에서 바꿔도 캐시에는 영향이 없도록 복사
+# 설정은 한 단계짜리 dict라 deepcopy까지 쓰지 않음
+def duplicate(data):
+    if data is None:
+        return None
+    return dict(data, Preferences=dict(data["Preferences"]))
+
+
+# 저장소에서 사용자 정보 읽기
+def read(uid: str):
+    row = (
+        connect()
+        .execute(
+            "SELECT grade, class, preferences FROM users WHERE uid = ?",
+            (uid,),
+        )
+        .fetchone()
+    )
+    if row is None:
+        return None
+    return {"Grade": row[0], "Class": row[1], "Preferences": json.loads(row[2])}
+
+
+# 바뀐 사용자 기록 및 캐시에서 지우기
+def changed(conn, uid: str):
+    global _invalidations
+    seq = conn.execute("INSERT INTO changes (uid) VALUES (?)", (uid,)).lastrowid
+    conn.execute("DELETE FROM changes WHERE seq <= ?", (seq - CHANGES_KEPT,))
+    with _lock:
+        _cache.pop(uid, None)
+        _invalidations += 1
+
+
+# 사용자 정보 쓰기
+def put(uid: str, settings: dict):
+    conn = connect()
+    with transaction():
+        conn.execute(
+            "INSERT OR REPLACE INTO users (uid, grade, class, preferences) "
+            "VALUES (?, ?, ?, ?)",
+            (
+                uid,
+                settings["Grade"],
+                settings["Class"],
+                json.dumps(settings["Preferences"], ensure_ascii=False),
+            ),
+        )
+        changed(conn, uid)
+
+
+# 사용자 정보 삭제, 삭제했으면 True
+def delete(uid: str):
+    conn = connect()
+    with transaction():
+        if conn.execute("DELETE FROM users WHERE uid = ?", (uid,)).rowcount == 0:
+            return False
+        changed(conn, uid)
+    return True
@@ -0,0 +1,304 @@
+# ██╗  ██╗██████╗ ███╗   ███╗███████╗ █████╗ ██╗
+# ██║  ██║██╔══██╗████╗ ████║██╔════╝██╔══██╗██║
+# ███████║██║  ██║██╔████╔██║█████╗  ███████║██║
+# ██╔══██║██║  ██║██║╚██╔╝██║██╔══╝  ██╔══██║██║
+# ██║  ██║██████╔╝██║ ╚═╝ ██║███████╗██║  ██║███████╗
+# ╚═╝  ╚═╝╚═════╝ ╚═╝     ╚═╝╚══════╝╚═╝  ╚═╝╚══════╝
+# Copyright 2019-2020, Hyungyo Seo
+# cache_store.py - 캐시 데이터를 저장하는 저장소를 관리하는 스크립트입니다.
+
+import datetime
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# 사용할 저장소: json(data/cache 폴더에 파일로 저장), sqlite(SQLite 파일 하나에 저장)
+BACKEND = os.environ.get("HDMeal_CacheBackend", "json")
+CACHE_DIR = "data/cache"
+SQLITE_PATH = os.environ.get("HDMeal_CacheDB", "data/cache/cache.sqlite3")
+
+# 네임스페이스별 키 형식과 JSON 파일 이름
+# 키는 문자열 순서가 날짜 순서와 같도록 0을 채워 씀
+NAMESPACES = {
+    "meal": {
+        "key": re.compile(r"^\d{4}-\d{2}-\d{2}$"),  # YYYY-MM-DD
+        "file": re.compile(r"^(\d{4}-\d{2}-\d{2})\.json$"),
+        "filename": lambda key: "%s.json" % key,
+    },
+    "schdl": {
+        "key": re.compile(r"^\d{4}-\d{2}$"),  # YYYY-MM
+        "file": re.compile(r"^Cal-(\d+)-(\d+)\.json$"),
+        "filename": lambda key: "Cal-%d-%d.json" % tuple(map(int, key.split("-"))),
+    },
+    "tt": {
+        "key": re.compile(r"^\d{4}-\d{2}-\d{2}$"),  # YYYY-MM-DD
+        "file": re.compile(r"^TT-(\d{4}-\d{2}-\d{2})\.json$"),
+        "filename": lambda key: "TT-%s.json" % key,
+    },
+    "weather": {
+        "key": re.compile(r"^$"),  # 하나만 저장
+        "file": re.compile(r"^weather\.json$"),
+        "filename": lambda key: "weather.json",
+    },
+    "wtemp": {
+        "key": re.compile(r"^$"),  # 하나만 저장
+        "file": re.compile(r"^wtemp\.json$"),
+        "filename": lambda key: "wtemp.json",
+    },
+}
+
+
+# 네임스페이스 확인
+def check_namespace(namespace: str):
+    if namespace not in NAMESPACES:
+        raise KeyError("Unknown Cache Namespace: %s" % namespace)
+
+
+# 키 확인
+def check_key(namespace: str, key: str):
+    check_namespace(namespace)
+    if not NAMESPACES[namespace]["key"].match(key):
+        raise ValueError("Invalid Cache Key for %s: %s" % (namespace, key))
+
+
+# data/cache 폴더에 파일로 저장하는 저장소
+class JSONDirBackend:
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path(self, namespace: str, key: str):
+        return os.path.join(self.directory, NAMESPACES[namespace]["filename"](key))
+
+    def read(self, namespace: str, key: str):
+        try:
+            with open(self.path(namespace, key), encoding="utf-8") as data_file:
+                return json.load(data_file, object_pairs_hook=OrderedDict)
+        except FileNotFoundError:
+            return None
+
+    def write_many(self, namespace: str, items: dict):
+        for key, data in items.items():
+            # 다른 프로세스가 쓰다 만 파일을 읽지 않도록 임시 파일에 쓴 뒤 바꿔치기함
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as make_file:
+                json.dump(data, make_file, ensure_ascii=False)
+            os.replace(temp_path, self.path(namespace, key))
+
+    def delete(self, namespace: str, key: str):
+        try:
+            os.remove(self.path(namespace, key))
+        except FileNotFoundError:
+            pass
+
+    def stamp(self, namespace: str, key: str):
+        try:
+            return os.stat(self.path(namespace, key)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def fetched_at(self, namespace: str, key: str):
+        try:
+            return os.stat(self.path(namespace, key)).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def keys(self, namespace: str):
+        pattern = NAMESPACES[namespace]["file"]
+        keys = []
+        for filename in os.listdir(self.directory):
+            match = pattern.match(filename)
+            if not match:
+                continue
+            if namespace == "schdl":
+                keys.append("%04d-%02d" % tuple(map(int, match.groups())))
+            elif match.groups():
+                keys.append(match.group(1))
+            else:
+                keys.append("")
+        return sorted(keys)
+
+    def read_range(self, namespace: str, start: str, end: str):
+        result = []
+        for key in self.keys(namespace):
+            if start <= key <= end:
+                data = self.read(namespace, key)
+                if data is not None:
+                    result.append((key, data))
+        return result
+
+    def purge(self):
+        for filename in os.listdir(self.directory):
+            if filename.endswith(".json"):
+                os.remove(os.path.join(self.directory, filename))
+
+
+# SQLite 파일 하나에 저장하는 저장소
+# WAL 모드를 사용해 여러 워커가 동시에 읽고 쓸 수 있음
+class SQLiteBackend:
+    def __init__(self, path: str):
+        self.path = path
+        self.local = threading.local()
+
+    # 쓰레드(와 프로세스)마다 연결을 따로 만듦
+    def connect(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None and self.local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "namespace TEXT NOT NULL, "
+            "key TEXT NOT NULL, "
+            "data TEXT NOT NULL, "
+            "fetched_at REAL NOT NULL, "
+            "PRIMARY KEY (namespace, key)"
+            ") WITHOUT ROWID"
+        )
+        self.local.conn = conn
+        self.local.pid = os.getpid()
+        return conn
+
+    def read(self, namespace: str, key: str):
+        row = (
+            self.connect()
+            .execute(
+                "SELECT data FROM cache WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return json.loads(row[0], object_pairs_hook=OrderedDict)
+
+    def write_many(self, namespace: str, items: dict):
+        now = time.time()
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache (namespace, key, data, fetched_at) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (namespace, key, json.dumps(data, ensure_ascii=False), now)
+                    for key, data in items.items()
+                ],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, namespace: str, key: str):
+        self.connect().execute(
+            "DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+        )
+
+    def stamp(self, namespace: str, key: str):
+        return self.fetched_at(namespace, key)
+
+    def fetched_at(self, namespace: str, key: str):
+        row = (
+            self.connect()
+            .execute(
+                "SELECT fetched_at FROM cache WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            )
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def keys(self, namespace: str):
+        return [
+            row[0]
+            for row in self.connect().execute(
+                "SELECT key FROM cache WHERE namespace = ? ORDER BY key", (namespace,)
+            )
+        ]
+
+    def read_range(self, namespace: str, start: str, end: str):
+        return [
+            (row[0], json.loads(row[1], object_pairs_hook=OrderedDict))
+            for row in self.connect().execute(
+                "SELECT key, data FROM cache "
+                "WHERE namespace = ? AND key BETWEEN ? AND ? ORDER BY key",
+                (namespace, start, end),
+            )
+        ]
+
+    def purge(self):
+        self.connect().execute("DELETE FROM cache")
+
+
+if BACKEND == "json":
+    backend = JSONDirBackend(CACHE_DIR)
+elif BACKEND == "sqlite":
+    backend = SQLiteBackend(SQLITE_PATH)
+else:
+    raise Exception(
+        "설정 파일 오류: CacheBackend 값은 [json, sqlite] 중 하나여야 합니다."
+    )
+
+
+# 읽기, 없으면 None
+def read(namespace: str, key: str = ""):
+    check_key(namespace, key)
+    return backend.read(namespace, key)
+
+
+# 쓰기
+def write(namespace: str, key: str, data):
+    write_many(namespace, {key: data})
+
+
+# 여러 항목을 한 번에 쓰기
+def write_many(namespace: str, items: dict):
+    for key in items:
+        check_key(namespace, key)
+    if items:
+        backend.write_many(namespace, items)
+
+
+# 지우기
+def delete(namespace: str, key: str = ""):
+    check_key(namespace, key)
+    backend.delete(namespace, key)
+
+
+# 항목이 바뀌었는지 확인하기 위한 값, 없으면 None
+def stamp(namespace: str, key: str = ""):
+    check_key(namespace, key)
+    return backend.stamp(namespace, key)
+
+
+# 저장된 시각, 없으면 None
+def fetched_at(namespace: str, key: str = ""):
+    check_key(namespace, key)
+    timestamp = backend.fetched_at(namespace, key)
+    if timestamp is None:
+        return None
+    return datetime.datetime.fromtimestamp(timestamp)
+
+
+# 저장된 키 목록(정렬됨)
+def keys(namespace: str):
+    check_namespace(namespace)
+    return backend.keys(namespace)
+
+
+# start부터 end까지의 (키, 데이터) 목록(정렬됨)
+def read_range(namespace: str, start: str, end: str):
+    check_namespace(namespace)
+    return backend.read_range(namespace, start, end)
+
+
+# 전부 지우기
+def purge():
+    backend.purge()
@@ -0,0 +1,106 @@
+# ██╗  ██╗██████╗ ███╗   ███╗███████╗ █████╗ ██╗
+# ██║  ██║██╔══██╗████╗ ████║██╔════╝██╔══██╗██║
+# ███████║██║  ██║██╔████╔██║█████╗  ███████║██║
+# ██╔══██║██║  ██║██║╚██╔╝██║██╔══╝  ██╔══██║██║
+# ██║  ██║██████╔╝██║ ╚═╝ ██║███████╗██║  ██║███████╗
+# ╚═╝  ╚═╝╚═════╝ ╚═╝     ╚═╝╚══════╝╚═╝  ╚═╝╚══════╝
+# Copyright 2019-2020, Hyungyo Seo
+# context.py - 요청 ID, 처리 시간 등 요청별 정보를 쓰레드/비동기 작업마다 따로 관리하는 스크립트입니다.
+
+import contextlib
+import contextvars
+import threading
+import time
+
+_current = contextvars.ContextVar("hdmeal_request", default=None)
+_lock = threading.Lock()
+
+
+# 요청 시작
+# 반환값은 end()에 넘겨야 함
+def start(req_id: str):
+    return _current.set(
+        {
+            "req_id": req_id,
+            "started": time.perf_counter(),
+            "timings": {},  # 구간 이름: 걸린 시간(초)
+            "values": {},  # 요청별로 보관할 값(인증된 사용자 등)
+        }
+    )
+
+
+# 요청 끝
+def end(token):
+    _current.reset(token)
+
+
+# with 문에서 쓰는 start()/end()
+@contextlib.contextmanager
+def request(req_id: str):
+    token = start(req_id)
+    try:
+        yield
+    finally:
+        end(token)
+
+
+# 현재 요청 ID, 요청 밖이면 None
+def req_id():
+    current = _current.get()
+    return current["req_id"] if current is not None else None
+
+
+# 요청별 값 읽기/쓰기
+def get(key: str, default=None):
+    current = _current.get()
+    if current is None:
+        return default
+    return current["values"].get(key, default)
+
+
+def put(key: str, value):
+    current = _current.get()
+    if current is not None:
+        current["values"][key] = value
+
+
+# 요청 시작부터 지난 시간(초), 요청 밖이면 None
+def elapsed():
+    current = _current.get()
+    if current is None:
+        return None
+    return time.perf_counter() - current["started"]
+
+
+# 구간 시간 재기, 같은 이름으로 여러 번 재면 합산됨
+@contextlib.contextmanager
+def timed(name: str):
+    current = _current.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if current is not None:
+            spent = time.perf_counter() - started
+            with _lock:
+                current["timings"][name] = current["timings"].get(name, 0.0) + spent
+
+
+# 구간별 걸린 시간(초)
+def timings():
+    current = _current.get()
+    if current is None:
+        return {}
+    with _lock:
+        return dict(current["timings"])
+
+
+# 다른 쓰레드에서 실행할 함수를 현재 요청 안에서 실행되도록 감쌈
+# 쓰레드 풀, threading.Thread는 호출한 쪽의 contextvars를 물려받지 않기 때문
+def wrap(fn):
+    ctx = contextvars.copy_context()
+
+    def wrapper(*args, **kwargs):
+        return ctx.run(fn, *args, **kwargs)
+
+    return wrapper
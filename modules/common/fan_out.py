@@ -0,0 +1,88 @@
+# ██╗  ██╗██████╗ ███╗   ███╗███████╗ █████╗ ██╗
+# ██║  ██║██╔══██╗████╗ ████║██╔════╝██╔══██╗██║
+# ███████║██║  ██║██╔████╔██║█████╗  ███████║██║
+# ██╔══██║██║  ██║██║╚██╔╝██║██╔══╝  ██╔══██║██║
+# ██║  ██║██████╔╝██║ ╚═╝ ██║███████╗██║  ██║███████╗
+# ╚═╝  ╚═╝╚═════╝ ╚═╝     ╚═╝╚══════╝╚═╝  ╚═╝╚══════╝
+# Copyright 2019-2020, Hyungyo Seo
+# fan_out.py - 여러 작업을 공용 쓰레드 풀에서 동시에 실행하고 제한 시간 안에 끝난 결과만 모으는 스크립트입니다.
+
+import concurrent.futures
+import os
+import threading
+import time
+
+from modules.common import context, log
+
+# 프로세스당 쓰레드 수
+WORKERS = int(os.environ.get("HDMeal_FanOutWorkers", "16"))
+
+# 제한 시간 안에 끝나지 않은 작업의 결과
+TIMEOUT = object()
+
+# 쓰레드는 처음 작업을 넣을 때 만들어지므로 gunicorn 워커마다 따로 생김
+_pool = concurrent.futures.ThreadPoolExecutor(
+    max_workers=WORKERS, thread_name_prefix="fan_out"
+)
+_lock = threading.Lock()
+_overdue = {}  # 이름: 제한 시간을 넘기고도 아직 끝나지 않은 작업 수
+
+
+# 작업 실행
+# tasks: {이름: (함수, 제한 시간(초))}, 제한 시간은 run()을 호출한 시점부터 셈
+# 제한 시간에는 풀에서 빈 쓰레드를 기다리는 시간도 포함되므로, 풀이 밀리면 시작도 못 하고 넘길 수 있음
+# {이름: 결과}를 반환하며, 제한 시간을 넘긴 작업은 TIMEOUT, 예외가 난 작업은 빠짐
+# 제한 시간을 넘긴 작업은 멈추지 않고 뒤에서 계속 실행됨(캐시를 채워두기 위함)
+# 그 작업이 끝날 때까지 이름이 같은 작업은 새로 넣지 않고 바로 TIMEOUT으로 처리해
+# 느린 외부 서버를 기다리는 작업이 풀의 쓰레드를 모두 차지하지 않도록 함
+# 작업은 호출한 쪽의 요청 컨텍스트 안에서 실행됨
+def run(tasks: dict, req_id: str, debugging: bool = False):
+    started = time.monotonic()
+    futures = {}
+    with _lock:
+        overdue = {name for name in tasks if _overdue.get(name)}
+    for name, (fn, _) in tasks.items():
+        if name not in overdue:
+            futures[name] = _pool.submit(context.wrap(timed(name, fn)))
+
+    results = {}
+    # 제한 시간이 짧은 작업부터 기다림
+    for name in sorted(tasks, key=lambda name: tasks[name][1]):
+        if name in overdue:
+            log.err("run@fan_out.py: %s Skipped (Previous One Still Running)", name)
+            results[name] = TIMEOUT
+            continue
+        remaining = started + tasks[name][1] - time.monotonic()
+        try:
+            results[name] = futures[name].result(timeout=max(remaining, 0))
+        except concurrent.futures.TimeoutError:
+            log.err("run@fan_out.py: %s Timed Out (%.1fs)", name, tasks[name][1])
+            results[name] = TIMEOUT
+            mark_overdue(name, futures[name])
+        except Exception as e:
+            log.err("run@fan_out.py: %s Failed because %s", name, e)
+        if debugging:
+            print("%s 종료. 실행시간: %.3f 초" % (name, time.monotonic() - started))
+    return results
+
+
+# 제한 시간을 넘긴 작업 기록, 작업이 끝나면 지움
+def mark_overdue(name: str, future):
+    def done(_):
+        with _lock:
+            _overdue[name] -= 1
+            if not _overdue[name]:
+                del _overdue[name]
+
+    with _lock:
+        _overdue[name] = _overdue.get(name, 0) + 1
+    future.add_done_callback(done)
+
+
+# 작업별 실행 시간을 요청 컨텍스트에 기록
+def timed(name: str, fn):
+    def wrapper():
+        with context.timed("fan_out." + name):
+            return fn()
+
+    return wrapper
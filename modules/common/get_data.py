@@ -7,13 +7,21 @@
 # Copyright 2019-2020, Hyungyo Seo
 # get_data.py - 급식, 시간표, 캐시정보를 가져오는 스크립트입니다.
 
+import bisect
+import calendar
 import datetime
 import json
-import os
-import urllib.request
-from collections import OrderedDict
-
-from modules.common import log
+from itertools import groupby
+
+from modules.common import (
+    cache_store,
+    log,
+    memory_cache,
+    metrics,
+    single_flight,
+    trace,
+    upstream,
+)
 from modules.common.parsers import (
     menu_parser,
     water_temp_parser,
@@ -22,6 +30,23 @@ from modules.common.parsers import (
     timetable_parser,
 )
 
+# 급식 없음 캐시 유효기간(나중에 식단이 등록될 수 있으므로 짧게 잡음)
+MEAL_NEGATIVE_TTL = datetime.timedelta(hours=6)
+# 날씨, 한강 수온 캐시 유효기간
+# 유효기간이 지났어도 최대 허용 기간 안이면 지난 데이터로 바로 응답하고 뒤에서 새로 받아옴
+WEATHER_TTL = datetime.timedelta(hours=1)
+WEATHER_MAX_STALE = datetime.timedelta(hours=3)
+# 실시간수질정보시스템상 자료처리 시간 고려, 유효기간 76분으로 설정
+WTEMP_TTL = datetime.timedelta(minutes=76)
+WTEMP_MAX_STALE = datetime.timedelta(hours=3)
+# 한강 수온을 받아오지 못했거나 무효값을 받았을 때 다시 받아오지 않는 기간
+WTEMP_NEGATIVE_TTL = datetime.timedelta(minutes=10)
+# 학사일정 학년 수(NEIS 학년별 행사 여부 열 수)
+SCHDL_GRADES = 6
+
+# 달마다 만들어둔 학년별 학사일정 색인, {캐시 키: (원본 데이터, 색인)}
+_schdl_indexes = {}
+
 
 def wday(weekday):
     if weekday == 0:
@@ -43,6 +68,7 @@ def wday(weekday):
 
 
 # 급식정보 가져오기
+@trace.traced()
 def meal(year, month, date, req_id, debugging):
     # 자료형 변환
     year = str(year).zfill(4)
@@ -50,46 +76,115 @@ def meal(year, month, date, req_id, debugging):
     date = str(date).zfill(2)
 
     log.info(
-        "[#%s] meal@get_data.py: Started Fetching Meal Data(%s-%s-%s)"
-        % (req_id, year, month, date)
+        "meal@get_data.py: Started Fetching Meal Data(%s-%s-%s)", year, month, date
     )
 
-    if not os.path.isfile("data/cache/" + year + "-" + month + "-" + date + ".json"):
-        menu_parser.parse(year, month, date, req_id, debugging)
-
-    try:
-        with open(
-            "data/cache/" + year + "-" + month + "-" + date + ".json", encoding="utf-8"
-        ) as data_file:
-            data = json.load(data_file, object_pairs_hook=OrderedDict)
-            json_data = data
-    except FileNotFoundError:  # 파일 없을때
+    cache_key = "%s-%s-%s" % (year, month, date)
+
+    # 캐시 읽기, 급식 없음 캐시가 만료됐거나 예전 형식이면 None
+    def cached():
+        data = memory_cache.load("meal", cache_key)
+        if data is not None and "menu" in data and "rendered" not in data:
+            return None
+        if (
+            data is not None
+            and "message" in data
+            and datetime.datetime.now()
+            - datetime.datetime.fromtimestamp(data["Timestamp"])
+            >= MEAL_NEGATIVE_TTL
+        ):
+            return None
+        return data
+
+    json_data = cached()
+    if json_data is None:
+        # 급식 없음 캐시가 만료됐거나 예전 형식이면 그 날만 다시 파싱
+        if cache_store.stamp("meal", cache_key) is not None:
+            log.info(
+                "meal@get_data.py: No Meal Cache Expired(%s-%s-%s)", year, month, date
+            )
+            date_from = date_to = datetime.date(int(year), int(month), int(date))
+            flight_key = "meal-%s" % cache_key
+        else:  # 캐시 없으면 그 달 전체를 한 번에 파싱
+            date_from = datetime.date(int(year), int(month), 1)
+            date_to = (date_from + datetime.timedelta(days=32)).replace(
+                day=1
+            ) - datetime.timedelta(days=1)
+            flight_key = "meal-%s-%s" % (year, month)
+
+        def fetch():
+            served = menu_parser.parse_range(date_from, date_to, req_id, debugging)
+            # 급식이 없는 날은 급식 없음 캐시를 남겨 다시 요청하지 않도록 함
+            days = []
+            day = date_from
+            while day <= date_to:
+                if day not in served:
+                    days.append(day)
+                day += datetime.timedelta(days=1)
+            # 이유로 쓸 학사일정은 평일이 있을 때만 그 달 색인을 한 번 읽어 씀
+            index = None
+            if any(day.weekday() < 5 for day in days):
+                try:
+                    index = schdl_month_index(
+                        date_from.year, date_from.month, req_id, debugging
+                    )
+                except ConnectionError:
+                    pass
+            no_meal = {day.isoformat(): no_meal_entry(day, index) for day in days}
+            cache_store.write_many("meal", no_meal)
+            return served
+
+        # 같은 달을 동시에 여러 번 받아오지 않도록 요청을 합침
+        single_flight.do(flight_key, fetch, check=cached)
+        json_data = cached()
+
+    if json_data is None:  # 캐시 없을때
         if debugging:
             print("FileNotFound")
-        log.info(
-            "[#%s] meal@get_data.py: No Meal Data(%s-%s-%s)"
-            % (req_id, year, month, date)
-        )
+        log.info("meal@get_data.py: No Meal Data(%s-%s-%s)", year, month, date)
         return {"message": "등록된 데이터가 없습니다."}
-    log.info(
-        "[#%s] meal@get_data.py: Succeeded(%s-%s-%s)" % (req_id, year, month, date)
-    )
+    if "message" in json_data:
+        log.info("meal@get_data.py: No Meal(%s-%s-%s)", year, month, date)
+        return json_data
+    log.info("meal@get_data.py: Succeeded(%s-%s-%s)", year, month, date)
     return json_data
 
 
+# 급식 없음 캐시 항목 만들기
+# index(그 달의 학사일정 색인)에 일정이 있으면 급식을 실시하지 않는 이유로 함께 기록
+def no_meal_entry(day: datetime.date, index):
+    reason = None
+    if day.weekday() < 5 and index is not None:
+        reason = ", ".join(name for name, _ in day_events(index, day.day)) or None
+    return {
+        "message": "등록된 데이터가 없습니다.",
+        "reason": reason,
+        "Timestamp": int(datetime.datetime.now().timestamp()),
+    }
+
+
 # 시간표정보 가져오기
+@trace.traced()
 def tt(tt_grade: int, tt_class: int, date, req_id, debugging):
     tt_weekday = date.weekday()
 
     log.info(
-        "[#%s] tt@get_data.py: Started Fetching Timetable Data(%s-%s, %s-%s-%s)"
-        % (req_id, tt_grade, tt_class, date.year, date.month, date.day)
+        "tt@get_data.py: Started Fetching Timetable Data(%s-%s, %s-%s-%s)",
+        tt_grade,
+        tt_class,
+        date.year,
+        date.month,
+        date.day,
     )
 
     if tt_weekday >= 5:  # 토요일, 일요일 제외
         log.info(
-            "[#%s] tt@get_data.py: No Timetable Data(%s-%s, %s-%s-%s)"
-            % (req_id, tt_grade, tt_class, date.year, date.month, date.day)
+            "tt@get_data.py: No Timetable Data(%s-%s, %s-%s-%s)",
+            tt_grade,
+            tt_class,
+            date.year,
+            date.month,
+            date.day,
         )
         return "등록된 데이터가 없습니다."
 
@@ -99,8 +194,12 @@ def tt(tt_grade: int, tt_class: int, date, req_id, debugging):
 
     if not data:
         log.info(
-            "[#%s] tt@get_data.py: No Timetable Data(%s-%s, %s-%s-%s)"
-            % (req_id, tt_grade, tt_class, date.year, date.month, date.day)
+            "tt@get_data.py: No Timetable Data(%s-%s, %s-%s-%s)",
+            tt_grade,
+            tt_class,
+            date.year,
+            date.month,
+            date.day,
         )
         return "등록된 데이터가 없습니다."
 
@@ -120,169 +219,299 @@ def tt(tt_grade: int, tt_class: int, date, req_id, debugging):
         body = body + "\n%s교시: %s" % (i + 1, data[i])
 
     log.info(
-        "[#%s] tt@get_data.py: Succeeded(%s-%s, %s-%s-%s)"
-        % (req_id, tt_grade, tt_class, date.year, date.month, date.day)
+        "tt@get_data.py: Succeeded(%s-%s, %s-%s-%s)",
+        tt_grade,
+        tt_class,
+        date.year,
+        date.month,
+        date.day,
     )
 
     return header + body
 
 
 # 학사일정 가져오기
-def schdl(year, month, date, req_id, debugging):
+# 그날의 (행사명, 학년 비트마스크) 리스트 반환, grade를 주면 그 학년에 해당하는 일정만 반환
+@trace.traced()
+def schdl(year, month, date, req_id, debugging, grade=None):
 
     log.info(
-        "[#%s] schdl@get_data.py: Started Fetching Schedule Data(%s-%s-%s)"
-        % (req_id, year, month, date)
+        "schdl@get_data.py: Started Fetching Schedule Data(%s-%s-%s)", year, month, date
     )
 
-    # 파일 없으면 생성
-    if not os.path.isfile("data/cache/Cal-%s-%s.json" % (year, month)):
-        schedule_parser.parse(year, month, req_id, debugging)
+    index = schdl_month_index(year, month, req_id, debugging)
 
-    try:
-        with open(
-            "data/cache/Cal-%s-%s.json" % (year, month), encoding="utf-8"
-        ) as data_file:
-            data = json.load(data_file, object_pairs_hook=OrderedDict)
-    except FileNotFoundError:  # 파일 없을때
+    if index is None:  # 파일 없을때
         if debugging:
             print("FileNotFound")
-        log.info(
-            "[#%s] schdl@get_data.py: No Schedule Data(%s-%s-%s)"
-            % (req_id, year, month, date)
+        log.info("schdl@get_data.py: No Schedule Data(%s-%s-%s)", year, month, date)
+        return []
+
+    events = day_events(index, date, grade)
+    if events:
+        log.info("schdl@get_data.py: Succeeded(%s-%s-%s)", year, month, date)
+        return events
+
+    log.info("schdl@get_data.py: No Schedule Data(%s-%s-%s)", year, month, date)
+    return []
+
+
+# 한 달치 색인에서 그날 일정만 잘라냄, [(행사명, 학년 비트마스크), ...] 반환
+def day_events(index, date, grade=None):
+    events = index[grade or 0]
+    lo = bisect.bisect_left(events, (int(date),))
+    hi = bisect.bisect_left(events, (int(date) + 1,))
+    return [(name, grades) for _, name, grades in events[lo:hi]]
+
+
+# 캐시에서 한 달치 학사일정 읽기, 없으면 None
+def cached_schdl(cache_key):
+    data = memory_cache.load("schdl", cache_key)
+    if data is not None and not isinstance(data, list):  # 예전 형식(날짜별 문자열) 캐시
+        return None
+    return data
+
+
+# 한 달치 학사일정 캐시 읽기
+# 파일 없으면 생성, 같은 달을 동시에 여러 번 받아오지 않도록 요청을 합침
+# [일, 행사명, 학년 비트마스크] 리스트를 날짜순으로 반환
+def schdl_month(year, month, req_id, debugging):
+    cache_key = "%04d-%02d" % (int(year), int(month))
+
+    data = cached_schdl(cache_key)
+    if data is None:
+        single_flight.do(
+            "schdl-%s" % cache_key,
+            lambda: schedule_parser.parse(year, month, req_id, debugging),
+            check=lambda: cached_schdl(cache_key),
         )
-        return "일정이 없습니다."
-
-    # 일정 있는지 확인
-    if str(date) in data:
-        log.info(
-            "[#%s] schdl@get_data.py: Succeeded(%s-%s-%s)" % (req_id, year, month, date)
-        )
-        return data[str(date)]
-
-    log.info(
-        "[#%s] schdl@get_data.py: No Schedule Data(%s-%s-%s)"
-        % (req_id, year, month, date)
+        data = cached_schdl(cache_key)
+    return data
+
+
+# 한 달치 학년별 학사일정 색인
+# {0: 전체 일정, 1~6: 그 학년 일정} 형태로, 각각 (일, 행사명, 학년 비트마스크) 튜플을 날짜순으로 담음
+# 학년 구분이 없는 일정은 모든 학년에 포함, 일정이 없는 달은 빈 리스트만 담음
+def schdl_month_index(year, month, req_id, debugging):
+    cache_key = "%04d-%02d" % (int(year), int(month))
+    data = schdl_month(year, month, req_id, debugging)
+    if data is None:
+        return None
+
+    # 메모리 캐시가 같은 데이터를 돌려주는 동안은 만들어둔 색인을 재사용
+    built = _schdl_indexes.get(cache_key)
+    if built is not None and built[0] is data:
+        return built[1]
+
+    index = {grade: [] for grade in range(SCHDL_GRADES + 1)}
+    for day, name, grades in data:
+        event = (day, name, grades)
+        index[0].append(event)
+        for grade in range(1, SCHDL_GRADES + 1):
+            if not grades or grades & 1 << (grade - 1):
+                index[grade].append(event)
+
+    if len(_schdl_indexes) >= memory_cache.NAMESPACES["schdl"]["size"]:
+        _schdl_indexes.clear()
+    _schdl_indexes[cache_key] = (data, index)
+    return index
+
+
+# 학년도 학사일정 미리 받아두기
+# date가 속한 학년도 전체를 한 번에 받아와 달마다 캐시를 씀
+@trace.traced()
+def schdl_school_year(date, req_id, debugging):
+    log.info("schdl_school_year@get_data.py: Started Fetching Schedule Data(%s)", date)
+    months = single_flight.do(
+        "schdl-year-%s" % (date.year if date.month >= 3 else date.year - 1),
+        lambda: schedule_parser.parse_school_year(date, req_id, debugging),
     )
-    return "일정이 없습니다."
+    log.info("schdl_school_year@get_data.py: Succeeded(%d Month(s))", len(months))
+    return months
 
 
 # 학사일정 가져오기 (다중)
-def schdl_mass(start, end, req_id, debugging):
-    between_month = list()
-    between_date = list()
-    schdl = list()
-
+# (년, 월, 일, [(행사명, 학년 비트마스크), ...]) 튜플의 리스트를 날짜순으로 반환
+# 일정이 없는 날은 들어가지 않음, grade를 주면 그 학년에 해당하는 일정만 반환
+@trace.traced()
+def schdl_mass(start, end, req_id, debugging, grade=None):
     log.info(
-        "[#%s] schdl_mass@get_data.py: Started Fetching Mass Schedule Data(%s ~ %s)"
-        % (req_id, start.date(), end.date())
+        "schdl_mass@get_data.py: Started Fetching Mass Schedule Data(%s ~ %s)",
+        start.date(),
+        end.date(),
     )
 
-    delta = (end - start).days  # 시작일과 종료일 사이의 일수를 구함
-
-    for i in range(delta + 1):  # 리스트에 시작일과 종료일 사이의 모든 달과 날짜를 담음
-        date = start + datetime.timedelta(days=i)
-        between_month.append((date.year, date.month))
-        between_date.append((date.year, date.month, date.day))
+    first = (start.year, start.month, start.day)
+    last = (end.year, end.month, end.day)
+    keys, values = schdl_index(first, last, req_id, debugging, grade)
+    # 색인에서 시작일과 종료일 사이만 잘라냄
+    lo = bisect.bisect_left(keys, first)
+    hi = bisect.bisect_right(keys, last)
+    schdl = [(*keys[i], values[i]) for i in range(lo, hi)]
 
-    between_month = sorted(list(set(between_month)))  # List의 중복을 제거하고 정렬
+    log.info("schdl_mass@get_data.py: Succeeded(%s ~ %s)", start.date(), end.date())
 
-    for i in between_month:  # 대상월의 캐시가 있는지 확인, 없으면 만들기
-        if not os.path.isfile("data/cache/Cal-%s-%s.json" % (i[0], i[1])):
-            schedule_parser.parse(i[0], i[1], req_id, debugging)
-
-    for i in between_date:
-        try:  # 파일 열기, JSON 데이터를 딕셔너리형으로 변환
-            with open(
-                "data/cache/Cal-%s-%s.json" % (i[0], i[1]), encoding="utf-8"
-            ) as data_file:
-                data = json.load(data_file, object_pairs_hook=OrderedDict)
-        except FileNotFoundError:  # 파일 없을때
-            if debugging:
-                print("FileNotFound")
-            body = "일정이 없습니다."
-            schdl.append((i[0], i[1], i[2], body))  # 년, 월, 일, 일정
-            continue  # 이후 구문 실행 않음
+    return schdl
 
-        if str(i[2]) in data:  # 일정이 있는지 확인
-            schdl.append((i[0], i[1], i[2], data[str(i[2])]))  # 년, 월, 일, 일정
 
-    log.info(
-        "[#%s] schdl_mass@get_data.py: Succeeded(%s ~ %s)"
-        % (req_id, start.date(), end.date())
-    )
+# 학사일정 색인 만들기
+# first가 속한 달부터 last가 속한 달까지 달마다 색인을 한 번씩만 읽어 날짜순으로 합침
+# first, last는 (년, 월, 일), ([(년, 월, 일), ...], [[(행사명, 학년 비트마스크), ...], ...]) 반환
+def schdl_index(first, last, req_id, debugging, grade=None):
+    keys = []
+    values = []
+
+    # 캐시 없는 달이 여럿이면 달마다 받아오지 않고 기간 전체를 한 번에 받아옴
+    months = []
+    year, month = first[:2]
+    while (year, month) <= last[:2]:
+        months.append((year, month))
+        year, month = (year, month + 1) if month < 12 else (year + 1, 1)
+    missing = [
+        (year, month)
+        for year, month in months
+        if cached_schdl("%04d-%02d" % (year, month)) is None
+    ]
+    if len(missing) > 1:
+        date_from = datetime.date(*missing[0], 1)
+        date_to = datetime.date(*missing[-1], calendar.monthrange(*missing[-1])[1])
+        single_flight.do(
+            "schdl-%s~%s" % (date_from, date_to),
+            lambda: schedule_parser.parse_range(date_from, date_to, req_id, debugging),
+            # 다른 프로세스가 그사이 받아왔으면 다시 받지 않음
+            check=lambda: (
+                missing
+                if all(
+                    cached_schdl("%04d-%02d" % (year, month)) is not None
+                    for year, month in missing
+                )
+                else None
+            ),
+        )
 
-    return schdl
+    for year, month in months:
+        index = schdl_month_index(year, month, req_id, debugging)
+        if index is None:
+            continue
+        for day, events in groupby(index[grade or 0], lambda event: event[0]):
+            keys.append((year, month, day))
+            values.append([(name, grades) for _, name, grades in events])
+    return keys, values
 
 
 # 한강 수온 가져오기
+@trace.traced()
 def wtemp(req_id, debugging):
-    log.info(
-        "[#%s] wtemp@get_data.py: Started Fetching Water Temperature Data" % req_id
-    )
-    global date, temp
-
-    def parse():
-        log.info(
-            "[#%s] wtemp@get_data.py: Started Parsing Water Temperature Data" % req_id
-        )
-        try:
-            global date, temp
-            parser = water_temp_parser.get(req_id, debugging)
-            date = parser[0]
-            temp = parser[1]
-        except ConnectionError:
-            return "한강 수온 서버에 연결하지 못했습니다.\n요청 ID: " + req_id
-        except Exception as e:
-            log.err(
-                "[#%s] wtemp@get_data.py: Failed to Fetch Water Temperature Data because %s"
-                % (req_id, e)
-            )
-            return "측정소 또는 서버 오류입니다."
-        if not temp.isalpha():  # 무효값 걸러냄(값이 유효할 경우에만 캐싱)
-            with open(
-                "data/cache/wtemp.json", "w", encoding="utf-8"
-            ) as make_file:  # 캐시 만들기
-                json.dump(
-                    {"timestamp": int(date.timestamp()), "temp": temp},
-                    make_file,
-                    ensure_ascii=False,
-                )
-                print("File Created")
-                temp = temp + "°C"
-        log.info("[#%s] wtemp@get_data.py: Succeeded" % req_id)
+    log.info("wtemp@get_data.py: Started Fetching Water Temperature Data")
 
-    if os.path.isfile("data/cache/wtemp.json"):  # 캐시 있으면
+    # 캐시 읽기, 캐시 없으면 None
+    # 받아오지 못했을 때는 그 시각("failed")을 지난 측정값과 함께 저장해둠
+    def cached():
         try:
-            log.info("[#%s] wtemp@get_data.py: Read Data in Cache" % req_id)
-            with open("data/cache/wtemp.json", encoding="utf-8") as data_file:  # 캐시 읽기
-                data = json.load(data_file, object_pairs_hook=OrderedDict)
+            return cache_store.read("wtemp")  # 캐시 읽기
         except Exception:  # 캐시 읽을 수 없으면
             try:
-                os.remove("data/cache/wtemp.json")  # 캐시 삭제
+                cache_store.delete("wtemp")  # 캐시 삭제
             except Exception:
-                log.err("[#%s] wtemp@get_data.py: Failed to Delete Cache" % req_id)
-                return "측정소 또는 서버 오류입니다."
-            parser_response = parse()  # 파싱
-        # 캐시 유효하면
-        if datetime.datetime.now() - datetime.datetime.fromtimestamp(
-            data["timestamp"]
-        ) < datetime.timedelta(
-            minutes=76
-        ):  # 실시간수질정보시스템상 자료처리 시간 고려, 유효기간 76분으로 설정
-            log.info("[#%s] wtemp@get_data.py: Use Data in Cache" % req_id)
-            date = datetime.datetime.fromtimestamp(data["timestamp"])
-            temp = data["temp"] + "°C"
-            parser_response = None
+                log.err("wtemp@get_data.py: Failed to Delete Cache")
+            return None
+
+    # 캐시의 측정값, 없으면 None
+    def reading(data):
+        if data is None or "temp" not in data:
+            return None
+        return (
+            datetime.datetime.fromtimestamp(data["timestamp"]),
+            data["temp"] + "°C",
+        )
+
+    # WTEMP_NEGATIVE_TTL 안에 받아오지 못한 적이 있는지
+    def failed_recently(data):
+        return (
+            data is not None
+            and "failed" in data
+            and datetime.datetime.now()
+            - datetime.datetime.fromtimestamp(data["failed"])
+            < WTEMP_NEGATIVE_TTL
+        )
+
+    # 유효한 캐시만 읽기, 최근에 받아오지 못했으면 지난 측정값을 그대로 씀
+    def fresh():
+        data = cached()
+        value = reading(data)
+        if value is not None and (
+            datetime.datetime.now() - value[0] < WTEMP_TTL or failed_recently(data)
+        ):
+            return value
+        return None
+
+    # 받아오지 못했음을 기록해 WTEMP_NEGATIVE_TTL 동안 다시 요청하지 않도록 함
+    def remember_failure():
+        data = cached() or {}
+        data["failed"] = int(datetime.datetime.now().timestamp())
+        cache_store.write("wtemp", "", data)
+
+    def parse():
+        log.info("wtemp@get_data.py: Started Parsing Water Temperature Data")
+        try:
+            date, temp = water_temp_parser.get(req_id, debugging)
+        except Exception:
+            remember_failure()
+            raise
+        if temp.isalpha():  # 무효값은 캐싱하지 않고 받아오지 못한 것으로 기록
+            remember_failure()
+        else:
+            cache_store.write(
+                "wtemp", "", {"timestamp": int(date.timestamp()), "temp": temp}
+            )  # 캐시 만들기
+            temp = temp + "°C"
+        log.info("wtemp@get_data.py: Succeeded")
+        return date, temp
+
+    try:
+        cache = cached()
+        data = reading(cache)
+        if data is not None and datetime.datetime.now() - data[0] < WTEMP_TTL:
+            log.info("wtemp@get_data.py: Use Data in Cache")  # 캐시 유효하면
+            result = "hit"
+        elif failed_recently(cache):  # 최근에 받아오지 못했으면 다시 요청하지 않음
+            log.info("wtemp@get_data.py: Recently Failed")
+            result = "negative"
+            if (
+                data is not None
+                and datetime.datetime.now() - data[0] >= WTEMP_MAX_STALE
+            ):
+                data = None
+        elif data is None:  # 캐시 없으면
+            log.info("wtemp@get_data.py: No Cache")
+            result = "miss"
+            # 다른 요청이 이미 받아오는 중이면 그 결과를 기다림
+            data = single_flight.do("wtemp", parse, check=fresh)
+        elif datetime.datetime.now() - data[0] < WTEMP_MAX_STALE:
+            log.info("wtemp@get_data.py: Cache Expired, Serving Stale")
+            result = "stale"
+            single_flight.background("wtemp", parse, check=fresh)
         else:  # 캐시 무효하면
-            log.info("[#%s] wtemp@get_data.py: Cache Expired" % req_id)
-            parser_response = parse()  # 파싱
-    else:  # 캐시 없으면
-        log.info("[#%s] temp@get_data.py: No Cache" % req_id)
-        parser_response = parse()  # 파싱
-
-    if isinstance(parser_response, str):
-        return parser_response
+            log.info("wtemp@get_data.py: Cache Expired")
+            result = "expired"
+            data = single_flight.do("wtemp", parse, check=fresh)
+        metrics.inc(
+            "hdmeal_cache_requests_total",
+            namespace="wtemp",
+            layer="store",
+            result=result,
+        )
+        if data is None:  # 최근에 받아오지 못했고 쓸 만한 지난 측정값도 없으면
+            return "측정소 또는 서버 오류입니다."
+    except ConnectionError:
+        return "한강 수온 서버에 연결하지 못했습니다.\n요청 ID: " + req_id
+    except Exception as e:
+        log.err(
+            "wtemp@get_data.py: Failed to Fetch Water Temperature Data because %s", e
+        )
+        return "측정소 또는 서버 오류입니다."
+
+    date, temp = data
     time = date.hour
     # 24시간제 -> 12시간제 변환
     if time == 0 or time == 24:  # 자정
@@ -295,22 +524,42 @@ def wtemp(req_id, debugging):
         time = "오후 %s시" % (time - 12)
 
     body = "%s %s 측정자료:\n한강 수온은 %s 입니다." % (date.date(), time, temp)
-    log.info("[#%s] wtemp@get_data.py: Succeeded" % req_id)
+    log.info("wtemp@get_data.py: Succeeded")
 
     return body
 
 
 # 날씨 가져오기
+@trace.traced()
 def weather(date_ko, req_id, debugging):
-    global weather_data
     now = datetime.datetime.now()
-    log.info("[#%s] weather@get_data.py: Started Fetching Weather Data" % req_id)
+    log.info("weather@get_data.py: Started Fetching Weather Data")
+
+    # 캐시 읽기, 캐시 없으면 None
+    def cached():
+        try:
+            return cache_store.read("weather")  # 캐시 읽기
+        except Exception:  # 캐시 읽을 수 없으면
+            try:
+                cache_store.delete("weather")  # 캐시 삭제
+            except Exception:
+                log.err("weather@get_data.py: Failed to Delete Cache")
+            return None
+
+    # 캐시 나이
+    def age(data):
+        return now - datetime.datetime.fromtimestamp(data["Timestamp"])
+
+    # 유효한 캐시만 읽기
+    def fresh():
+        data = cached()
+        if data is not None and age(data) < WEATHER_TTL:
+            return data
+        return None
 
     # 날씨 파싱 후 캐싱
     def parse():
-        global weather_data
-
-        log.info("[#%s] weather@get_data.py: Started Parsing Weather Data" % req_id)
+        log.info("weather@get_data.py: Started Parsing Weather Data")
 
         weather_data = weather_parser.parse(req_id, debugging)
 
@@ -319,41 +568,31 @@ def weather(date_ko, req_id, debugging):
             datetime.datetime(now.year, now.month, now.day, now.hour).timestamp()
         )
 
-        with open(
-            "data/cache/weather.json", "w", encoding="utf-8"
-        ) as make_file:  # 캐시 만들기
-            json.dump(weather_data, make_file, ensure_ascii=False)
-            print("File Created")
-
-        log.info("[#%s] weather@get_data.py: Succeeded" % req_id)
-
-    if os.path.isfile("data/cache/weather.json"):  # 캐시 있으면
-        try:
-            log.info("[#%s] weather@get_data.py: Read Data in Cache" % req_id)
-            with open(
-                "data/cache/weather.json", encoding="utf-8"
-            ) as data_file:  # 캐시 읽기
-                data = json.load(data_file, object_pairs_hook=OrderedDict)
-        except Exception:  # 캐시 읽을 수 없으면
-            try:
-                os.remove("data/cache/weather.json")  # 캐시 삭제
-            except Exception:
-                log.err("[#%s] weather@get_data.py: Failed to Delete Cache" % req_id)
-                return "측정소 또는 서버 오류입니다."
-            parse()  # 파싱
-        # 캐시 유효하면
-        if now - datetime.datetime.fromtimestamp(
-            data["Timestamp"]
-        ) < datetime.timedelta(hours=1):
-            global weather_data
-            log.info("[#%s] weather@get_data.py: Use Data in Cache" % req_id)
-            weather_data = data
-        else:  # 캐시 무효하면
-            log.info("[#%s] weather@get_data.py: Cache Expired" % req_id)
-            parse()  # 파싱
-    else:  # 캐시 없으면
-        log.info("[#%s] weather@get_data.py: No Cache" % req_id)
-        parse()  # 파싱
+        cache_store.write("weather", "", weather_data)  # 캐시 만들기
+
+        log.info("weather@get_data.py: Succeeded")
+        return weather_data
+
+    weather_data = cached()
+    if weather_data is None:  # 캐시 없으면
+        log.info("weather@get_data.py: No Cache")
+        result = "miss"
+        # 다른 요청이 이미 받아오는 중이면 그 결과를 기다림
+        weather_data = single_flight.do("weather", parse, check=fresh)
+    elif age(weather_data) < WEATHER_TTL:  # 캐시 유효하면
+        log.info("weather@get_data.py: Use Data in Cache")
+        result = "hit"
+    elif age(weather_data) < WEATHER_MAX_STALE:
+        log.info("weather@get_data.py: Cache Expired, Serving Stale")
+        result = "stale"
+        single_flight.background("weather", parse, check=fresh)
+    else:  # 캐시 무효하면
+        log.info("weather@get_data.py: Cache Expired")
+        result = "expired"
+        weather_data = single_flight.do("weather", parse, check=fresh)
+    metrics.inc(
+        "hdmeal_cache_requests_total", namespace="weather", layer="store", result=result
+    )
 
     return_data = (
         "🌡️ %s 최소/최대 기온: %s℃/%s℃\n\n"
@@ -374,7 +613,7 @@ def weather(date_ko, req_id, debugging):
         )
     )
 
-    log.info("[#%s] weather@get_data.py: Succeeded" % req_id)
+    log.info("weather@get_data.py: Succeeded")
 
     return return_data
 
@@ -384,18 +623,14 @@ def commits(req_id, debugging):
     # GitHub API 사용
     # API 사양은 https://developer.github.com/v3/repos/commits/#list-commits-on-a-repository 참조
     try:
-        response = (
-            urllib.request.urlopen(
-                url="https://api.github.com/repos/hgyoseo/hdmeal/commits"
-            )
-            .read()
-            .decode("utf-8")
-        )
+        response = upstream.get(
+            "https://api.github.com/repos/hgyoseo/hdmeal/commits", req_id, timeout=5
+        ).content.decode("utf-8")
         data = json.loads(response)
     except Exception as error:
         if debugging:
             print(error)
-        log.err("[#%s] commits@get_data.py: Failed to Parse Commits" % req_id)
+        log.err("commits@get_data.py: Failed to Parse Commits")
         return error
 
     # 마지막 커밋이 일어난 시간를 파싱함
@@ -414,7 +649,7 @@ def commits(req_id, debugging):
     messages = list(map(lambda loc: data[loc]["commit"]["message"], range(5)))
     # 리스트의 0번에 마지막 커밋 시간 삽입
     messages.insert(0, updated_at)
-    log.info("[#%s] commits@get_data.py: Succeeded" % req_id)
+    log.info("commits@get_data.py: Succeeded")
     return messages
 
 
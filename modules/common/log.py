@@ -7,34 +7,48 @@
 # Copyright 2019-2020, Hyungyo Seo
 # log.py - 로깅 기능을 관리하는 스크립트입니다.
 
+
+import atexit
 import logging
 import logging.handlers
 import os
+import queue
+import sys
+
+from modules.common import context
+
+LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
+
+logger = logging.getLogger("crumbs")
+_loggers = {}  # 모듈 이름: logger
+_listener = None
 
 
 def init():
-    global logger
+    global _listener
+    _loggers.clear()
     # logger 인스턴스를 생성 및 로그 레벨 설정
-    logger = logging.getLogger("crumbs")
-
     log_level = os.environ.get("HDMeal_LogLevel")
-    if log_level == "DEBUG":
-        logger.setLevel(logging.DEBUG)
-    elif log_level == "INFO":
-        logger.setLevel(logging.INFO)
-    elif log_level == "WARNING":
-        logger.setLevel(logging.WARNING)
-    elif log_level == "ERROR":
-        logger.setLevel(logging.ERROR)
-    elif log_level == "CRITICAL":
-        logger.setLevel(logging.CRITICAL)
-    else:
+    if log_level not in LEVELS:
         raise Exception(
             "설정 파일 오류: LogLevel 값은 [DEBUG, INFO, WARNING, ERROR, CRITICAL] 중 하나여야 합니다."
         )
+    logger.setLevel(log_level)
+
+    # 모듈별 로그 레벨, "get_data=WARNING,menu_parser=ERROR" 형식
+    # 모듈 이름은 마지막 부분(get_data)이나 전체(modules.common.get_data) 모두 가능
+    # 패키지 이름(modules.common.parsers)을 쓰면 그 아래 모듈 전체에 적용됨
+    for item in filter(None, os.environ.get("HDMeal_LogLevels", "").split(",")):
+        name, _, level = item.partition("=")
+        level = level.strip().upper()
+        if level not in LEVELS:
+            raise Exception(
+                "설정 파일 오류: LogLevels 값은 모듈=레벨을 쉼표로 구분한 형식이어야 합니다."
+            )
+        logging.getLogger("crumbs." + name.strip()).setLevel(level)
 
     # formmater 생성
-    formatter = logging.Formatter("[%(levelname)s] %(asctime)s > %(message)s")
+    formatter = Formatter("[%(levelname)s] %(asctime)s > %(message)s")
 
     # file_handler와 stream_handler를 생성
 
@@ -49,26 +63,107 @@ def init():
     file_handler.setFormatter(formatter)
     stream_handler.setFormatter(formatter)
 
+    # 다시 초기화하는 경우 기존 handler 정리
+    stop()
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+        handler.close()
+
     # Handler를 logging에 추가
-    logger.addHandler(file_handler)
-    logger.addHandler(stream_handler)
+    if os.environ.get("HDMeal_LogQueue", "false").lower() == "true":
+        # 요청 쓰레드는 큐에 넣기만 하고, 파일/콘솔 출력은 별도 쓰레드에서 처리
+        log_queue = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(
+            log_queue, file_handler, stream_handler, respect_handler_level=True
+        )
+        _listener.start()
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    else:
+        logger.addHandler(file_handler)
+        logger.addHandler(stream_handler)
+
+
+# 요청 안에서 남긴 로그 앞에 요청 ID를 붙임
+class Formatter(logging.Formatter):
+    def formatMessage(self, record):
+        if getattr(record, "req_id", None):
+            record.message = "[#%s] %s" % (record.req_id, record.message)
+        return super().formatMessage(record)
+
+
+# 로그를 남긴 쓰레드의 요청 ID 기록
+# 큐를 쓰면 출력 쓰레드에서 포매팅되므로, 로그를 남기는 시점에 기록해둬야 함
+_record_factory = logging.getLogRecordFactory()
+
+
+def record_factory(*args, **kwargs):
+    record = _record_factory(*args, **kwargs)
+    record.req_id = context.req_id()
+    return record
+
+
+logging.setLogRecordFactory(record_factory)
+
+
+# 큐에 남은 로그를 모두 쓰고 출력 쓰레드 종료
+def stop():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# fork된 자식 프로세스에는 출력 쓰레드가 없으므로 새로 시작
+# 부모 프로세스의 큐에 남아있던 로그가 두 번 쓰이지 않도록 큐도 새로 만듦
+def restart_listener():
+    global _listener
+    if _listener is not None:
+        log_queue = queue.SimpleQueue()
+        for handler in logger.handlers:
+            if isinstance(handler, logging.handlers.QueueHandler):
+                handler.queue = log_queue
+        _listener = logging.handlers.QueueListener(
+            log_queue, *_listener.handlers, respect_handler_level=True
+        )
+        _listener.start()
+
+
+atexit.register(stop)
+os.register_at_fork(after_in_child=restart_listener)
+
+
+# 호출한 모듈의 logger, 모듈별 로그 레벨을 적용하기 위함
+def caller_logger():
+    name = sys._getframe(2).f_globals.get("__name__", "")
+    try:
+        return _loggers[name]
+    except KeyError:
+        pass
+    # 모듈 이름 마지막 부분으로 설정한 레벨이 있으면 그 logger를 씀
+    short_name = name.rpartition(".")[2]
+    if logging.getLogger("crumbs." + short_name).level != logging.NOTSET:
+        _loggers[name] = logging.getLogger("crumbs." + short_name)
+    else:
+        _loggers[name] = logging.getLogger("crumbs." + name)
+    return _loggers[name]
 
 
-def debug(string):
-    logger.debug(string)
+# 메시지는 실제로 출력할 때만 args로 포매팅됨
+def debug(string, *args):
+    caller_logger().debug(string, *args)
 
 
-def info(string):
-    logger.info(string)
+def info(string, *args):
+    caller_logger().info(string, *args)
 
 
-def warn(string):
-    logger.warning(string)
+def warn(string, *args):
+    caller_logger().warning(string, *args)
 
 
-def err(string):
-    logger.error(string)
+def err(string, *args):
+    caller_logger().error(string, *args)
 
 
-def critical(string):
-    logger.critical(string)
+def critical(string, *args):
+    caller_logger().critical(string, *args)
@@ -0,0 +1,104 @@
+# ██╗  ██╗██████╗ ███╗   ███╗███████╗ █████╗ ██╗
+# ██║  ██║██╔══██╗████╗ ████║██╔════╝██╔══██╗██║
+# ███████║██║  ██║██╔████╔██║█████╗  ███████║██║
+# ██╔══██║██║  ██║██║╚██╔╝██║██╔══╝  ██╔══██║██║
+# ██║  ██║██████╔╝██║ ╚═╝ ██║███████╗██║  ██║███████╗
+# ╚═╝  ╚═╝╚═════╝ ╚═╝     ╚═╝╚══════╝╚═╝  ╚═╝╚══════╝
+# Copyright 2019-2020, Hyungyo Seo
+# memory_cache.py - 캐시 저장소의 데이터를 메모리에 올려두고 재사용하는 스크립트입니다.
+
+import threading
+import time
+from collections import OrderedDict
+
+from modules.common import cache_store, metrics
+
+# 네임스페이스별 설정
+# ttl: 메모리에 올린 데이터를 저장소에서 다시 읽지 않고 쓰는 최대 시간(초)
+# size: 최대 항목 수, 넘치면 가장 오래 쓰지 않은 항목부터 버림
+NAMESPACES = {
+    "meal": {"ttl": 6 * 60 * 60, "size": 256},
+    "schdl": {"ttl": 6 * 60 * 60, "size": 64},
+    "tt": {"ttl": 3 * 60 * 60, "size": 64},
+}
+
+_lock = threading.Lock()
+_entries = {namespace: OrderedDict() for namespace in NAMESPACES}
+_stats = {
+    namespace: {"hit": 0, "miss": 0, "expired": 0, "invalidated": 0}
+    for namespace in NAMESPACES
+}
+
+
+# 캐시 읽기
+# 저장소의 항목이 바뀌지 않았고 유효기간 안이면 메모리에 있는 데이터를 그대로 반환
+# 저장소에 없으면 None 반환
+def load(namespace: str, key: str):
+    stamp = cache_store.stamp(namespace, key)
+    if stamp is None:
+        drop(namespace, key)
+        metrics.inc(
+            "hdmeal_cache_requests_total",
+            namespace=namespace,
+            layer="store",
+            result="miss",
+        )
+        return None
+
+    now = time.monotonic()
+    with _lock:
+        entries = _entries[namespace]
+        entry = entries.get(key)
+        if entry is None:
+            result = "miss"
+        elif entry[0] != stamp:  # 다른 프로세스가 새로 씀
+            result = "invalidated"
+        elif now - entry[1] > NAMESPACES[namespace]["ttl"]:  # 유효기간 지남
+            result = "expired"
+        else:
+            result = "hit"
+            entries.move_to_end(key)
+        _stats[namespace][result] += 1
+    # 메모리에 없어도 저장소에는 있으므로 지표에는 저장소 적중으로 기록
+    metrics.inc(
+        "hdmeal_cache_requests_total",
+        namespace=namespace,
+        layer="memory" if result == "hit" else "store",
+        result="hit",
+    )
+    if result == "hit":
+        return entry[2]
+
+    data = cache_store.read(namespace, key)
+    if data is None:  # 그 사이에 지워짐
+        return None
+
+    with _lock:
+        entries = _entries[namespace]
+        entries[key] = (stamp, now, data)
+        entries.move_to_end(key)
+        while len(entries) > NAMESPACES[namespace]["size"]:
+            entries.popitem(last=False)
+    return data
+
+
+# 항목 지우기
+def drop(namespace: str, key: str):
+    with _lock:
+        _entries[namespace].pop(key, None)
+
+
+# 전부 비우기
+def clear():
+    with _lock:
+        for entries in _entries.values():
+            entries.clear()
+
+
+# 네임스페이스별 적중/실패 횟수와 항목 수
+def stats():
+    with _lock:
+        return {
+            namespace: dict(_stats[namespace], size=len(_entries[namespace]))
+            for namespace in NAMESPACES
+        }
@@ -0,0 +1,235 @@
+# ██╗  ██╗██████╗ ███╗   ███╗███████╗ █████╗ ██╗
+# ██║  ██║██╔══██╗████╗ ████║██╔════╝██╔══██╗██║
+# ███████║██║  ██║██╔████╔██║█████╗  ███████║██║
+# ██╔══██║██║  ██║██║╚██╔╝██║██╔══╝  ██╔══██║██║
+# ██║  ██║██████╔╝██║ ╚═╝ ██║███████╗██║  ██║███████╗
+# ╚═╝  ╚═╝╚═════╝ ╚═╝     ╚═╝╚══════╝╚═╝  ╚═╝╚══════╝
+# Copyright 2019-2020, Hyungyo Seo
+# metrics.py - 요청 처리 시간, 캐시 적중 여부, 외부 서버 응답 시간 등을 모아 Prometheus 형식으로 내보내는 스크립트입니다.
+
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+
+from modules.common import single_flight
+
+# 워커별 지표를 저장할 폴더, /metrics 요청을 받은 워커가 모든 워커의 파일을 합쳐서 응답
+DIR = os.environ.get("HDMeal_MetricsDir", "data/metrics")
+# 종료된 워커의 지표를 합쳐두는 파일 이름
+RETIRED = "retired.json"
+FLUSH_INTERVAL = 5  # 파일에 쓰는 최소 간격(초)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# 지표 정의, 이름: (종류, 설명)
+METRICS = {
+    "hdmeal_request_duration_seconds": (
+        "histogram",
+        "Request latency by endpoint and intent",
+    ),
+    "hdmeal_cache_requests_total": (
+        "counter",
+        "Cache lookups by namespace and result",
+    ),
+    "hdmeal_upstream_request_duration_seconds": (
+        "histogram",
+        "Upstream request latency by host",
+    ),
+    "hdmeal_upstream_errors_total": ("counter", "Failed upstream requests by host"),
+}
+
+_lock = threading.Lock()
+_values = {}  # (이름, 레이블): 카운터 값 또는 [버킷별 개수..., 합계, 개수]
+_pid = os.getpid()
+_last_flush = time.monotonic()
+_written = False  # 이 프로세스가 자기 파일을 쓴 적이 있는지
+
+
+# 레이블을 정렬된 튜플로 바꿈(dict 키로 쓰기 위함)
+def key(name: str, labels: dict):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+# fork된 자식 프로세스는 부모 프로세스의 값을 버리고 새로 셈
+def check_pid():
+    global _pid, _written
+    if _pid != os.getpid():
+        _values.clear()
+        _pid = os.getpid()
+        _written = False
+
+
+# 카운터 증가
+def inc(name: str, value: float = 1, **labels):
+    with _lock:
+        check_pid()
+        k = key(name, labels)
+        _values[k] = _values.get(k, 0) + value
+    flush()
+
+
+# 히스토그램에 값 기록
+def observe(name: str, value: float, **labels):
+    with _lock:
+        check_pid()
+        k = key(name, labels)
+        counts = _values.get(k)
+        if counts is None:
+            counts = _values[k] = [0] * len(BUCKETS) + [0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                counts[i] += 1
+                break
+        counts[-2] += value
+        counts[-1] += 1
+    flush()
+
+
+# 이 워커의 지표를 파일에 씀
+# force가 아니면 마지막으로 쓴 뒤 FLUSH_INTERVAL이 지났을 때만 씀
+def flush(force: bool = False):
+    global _last_flush, _written
+    now = time.monotonic()
+    with _lock:
+        if not force and now - _last_flush < FLUSH_INTERVAL:
+            return
+        _last_flush = now
+        check_pid()
+        data = [[name, labels, value] for (name, labels), value in _values.items()]
+        first = not _written
+        _written = True
+    os.makedirs(DIR, exist_ok=True)
+    if first:  # 같은 PID를 쓰던 종료된 워커의 파일을 덮어쓰기 전에 합쳐둠
+        with single_flight.file_lock("metrics"):
+            retire(own=True)
+    write(os.path.join(DIR, "%d.json" % os.getpid()), data)
+
+
+atexit.register(flush, True)
+
+
+# 다른 워커가 읽는 도중에 바뀌지 않도록 임시 파일에 쓴 뒤 교체
+# 임시 파일은 워커마다 따로 만들어야 서로의 파일을 교체하지 않음
+def write(path: str, data: list):
+    fd, tmp_path = tempfile.mkstemp(dir=DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as metrics_file:
+            json.dump(data, metrics_file)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+# 파일 하나 읽기, 그 사이에 지워졌거나 쓰는 중이면 None
+def read(path: str):
+    try:
+        with open(path, encoding="utf-8") as metrics_file:
+            return json.load(metrics_file)
+    except (OSError, ValueError):
+        return None
+
+
+# 값 더하기, merged는 {(이름, 레이블): 값}
+def merge(merged: dict, data: list):
+    for name, labels, value in data:
+        k = (name, tuple(map(tuple, labels)))
+        if k not in merged:
+            merged[k] = value
+        elif isinstance(value, list):
+            merged[k] = [a + b for a, b in zip(merged[k], value)]
+        else:
+            merged[k] += value
+
+
+# 살아있는 프로세스인지 확인
+def alive(pid: int):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # 다른 사용자의 프로세스
+        return True
+    return True
+
+
+# 종료된 워커의 파일을 RETIRED 파일에 합치고 지움, "metrics" 잠금을 얻은 뒤 호출
+# 파일을 그대로 두면 PID가 다시 쓰일 때 덮어써져 카운터가 줄어듦
+# own이 True면 이 프로세스와 PID가 같은 파일(아직 자기 파일을 쓰기 전이므로 이전 워커의 것)도 합침
+def retire(own: bool = False):
+    paths = []
+    for path in glob.glob(os.path.join(DIR, "*.json")):
+        pid = os.path.basename(path)[: -len(".json")]
+        if not pid.isdigit():
+            continue
+        if (own and int(pid) == os.getpid()) or not alive(int(pid)):
+            paths.append(path)
+    if not paths:
+        return
+    retired_path = os.path.join(DIR, RETIRED)
+    merged = {}
+    merge(merged, read(retired_path) or [])
+    for path in paths:
+        merge(merged, read(path) or [])
+    write(
+        retired_path,
+        [[name, labels, value] for (name, labels), value in merged.items()],
+    )
+    for path in paths:
+        os.remove(path)
+
+
+# 모든 워커의 지표 합치기
+# 종료된 워커의 지표는 RETIRED 파일에 합쳐져 있어 카운터가 줄어들지 않음
+# 합치는 도중의 파일을 두 번 세지 않도록 잠금을 얻고 읽음
+def collect():
+    flush(force=True)
+    merged = {}
+    with single_flight.file_lock("metrics"):
+        retire()
+        for path in glob.glob(os.path.join(DIR, "*.json")):
+            merge(merged, read(path) or [])
+    return merged
+
+
+# Prometheus 텍스트 형식으로 변환
+def render():
+    merged = collect()
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        lines.append("# HELP %s %s" % (name, description))
+        lines.append("# TYPE %s %s" % (name, kind))
+        for (metric, labels), value in sorted(merged.items()):
+            if metric != name:
+                continue
+            if kind == "counter":
+                lines.append("%s%s %s" % (name, label_text(labels), value))
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS, value):
+                cumulative += count
+                lines.append(
+                    "%s_bucket%s %d"
+                    % (name, label_text(labels + (("le", str(bound)),)), cumulative)
+                )
+            lines.append(
+                "%s_bucket%s %d"
+                % (name, label_text(labels + (("le", "+Inf"),)), value[-1])
+            )
+            lines.append("%s_sum%s %s" % (name, label_text(labels), value[-2]))
+            lines.append("%s_count%s %d" % (name, label_text(labels), value[-1]))
+    return "\n".join(lines) + "\n"
+
+
+# 레이블 표기, 값의 역슬래시/따옴표/줄바꿈은 이스케이프
+def label_text(labels: tuple):
+    if not labels:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"'
+        % (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
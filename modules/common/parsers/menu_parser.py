@@ -11,87 +11,164 @@ import datetime
 import json
 import os
 import re
-import urllib.error
-import urllib.request
 
-from modules.common import conf, log
+from modules.common import cache_store, conf, log, trace, upstream
 
 NEIS_OPENAPI_TOKEN = os.environ.get("HDMeal_NEIS_Token")  # NEIS 오픈API 인증 토큰
 ATPT_OFCDC_SC_CODE = os.environ.get("HDMeal_NEIS_ATPT_OFCDC_SC_CODE")  # 시도교육청코드
 SD_SCHUL_CODE = os.environ.get("HDMeal_NEIS_SD_SCHUL_CODE")  # 표준학교코드
 WEEKDAYS = ["월", "화", "수", "목", "금", "토", "일"]
 DELICIOUS = conf.delicious
+PAGE_SIZE = 100  # 한 번에 받아올 행 수(NEIS 최대 1000)
+# 알레르기 유발 식품, 번호 순서
+ALLERGENS = [
+    "",
+    "난류",
+    "우유",
+    "메밀",
+    "땅콩",
+    "대두",
+    "밀",
+    "고등어",
+    "게",
+    "새우",
+    "돼지고기",
+    "복숭아",
+    "토마토",
+    "아황산류",
+    "호두",
+    "닭고기",
+    "쇠고기",
+    "오징어",
+    "조개류",
+]
 
 
 def parse(year: int, month: int, day: int, req_id: str, debugging: bool):
-    year, month, day = int(year), int(month), int(day)
+    date = datetime.date(int(year), int(month), int(day))
+    return parse_range(date, date, req_id, debugging)
 
+
+# 기간 파싱
+# date_from부터 date_to까지의 급식을 한 번에 받아와 날짜별 캐시 파일을 모두 씀
+# 급식이 있는 날짜의 리스트를 반환
+@trace.traced()
+def parse_range(
+    date_from: datetime.date, date_to: datetime.date, req_id: str, debugging: bool
+):
     log.info(
-        "[#%s] parse@menu_parser.py: Started Parsing Menu(%s-%s-%s)"
-        % (req_id, year, month, day)
+        "parse_range@menu_parser.py: Started Parsing Menu(%s ~ %s)", date_from, date_to
     )
 
-    try:
-        req = urllib.request.urlopen(
-            "https://open.neis.go.kr/hub/mealServiceDietInfo?KEY=%s&Type=json&ATPT_OFCDC_SC_CODE"
-            "=%s&SD_SCHUL_CODE=%s&MMEAL_SC_CODE=2&MLSV_YMD=%02d%02d%02d"
-            % (NEIS_OPENAPI_TOKEN, ATPT_OFCDC_SC_CODE, SD_SCHUL_CODE, year, month, day),
-            timeout=2,
-        )
-    except (urllib.error.HTTPError, urllib.error.URLError) as e:
-        log.err(
-            "[#%s] parse@menu_parser.py: Failed to Parse Menu(%s-%s-%s) because %s"
-            % (req_id, year, month, day, e)
+    rows = []
+    page = 1
+    while True:
+        try:
+            req = upstream.get(
+                "%s/hub/mealServiceDietInfo?KEY=%s&Type=json&ATPT_OFCDC_SC_CODE"
+                "=%s&SD_SCHUL_CODE=%s&MMEAL_SC_CODE=2&MLSV_FROM_YMD=%s&MLSV_TO_YMD=%s"
+                "&pIndex=%d&pSize=%d"
+                % (
+                    upstream.NEIS_URL,
+                    NEIS_OPENAPI_TOKEN,
+                    ATPT_OFCDC_SC_CODE,
+                    SD_SCHUL_CODE,
+                    date_from.strftime("%Y%m%d"),
+                    date_to.strftime("%Y%m%d"),
+                    page,
+                    PAGE_SIZE,
+                ),
+                req_id,
+            )
+        except upstream.Error as e:
+            log.err(
+                "parse_range@menu_parser.py: Failed to Parse Menu(%s ~ %s) because %s",
+                date_from,
+                date_to,
+                e,
+            )
+            raise ConnectionError
+
+        data = json.loads(req.content)
+
+        try:
+            total = data["mealServiceDietInfo"][0]["head"][0]["list_total_count"]
+            rows.extend(data["mealServiceDietInfo"][1]["row"])
+        except KeyError:  # 데이터 없음
+            break
+        if len(rows) >= total:
+            break
+        page += 1
+
+    dates = []
+    menus = {}
+    for item in rows:
+        date = datetime.datetime.strptime(item["MLSV_YMD"], "%Y%m%d").date()
+        return_data = parse_item(item, date)
+        if debugging:
+            print(return_data)
+        menus[date.strftime("%Y-%m-%d")] = return_data
+        dates.append(date)
+
+    # 캐시 쓰기
+    cache_store.write_many("meal", menus)
+
+    log.info(
+        "parse_range@menu_parser.py: Succeeded(%s ~ %s, %d Day(s))",
+        date_from,
+        date_to,
+        len(dates),
+    )
+    return dates
+
+
+# 하루치 급식 데이터 해석
+# menu: [메뉴, 알레르기 비트마스크(n번 비트가 n번 식품)] 리스트
+# rendered: 사용자 설정(AllergyInfo)별로 알레르기 정보를 붙여 줄바꿈으로 이은 메뉴
+def parse_item(item: dict, date: datetime.date):
+    meal = []
+    rendered = {"None": [], "Number": [], "FullText": []}
+
+    # 메뉴 파싱
+    menu = item["DDISH_NM"].replace("<br/>", ".\n")  # 줄바꿈 처리
+    menu = menu.split("\n")  # 한 줄씩 자르기
+    for i in menu:
+        allergy_info = [int(x[:-1]) for x in re.findall(r"[0-9]+\.", i)]
+        i = i.replace(f'{".".join(str(x) for x in allergy_info)}.', "").replace(
+            "()", ""
         )
-        raise ConnectionError
-
-    data = json.loads(req.read())
-
-    try:
-        for item in data["mealServiceDietInfo"][1]["row"]:
-            meal = []
-            date = datetime.datetime.strptime(item["MLSV_YMD"], "%Y%m%d").date()
-
-            # 메뉴 파싱
-            menu = item["DDISH_NM"].replace("<br/>", ".\n")  # 줄바꿈 처리
-            menu = menu.split("\n")  # 한 줄씩 자르기
-            for i in menu:
-                allergy_info = [int(x[:-1]) for x in re.findall(r"[0-9]+\.", i)]
-                i = i.replace(f'{".".join(str(x) for x in allergy_info)}.', "").replace(
-                    "()", ""
+        i = re.sub(r"[ #&*-.=@_]+$", "", i)
+        # 맛있는 메뉴 강조표시
+        for keyword in DELICIOUS:
+            if keyword in i:
+                i = "⭐" + i  # 별 덧붙이기
+                break
+        meal.append([i, sum(1 << x for x in set(allergy_info))])
+        rendered["None"].append(i)
+        if allergy_info:
+            rendered["Number"].append(
+                "%s(%s)" % (i, ", ".join(str(x) for x in allergy_info))
+            )
+            rendered["FullText"].append(
+                "%s(%s)"
+                % (
+                    i,
+                    ", ".join(
+                        ALLERGENS[x] if 0 < x < len(ALLERGENS) else str(x)
+                        for x in allergy_info
+                    ),
                 )
-                i = re.sub(r"[ #&*-.=@_]+$", "", i)
-                # 맛있는 메뉴 강조표시
-                for keyword in DELICIOUS:
-                    if keyword in i:
-                        i = "⭐" + i  # 별 덧붙이기
-                        break
-                meal.append([i, allergy_info])
-
-            # 파일 쓰기
-            return_data = {
-                "date": "%s(%s)"
-                % (date.strftime("%Y-%m-%d"), WEEKDAYS[date.weekday()]),
-                "menu": meal,
-                "kcal": float(item["CAL_INFO"].replace(" Kcal", "")),
-            }
-            if debugging:
-                print(return_data)
-
-            with open(
-                "data/cache/" + date.strftime("%Y-%m-%d") + ".json",
-                "w",
-                encoding="utf-8",
-            ) as make_file:
-                json.dump(return_data, make_file, ensure_ascii=False)
-                print("File Created")
-
-            log.info(
-                "[#%s] parse@menu_parser.py: Succeeded(%s)"
-                % (req_id, date.strftime("%Y-%m-%d"))
             )
-    except KeyError:
-        pass
+        else:
+            rendered["Number"].append(i)
+            rendered["FullText"].append(i)
+
+    return {
+        "date": "%s(%s)" % (date.strftime("%Y-%m-%d"), WEEKDAYS[date.weekday()]),
+        "menu": meal,
+        "rendered": {name: "\n".join(lines) for name, lines in rendered.items()},
+        "kcal": float(item["CAL_INFO"].replace(" Kcal", "")),
+    }
 
 
 # 디버그
@@ -7,102 +7,145 @@
 # Copyright 2019-2020, Hyungyo Seo
 # schedule_parser.py - NEIS 서버에 접속하여 학사일정을 파싱해오는 스크립트입니다.
 
+import calendar
 import datetime
 import json
 import os
-import urllib.error
-import urllib.request
-from itertools import groupby
 
-from modules.common import log
+from modules.common import cache_store, log, trace, upstream
 
 # 설정 불러오기
 NEIS_OPENAPI_TOKEN = os.environ.get("HDMeal_NEIS_Token")  # NEIS 오픈API 인증 토큰
 ATPT_OFCDC_SC_CODE = os.environ.get("HDMeal_NEIS_ATPT_OFCDC_SC_CODE")  # 시도교육청코드
 SD_SCHUL_CODE = os.environ.get("HDMeal_NEIS_SD_SCHUL_CODE")  # 표준학교코드
+PAGE_SIZE = 1000  # 한 번에 받아올 행 수(NEIS 최대 1000)
+
+
+# 학년별 행사 여부 열 이름, n번째 열이 n학년(비트마스크의 n-1번째 비트)
+GRADE_COLUMNS = [
+    "ONE_GRADE_EVENT_YN",
+    "TW_GRADE_EVENT_YN",
+    "THREE_GRADE_EVENT_YN",
+    "FR_GRADE_EVENT_YN",
+    "FIV_GRADE_EVENT_YN",
+    "SIX_GRADE_EVENT_YN",
+]
 
 
 def parse(year, month, req_id, debugging):
     year, month = int(year), int(month)
-    schdls = {}
 
+    date_from = datetime.date(year, month, 1)
+    date_to = datetime.date(year, month, calendar.monthrange(year, month)[1])
+
+    parse_range(date_from, date_to, req_id, debugging)
+
+    return 0
+
+
+# 기간 파싱
+# date_from부터 date_to까지의 학사일정을 한 번에 받아와 달마다 캐시를 한꺼번에 씀
+# 달마다 [일, 행사명, 학년 비트마스크] 리스트를 날짜순으로 저장
+# 기간에 통째로 들어가는 달은 일정이 없어도 빈 리스트로 저장해 다시 받아오지 않도록 함
+# 캐시를 쓴 달의 캐시 키("YYYY-MM") 리스트를 반환
+@trace.traced()
+def parse_range(
+    date_from: datetime.date, date_to: datetime.date, req_id: str, debugging: bool
+):
     log.info(
-        "[#%s] parse@schedule_parser.py: Started Parsing Schedule(%s-%s)"
-        % (req_id, year, month)
+        "parse_range@schedule_parser.py: Started Parsing Schedule(%s ~ %s)",
+        date_from,
+        date_to,
     )
 
-    date_from = datetime.date(year, month, 1)
-    date_to = (date_from + datetime.timedelta(days=40)).replace(
-        day=1
-    ) - datetime.timedelta(days=1)
-    # 다음달 첫날의 날짜를 구하고 -1일 => 이번달 말일
-
-    try:
-        req = urllib.request.urlopen(
-            "https://open.neis.go.kr/hub/SchoolSchedule?KEY=%s&Type=json&ATPT_OFCDC_SC_CODE"
-            "=%s&SD_SCHUL_CODE=%s&AA_FROM_YMD=%s&AA_TO_YMD=%s"
-            % (
-                NEIS_OPENAPI_TOKEN,
-                ATPT_OFCDC_SC_CODE,
-                SD_SCHUL_CODE,
-                date_from.strftime("%Y%m%d"),
-                date_to.strftime("%Y%m%d"),
-            ),
-            timeout=2,
-        )
-    except (urllib.error.HTTPError, urllib.error.URLError) as e:
-        log.err(
-            "[#%s] parse@schedule_parser.py: Failed to Parse Schedule(%s-%s) because %s"
-            % (req_id, year, month, e)
+    rows = []
+    page = 1
+    while True:
+        try:
+            req = upstream.get(
+                "%s/hub/SchoolSchedule?KEY=%s&Type=json&ATPT_OFCDC_SC_CODE"
+                "=%s&SD_SCHUL_CODE=%s&AA_FROM_YMD=%s&AA_TO_YMD=%s&pIndex=%d&pSize=%d"
+                % (
+                    upstream.NEIS_URL,
+                    NEIS_OPENAPI_TOKEN,
+                    ATPT_OFCDC_SC_CODE,
+                    SD_SCHUL_CODE,
+                    date_from.strftime("%Y%m%d"),
+                    date_to.strftime("%Y%m%d"),
+                    page,
+                    PAGE_SIZE,
+                ),
+                req_id,
+            )
+        except upstream.Error as e:
+            log.err(
+                "parse_range@schedule_parser.py: Failed to Parse Schedule(%s ~ %s) because %s",
+                date_from,
+                date_to,
+                e,
+            )
+            raise ConnectionError
+
+        data = json.loads(req.content)
+
+        try:
+            total = data["SchoolSchedule"][0]["head"][0]["list_total_count"]
+            rows.extend(data["SchoolSchedule"][1]["row"])
+        except KeyError:  # 데이터 없음
+            break
+        if len(rows) >= total:
+            break
+        page += 1
+
+    # 달별로 묶음, 같은 날의 일정은 받은 순서를 유지함
+    schdls = {}
+    for i in rows:
+        if i["EVENT_NM"] == "토요휴업일":
+            continue
+
+        grades = 0
+        for bit, column in enumerate(GRADE_COLUMNS):
+            if i.get(column) == "Y":
+                grades |= 1 << bit
+
+        schdls.setdefault("%s-%s" % (i["AA_YMD"][:4], i["AA_YMD"][4:6]), []).append(
+            [int(i["AA_YMD"][6:]), i["EVENT_NM"], grades]
         )
-        raise ConnectionError
+    for events in schdls.values():
+        events.sort(key=lambda event: event[0])
 
-    data = json.loads(req.read())
+    # 일정이 없는 달도 캐시에 남김, 기간에 일부만 걸친 달은 다른 날 일정이 있을 수 있으므로 제외
+    year, month = date_from.year, date_from.month
+    while (year, month) <= (date_to.year, date_to.month):
+        month_first = datetime.date(year, month, 1)
+        month_last = datetime.date(year, month, calendar.monthrange(year, month)[1])
+        if date_from <= month_first and month_last <= date_to:
+            schdls.setdefault("%04d-%02d" % (year, month), [])
+        year, month = (year, month + 1) if month < 12 else (year + 1, 1)
 
-    schedules = []
-    for i in data["SchoolSchedule"][1]["row"]:
-        if i["EVENT_NM"] == "토요휴업일":
-            continue
+    if debugging:
+        print(schdls)
 
-        date = datetime.datetime.strptime(i["AA_YMD"], "%Y%m%d").date()
-
-        related_grade = []
-        if i["ONE_GRADE_EVENT_YN"] == "Y":
-            related_grade.append(1)
-        if i["TW_GRADE_EVENT_YN"] == "Y":
-            related_grade.append(2)
-        if i["THREE_GRADE_EVENT_YN"] == "Y":
-            related_grade.append(3)
-        if i["FR_GRADE_EVENT_YN"] == "Y":
-            related_grade.append(4)
-        if i["FIV_GRADE_EVENT_YN"] == "Y":
-            related_grade.append(5)
-        if i["SIX_GRADE_EVENT_YN"] == "Y":
-            related_grade.append(6)
-
-        schedules.append([date, i["EVENT_NM"], related_grade])
-
-        for k, v in groupby(schedules, lambda k: k[0]):
-            schedule_text = ""
-            for item in v:
-                schedule_text = "%s%s(%s)\n" % (
-                    schedule_text,
-                    item[1],
-                    ", ".join("%s학년" % i for i in item[2]),
-                )
-            schedule_text = schedule_text[:-1].replace("()", "")
-            schdls[str(k.day)] = schedule_text
-
-    if schdls:
-        with open(
-            "data/cache/Cal-%s-%s.json" % (year, month), "w", encoding="utf-8"
-        ) as make_file:
-            json.dump(schdls, make_file, ensure_ascii=False)
-            print("File Created")
-
-    log.info("[#%s] parse@schedule_parser.py: Succeeded(%s-%s)" % (req_id, year, month))
+    # 캐시 쓰기
+    cache_store.write_many("schdl", schdls)
 
-    return 0
+    log.info(
+        "parse_range@schedule_parser.py: Succeeded(%s ~ %s, %d Month(s))",
+        date_from,
+        date_to,
+        len(schdls),
+    )
+
+    return sorted(schdls)
+
+
+# 학년도 파싱
+# date가 속한 학년도(3월 1일 ~ 다음해 2월 말일)의 학사일정을 한 번에 받아옴
+def parse_school_year(date: datetime.date, req_id: str, debugging: bool):
+    year = date.year if date.month >= 3 else date.year - 1
+    date_from = datetime.date(year, 3, 1)
+    date_to = datetime.date(year + 1, 3, 1) - datetime.timedelta(days=1)
+    return parse_range(date_from, date_to, req_id, debugging)
 
 
 # 디버그
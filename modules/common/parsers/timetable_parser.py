@@ -10,102 +10,161 @@
 import datetime
 import json
 import os
-import urllib.error
-import urllib.request
-from itertools import groupby
 
-from modules.common import log
+from modules.common import (
+    cache_store,
+    log,
+    memory_cache,
+    single_flight,
+    trace,
+    upstream,
+)
 
 # 설정 불러오기
 NEIS_OPENAPI_TOKEN = os.environ.get("HDMeal_NEIS_Token")  # NEIS 오픈API 인증 토큰
 ATPT_OFCDC_SC_CODE = os.environ.get("HDMeal_NEIS_ATPT_OFCDC_SC_CODE")  # 시도교육청코드
 SD_SCHUL_CODE = os.environ.get("HDMeal_NEIS_SD_SCHUL_CODE")  # 표준학교코드
-
-timetable = {}
+PAGE_SIZE = 1000  # 한 번에 받아올 행 수(NEIS 최대 1000)
 
 
+@trace.traced()
 def parse(tt_grade, tt_class, year, month, date, req_id, debugging):
-    global timetable
-    timetable_raw_data = []
     tt_date = datetime.date(year, month, date)
     tt_grade = str(tt_grade)
     tt_class = str(tt_class)
     date_string = tt_date.strftime("%Y-%m-%d")
-    filename = "data/cache/TT-%s.json" % date_string
 
     log.info(
-        "[#%s] parse@timetable_parser.py: Started Parsing Timetable(%s-%s, %s)"
-        % (req_id, tt_grade, tt_class, tt_date)
+        "parse@timetable_parser.py: Started Parsing Timetable(%s-%s, %s)",
+        tt_grade,
+        tt_class,
+        tt_date,
     )
 
     if tt_date.weekday() > 4:
         return None
 
-    # 데이터 가져오기
-    def fetch():
-        global timetable
-        req = urllib.request.urlopen(
-            "https://open.neis.go.kr/hub/hisTimetable?KEY=%s&Type=json&pSize=1000"
-            "&ATPT_OFCDC_SC_CODE=%s&SD_SCHUL_CODE=%s&ALL_TI_YMD=%s"
-            % (
-                NEIS_OPENAPI_TOKEN,
-                ATPT_OFCDC_SC_CODE,
-                SD_SCHUL_CODE,
-                tt_date.strftime("%Y%m%d"),
-            ),
-            timeout=2,
+    try:
+        timetable = memory_cache.load("tt", date_string)  # 캐시 읽기
+    except Exception:  # 캐시 읽을 수 없으면
+        try:
+            # 캐시 삭제
+            cache_store.delete("tt", date_string)
+        except Exception as error:
+            log.err("parse@timetable_parser.py: Failed to Delete Cache")
+            return error
+        timetable = None
+    if timetable is None:  # 캐시 없으면
+        log.info("parse@timetable_parser.py: No Cache")
+        # 그 주 월요일부터 금요일까지 한 번에 파싱
+        # 같은 주를 동시에 여러 번 받아오지 않도록 요청을 합침
+        monday = tt_date - datetime.timedelta(days=tt_date.weekday())
+        friday = monday + datetime.timedelta(days=4)
+        single_flight.do(
+            "tt-%s" % monday.strftime("%Y-%m-%d"),
+            lambda: parse_range(monday, friday, req_id, debugging),
+            check=lambda: memory_cache.load("tt", date_string),
         )
-        data = json.loads(req.read())
-        print(data)
+        timetable = memory_cache.load("tt", date_string)
+        if timetable is None:  # 그날 시간표 없음
+            log.info("parse@timetable_parser.py: No Timetable(%s)", tt_date)
+            return None
+    else:
+        log.info("parse@timetable_parser.py: Read Data in Cache")
 
-        try:
-            for i in data["hisTimetable"][1]["row"]:
+    log.info(
+        "parse@timetable_parser.py: Succeeded(%s-%s, %s)", tt_grade, tt_class, tt_date
+    )
 
-                timetable_raw_data.append([i["GRADE"], i["CLASS_NM"], i["ITRT_CNTNT"]])
-        except (urllib.error.HTTPError, urllib.error.URLError) as e:
+    return timetable.get(tt_grade, {}).get(tt_class)
+
+
+# 기간 파싱
+# date_from부터 date_to까지의 시간표를 한 번에 받아와 날짜별로 캐시에 씀
+# {날짜: {학년: {반: [과목, ...]}}} 형태로 반환
+@trace.traced()
+def parse_range(
+    date_from: datetime.date, date_to: datetime.date, req_id: str, debugging: bool
+):
+    log.info(
+        "parse_range@timetable_parser.py: Started Parsing Timetable(%s ~ %s)",
+        date_from,
+        date_to,
+    )
+
+    rows = []
+    page = 1
+    while True:
+        try:
+            req = upstream.get(
+                "%s/hub/hisTimetable?KEY=%s&Type=json"
+                "&ATPT_OFCDC_SC_CODE=%s&SD_SCHUL_CODE=%s&TI_FROM_YMD=%s&TI_TO_YMD=%s"
+                "&pIndex=%d&pSize=%d"
+                % (
+                    upstream.NEIS_URL,
+                    NEIS_OPENAPI_TOKEN,
+                    ATPT_OFCDC_SC_CODE,
+                    SD_SCHUL_CODE,
+                    date_from.strftime("%Y%m%d"),
+                    date_to.strftime("%Y%m%d"),
+                    page,
+                    PAGE_SIZE,
+                ),
+                req_id,
+            )
+        except upstream.Error as e:
             log.err(
-                "[#%s] fetch.parse@timetable_parser.py: Failed to Parse Timetable(%s-%s, %s) because %s"
-                % (req_id, tt_grade, tt_class, tt_date, e)
+                "parse_range@timetable_parser.py: Failed to Parse Timetable(%s ~ %s) because %s",
+                date_from,
+                date_to,
+                e,
             )
             raise ConnectionError
 
-        print(timetable_raw_data)
+        data = json.loads(req.content)
 
-        for grade, x in groupby(timetable_raw_data, lambda i: i[0]):
-            timetable[grade] = {}
-            for class_, y in groupby(x, lambda i: i[1]):
-                timetable[grade][class_] = [i[2] for i in y if i[2] != "토요휴업일"]
+        try:
+            total = data["hisTimetable"][0]["head"][0]["list_total_count"]
+            rows.extend(data["hisTimetable"][1]["row"])
+        except KeyError:  # 데이터 없음
+            break
+        if len(rows) >= total:
+            break
+        page += 1
+
+    # 날짜, 학년, 반별로 묶고 교시 순으로 정렬
+    timetables = {}
+    for row in rows:
+        date_string = "%s-%s-%s" % (
+            row["ALL_TI_YMD"][:4],
+            row["ALL_TI_YMD"][4:6],
+            row["ALL_TI_YMD"][6:],
+        )
+        periods = (
+            timetables.setdefault(date_string, {})
+            .setdefault(row["GRADE"], {})
+            .setdefault(row["CLASS_NM"], [])
+        )
+        if row["ITRT_CNTNT"] != "토요휴업일":
+            periods.append((int(row.get("PERIO") or 0), row["ITRT_CNTNT"]))
+    for timetable in timetables.values():
+        for classes in timetable.values():
+            for class_, periods in classes.items():
+                classes[class_] = [i[1] for i in sorted(periods, key=lambda i: i[0])]
 
-        if timetable:
-            with open(filename, "w", encoding="utf-8") as make_file:
-                json.dump(timetable, make_file, ensure_ascii=False)
-                print("File Created")
+    if debugging:
+        print(timetables)
 
-    if os.path.isfile(filename):  # 캐시 있으면
-        try:
-            log.info("[#%s] parse@timetable_parser.py: Read Data in Cache" % req_id)
-            with open(filename, encoding="utf-8") as data_file:  # 캐시 읽기
-                timetable = json.load(data_file)
-        except Exception:  # 캐시 읽을 수 없으면
-            try:
-                # 캐시 삭제
-                os.remove("data/cache/TT.json")
-            except Exception as error:
-                log.err(
-                    "[#%s] parse@timetable_parser.py: Failed to Delete Cache" % req_id
-                )
-                return error
-            fetch()  # 파싱
-    else:  # 캐시 없으면
-        log.info("[#%s] parse@timetable_parser.py: No Cache" % req_id)
-        fetch()  # 파싱
+    # 캐시 쓰기
+    cache_store.write_many("tt", timetables)
 
     log.info(
-        "[#%s] parse@timetable_parser.py: Succeeded(%s-%s, %s)"
-        % (req_id, tt_grade, tt_class, tt_date)
+        "parse_range@timetable_parser.py: Succeeded(%s ~ %s, %d Day(s))",
+        date_from,
+        date_to,
+        len(timetables),
     )
-
-    return timetable[tt_grade][tt_class]
+    return timetables
 
 
 # 디버그
@@ -8,33 +8,28 @@
 # water_temp_parser.py - 실시간수질정보시스템 서버에 접속하여 수온정보를 파싱해오는 스크립트입니다.
 
 import datetime
+import json
 import os
-import urllib.error
-import urllib.request
 
-from modules.common import log
+from modules.common import log, trace, upstream
 
 api_key = os.environ.get("HDMeal_SeoulData_Token")
 
 
+@trace.traced()
 def get(req_id, debugging):
-    log.info(
-        "[#%s] get@water_temp_parser.py: Started Parsing Water Temperature" % req_id
-    )
+    log.info("get@water_temp_parser.py: Started Parsing Water Temperature")
     try:
-        url = urllib.request.urlopen(
-            f"http://openapi.seoul.go.kr:8088/{api_key}/json/WPOSInformationTime/1/5/",
-            timeout=2,
+        url = upstream.get(
+            f"{upstream.SEOUL_URL}/{api_key}/json/WPOSInformationTime/1/5/",
+            req_id,
         )
-    except (urllib.error.HTTPError, urllib.error.URLError) as e:
+    except upstream.Error as e:
         log.err(
-            "[#%s] get@water_temp_parser.py: Failed to Parse Water Temperature because %s"
-            % (req_id, e)
+            "get@water_temp_parser.py: Failed to Parse Water Temperature because %s", e
         )
         raise ConnectionError
-    import json
-
-    res = json.load(url)
+    res = json.loads(url.content)
     data = res["WPOSInformationTime"]["row"]
 
     # 측정일시 파싱
@@ -49,5 +44,5 @@ def get(req_id, debugging):
             measurements.append(float(temp))
         except ValueError:
             pass
-    log.info("[#%s] get@water_temp_parser.py: Succeeded" % req_id)
+    log.info("get@water_temp_parser.py: Succeeded")
     return measurement_date, str(sum(measurements) / len(measurements))
@@ -8,36 +8,32 @@
 # weather_parser.py - 날씨정보를 파싱해오는 스크립트입니다.
 
 import os
-import urllib.error
-import urllib.request
 import xml.etree.ElementTree
 
-from modules.common import log
+from modules.common import log, trace, upstream
 
 region = os.environ.get("HDMeal_KMAZone")
 
 
+@trace.traced()
 def parse(req_id, debugging):
 
-    log.info("[#%s] parse@weather_parser.py: Started Parsing Weather" % req_id)
+    log.info("parse@weather_parser.py: Started Parsing Weather")
 
     try:
-        url = urllib.request.urlopen(
-            "https://www.kma.go.kr/wid/queryDFSRSS.jsp" "?zone=%s" % region, timeout=2
-        )
-    except (urllib.error.HTTPError, urllib.error.URLError) as e:
-        log.err(
-            "[#%s] parse@weather_parser.py: Failed to Parse Weather because %s"
-            % (req_id, e)
+        url = upstream.get(
+            "%s/wid/queryDFSRSS.jsp?zone=%s" % (upstream.KMA_URL, region), req_id
         )
+    except upstream.Error as e:
+        log.err("parse@weather_parser.py: Failed to Parse Weather because %s", e)
         raise ConnectionError
     except Exception as error:
         if debugging:
             print(error)
-        log.err("[#%s] parse@weather_parser.py: Failed" % req_id)
+        log.err("parse@weather_parser.py: Failed")
         return error
 
-    data = xml.etree.ElementTree.fromstring(url.read().decode("utf-8")).findall(
+    data = xml.etree.ElementTree.fromstring(url.content.decode("utf-8")).findall(
         ".//data"
     )
 
@@ -94,17 +90,15 @@ def parse(req_id, debugging):
         weather["sky"] = sky[int(weather["sky"]) - 1]  # 1부터 시작
     else:
         weather["sky"] = "⚠ 오류"
-        log.err("[#%s] parse@weather_parser.py: Failed to Parse Sky" % req_id)
+        log.err("parse@weather_parser.py: Failed to Parse Sky")
 
     # 강수 형태 대응값 적용
     if int(weather["pty"]) < 4:
         weather["pty"] = pty[int(weather["pty"])]
     else:
         weather["pty"] = "⚠ 오류"
-        log.err(
-            "[#%s] parse@weather_parser.py: Failed to Parse Precipitation Type" % req_id
-        )
-    log.info("[#%s] parse@weather_parser.py: Succeeded" % req_id)
+        log.err("parse@weather_parser.py: Failed to Parse Precipitation Type")
+    log.info("parse@weather_parser.py: Succeeded")
     return weather
 
 
@@ -0,0 +1,184 @@
+# ██╗  ██╗██████╗ ███╗   ███╗███████╗ █████╗ ██╗
+# ██║  ██║██╔══██╗████╗ ████║██╔════╝██╔══██╗██║
+# ███████║██║  ██║██╔████╔██║█████╗  ███████║██║
+# ██╔══██║██║  ██║██║╚██╔╝██║██╔══╝  ██╔══██║██║
+# ██║  ██║██████╔╝██║ ╚═╝ ██║███████╗██║  ██║███████╗
+# ╚═╝  ╚═╝╚═════╝ ╚═╝     ╚═╝╚══════╝╚═╝  ╚═╝╚══════╝
+# Copyright 2019-2020, Hyungyo Seo
+# prewarm.py - 브리핑에 쓰일 데이터를 미리 받아두는 스케줄러입니다.
+
+import datetime
+import os
+import threading
+import time
+
+from modules.common import (
+    cache_store,
+    context,
+    get_data,
+    log,
+    security,
+    single_flight,
+)
+
+# 실행 시각(HH:MM, 쉼표로 구분), 비워두면 실행하지 않음
+# 오후에 실행하면 다음날, 오전에 실행하면 그날의 데이터를 받아옴
+TIMES = os.environ.get("HDMeal_PrewarmTimes", "16:50,06:30")
+# 마지막으로 실행한 시각을 남기는 파일, 워커마다 같은 시각에 스케줄러가 돌아도 한 번만 실행함
+MARKER = os.path.join(single_flight.LOCK_DIR, "prewarm.last")
+# 학년도 학사일정을 다시 받아오는 주기
+SCHOOL_YEAR_TTL = datetime.timedelta(days=1)
+
+_started = False
+_lock = threading.Lock()
+
+
+# 실행 시각 해석
+def schedule():
+    times = []
+    for item in TIMES.split(","):
+        item = item.strip()
+        if item:
+            times.append(datetime.datetime.strptime(item, "%H:%M").time())
+    return sorted(times)
+
+
+# 다음 실행 시각 구하기
+def next_run(now: datetime.datetime, times: list):
+    for day in range(2):
+        date = now.date() + datetime.timedelta(days=day)
+        for t in times:
+            run_at = datetime.datetime.combine(date, t)
+            if run_at > now:
+                return run_at
+    return None
+
+
+# 미리 받아오기
+# 요청과 마찬가지로 요청 ID를 만들어 로그에 남김
+def run(now: datetime.datetime = None):
+    req_id = security.generate_req_id()
+    with context.request(req_id):
+        return run_jobs(now, req_id)
+
+
+# 마지막으로 실행한 시각 읽기, 없으면 None
+def last_run():
+    try:
+        with open(MARKER, encoding="utf-8") as marker_file:
+            return marker_file.read().strip()
+    except OSError:
+        return None
+
+
+# 학년도 학사일정 받아오기, 캐시에 없는 달이 있거나 SCHOOL_YEAR_TTL이 지났을 때만 받아옴
+def school_year(date: datetime.datetime, req_id: str):
+    year = date.year if date.month >= 3 else date.year - 1
+    fetched = [
+        cache_store.fetched_at(
+            "schdl", "%04d-%02d" % (year if month >= 3 else year + 1, month)
+        )
+        for month in range(1, 13)
+    ]
+    if None not in fetched and datetime.datetime.now() - min(fetched) < SCHOOL_YEAR_TTL:
+        log.info("school_year@prewarm.py: Still Fresh(%s)", year)
+        return None
+    return get_data.schdl_school_year(date, req_id, False)
+
+
+def run_jobs(now: datetime.datetime, req_id: str):
+    if now is None:
+        now = datetime.datetime.now()
+    slot = now.strftime("%Y-%m-%d %H:%M")
+
+    # 브리핑은 오후 5시에 다음날로 넘어가므로, 오후에 실행하면 다음날을 받아옴
+    if now.time() >= datetime.time(12):
+        date = now + datetime.timedelta(days=1)
+        date_ko = "내일"
+    else:
+        date = now
+        date_ko = "오늘"
+
+    if date.weekday() >= 5:  # 주말에는 브리핑에서 데이터를 쓰지 않음
+        log.info("run@prewarm.py: Weekend(%s), Skipped", date.date())
+        return None
+
+    # 다른 워커가 이미 실행 중이거나 이 시각에 이미 실행했으면 건너뜀
+    with single_flight.file_lock("prewarm", blocking=False) as locked:
+        if not locked:
+            log.info("run@prewarm.py: Running on Another Worker")
+            return None
+        if last_run() == slot:
+            log.info("run@prewarm.py: Already Done(%s)", slot)
+            return None
+
+        log.info("run@prewarm.py: Started(%s)", date.date())
+        jobs = [
+            (
+                "Meal",
+                lambda: get_data.meal(date.year, date.month, date.day, req_id, False),
+            ),
+            # 학년도 전체 학사일정을 받아두어 기간 조회에 쓰일 캐시도 최신으로 유지함
+            ("SchoolYearSchedule", lambda: school_year(date, req_id)),
+            (
+                "Schedule",
+                lambda: get_data.schdl(date.year, date.month, date.day, req_id, False),
+            ),
+            # 하루치 시간표는 학교 전체가 한 번에 저장되므로 한 반만 조회하면 됨
+            ("Timetable", lambda: get_data.tt(1, 1, date, req_id, False)),
+            ("Weather", lambda: get_data.weather(date_ko, req_id, False)),
+        ]
+        timings = {}
+        started = time.perf_counter()
+        for name, job in jobs:
+            job_started = time.perf_counter()
+            try:
+                job()
+                status = "OK"
+            except Exception as e:
+                status = "Failed"
+                log.err("run@prewarm.py: Failed to Prewarm %s because %s", name, e)
+            timings[name] = time.perf_counter() - job_started
+            log.info("run@prewarm.py: %s %s (%.3fs)", name, status, timings[name])
+        with open(MARKER, "w", encoding="utf-8") as marker_file:
+            marker_file.write(slot)
+        log.info(
+            "run@prewarm.py: Succeeded(%s, %.3fs)",
+            date.date(),
+            time.perf_counter() - started,
+        )
+    return timings
+
+
+def loop(times: list):
+    while True:
+        now = datetime.datetime.now()
+        run_at = next_run(now, times)
+        time.sleep(max((run_at - now).total_seconds(), 0))
+        try:
+            run(run_at)  # 워커마다 같은 시각을 넘겨야 실행 기록이 맞음
+        except Exception as e:
+            log.err("loop@prewarm.py: Failed because %s", e)
+        time.sleep(1)  # 같은 시각에 두 번 실행되지 않도록 함
+
+
+# 스케줄러 시작, 프로세스마다 한 번만 실행됨
+def start():
+    global _started
+    times = schedule()
+    with _lock:
+        if _started or not times:
+            return False
+        _started = True
+    threading.Thread(target=loop, args=(times,), daemon=True).start()
+    log.info(
+        "start@prewarm.py: Scheduled at %s",
+        ", ".join(t.strftime("%H:%M") for t in times),
+    )
+    return True
+
+
+# 디버그
+if __name__ == "__main__":
+    log.init()
+    print(run())
@@ -0,0 +1,68 @@
+# ██╗  ██╗██████╗ ███╗   ███╗███████╗ █████╗ ██╗
+# ██║  ██║██╔══██╗████╗ ████║██╔════╝██╔══██╗██║
+# ███████║██║  ██║██╔████╔██║█████╗  ███████║██║
+# ██╔══██║██║  ██║██║╚██╔╝██║██╔══╝  ██╔══██║██║
+# ██║  ██║██████╔╝██║ ╚═╝ ██║███████╗██║  ██║███████╗
+# ╚═╝  ╚═╝╚═════╝ ╚═╝     ╚═╝╚══════╝╚═╝  ╚═╝╚══════╝
+# Copyright 2019-2020, Hyungyo Seo
+# render_cache.py - 같은 입력으로 만든 응답 본문을 직렬화된 채로 재사용하는 스크립트입니다.
+
+import threading
+from collections import OrderedDict
+
+from modules.common import metrics
+
+# 최대 항목 수, 넘치면 가장 오래 쓰지 않은 항목부터 버림
+SIZE = 1024
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # 키: (스탬프, 본문)
+_stats = {"hit": 0, "miss": 0, "invalidated": 0}
+
+
+# 응답 본문 읽기
+# stamps: 응답을 만드는 데 쓴 캐시 항목들의 스탬프(cache_store.stamp), 저장할 때와 다르면 None 반환
+def get(key: tuple, stamps: tuple):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            result = "miss"
+        elif entry[0] != stamps:  # 캐시 항목이 새로 쓰임
+            del _entries[key]
+            result = "invalidated"
+        else:
+            result = "hit"
+            _entries.move_to_end(key)
+        _stats[result] += 1
+    metrics.inc(
+        "hdmeal_cache_requests_total",
+        namespace="render",
+        layer="memory",
+        result="hit" if result == "hit" else "miss",
+    )
+    if result == "hit":
+        return entry[1]
+    return None
+
+
+# 응답 본문 저장, 아직 캐시에 없는 항목(스탬프가 None)으로 만든 응답은 저장하지 않음
+def put(key: tuple, stamps: tuple, body: bytes):
+    if None in stamps:
+        return
+    with _lock:
+        _entries[key] = (stamps, body)
+        _entries.move_to_end(key)
+        while len(_entries) > SIZE:
+            _entries.popitem(last=False)
+
+
+# 전부 비우기
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+# 적중/실패 횟수와 항목 수
+def stats():
+    with _lock:
+        return dict(_stats, size=len(_entries))
@@ -43,7 +43,7 @@ claim_options = {
 
 # JWT 토큰 생성
 def generate_token(issuer: str, uid: str, scope: list, req_id: str):
-    log.info("[#%s] generate_token@security.py: Token Generated" % req_id)
+    log.info("generate_token@security.py: Token Generated")
     now = datetime.datetime.utcnow()
     return jwt.encode(
         {"alg": "HS256", "typ": "JWT"},
@@ -69,15 +69,12 @@ def validate_token(token: str, req_id: str):
         )
         decoded.validate()
     except JWTErrors.ExpiredTokenError:
-        log.info("[#%s] validate_token@security.py: Expired Token" % req_id)
+        log.info("validate_token@security.py: Expired Token")
         return False, "ExpiredToken"
     except JWTErrors.JoseError:
-        log.info("[#%s] validate_token@security.py: Invalid Token" % req_id)
+        log.info("validate_token@security.py: Invalid Token")
         return False, "InvalidToken"
-    log.info(
-        "[#%s] validate_token@security.py: Valid Token (ISS %s)"
-        % (req_id, decoded["iss"])
-    )
+    log.info("validate_token@security.py: Valid Token (ISS %s)", decoded["iss"])
     return True, decoded["uid"], decoded["scope"]
 
 
@@ -91,17 +88,13 @@ def validate_recaptcha(token: str, req_id: str):
         )
         rspns = req.json()
     except Exception:
-        log.err(
-            "[#%s] validate_recaptcha@security.py: Recaptcha Validation Error" % req_id
-        )
+        log.err("validate_recaptcha@security.py: Recaptcha Validation Error")
         return False, "RecaptchaTokenValidationError"
     if rspns["success"]:
-        log.info("[#%s] validate_recaptcha@security.py: Valid Recaptcha Token" % req_id)
+        log.info("validate_recaptcha@security.py: Valid Recaptcha Token")
         return (True,)
     else:
-        log.info(
-            "[#%s] validate_recaptcha@security.py: Invalid Recaptcha Token" % req_id
-        )
+        log.info("validate_recaptcha@security.py: Invalid Recaptcha Token")
         return False, "InvalidRecaptchaToken"
 
 
@@ -123,8 +116,8 @@ def generate_req_id():
 # 토큰 인증
 def auth(token: str, req_id: str):
     if token in TOKENS:
-        log.info("[#%s] Authorized with Token" % req_id)
+        log.info("Authorized with Token")
         return True
     else:
-        log.info("[#%s] Failed to Authorize(Token Not Match)" % req_id)
+        log.info("Failed to Authorize(Token Not Match)")
         return False
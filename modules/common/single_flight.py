@@ -0,0 +1,118 @@
+# ██╗  ██╗██████╗ ███╗   ███╗███████╗ █████╗ ██╗
+# ██║  ██║██╔══██╗████╗ ████║██╔════╝██╔══██╗██║
+# ███████║██║  ██║██╔████╔██║█████╗  ███████║██║
+# ██╔══██║██║  ██║██║╚██╔╝██║██╔══╝  ██╔══██║██║
+# ██║  ██║██████╔╝██║ ╚═╝ ██║███████╗██║  ██║███████╗
+# ╚═╝  ╚═╝╚═════╝ ╚═╝     ╚═╝╚══════╝╚═╝  ╚═╝╚══════╝
+# Copyright 2019-2020, Hyungyo Seo
+# single_flight.py - 같은 데이터를 동시에 여러 번 받아오지 않도록 요청을 합치는 스크립트입니다.
+
+import contextlib
+import os
+import re
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Microsoft Windows에서는 프로세스 간 잠금 없이 동작
+    fcntl = None
+
+from modules.common import context, log, trace
+
+LOCK_DIR = "data/cache/locks"
+LOCK_TIMEOUT = 10  # 다른 프로세스의 잠금을 기다리는 최대 시간(초)
+
+_lock = threading.Lock()
+_calls = {}
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# key당 하나의 fn만 실행하고, 같은 key로 들어온 나머지 쓰레드는 그 결과를 함께 받음
+# 다른 프로세스와는 잠금 파일로 순서를 정하며, 잠금을 얻은 뒤 check()가 None이 아닌 값을
+# 돌려주면(다른 프로세스가 이미 캐시를 만든 경우) fn을 실행하지 않고 그 값을 사용
+def do(key: str, fn, check=None):
+    with _lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _Call()
+            _calls[key] = call
+
+    if not leader:
+        with trace.span("single_flight.wait", key=key):
+            call.event.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        with trace.span("single_flight.do", key=key), file_lock(key):
+            result = check() if check else None
+            if result is None:
+                result = fn()
+        call.result = result
+    except BaseException as error:
+        call.error = error
+        raise
+    finally:
+        with _lock:
+            del _calls[key]
+        call.event.set()
+    return result
+
+
+# 뒤에서 갱신하기
+# 같은 key로 이미 진행 중이면 아무것도 하지 않고, 아니면 데몬 쓰레드에서 do()를 실행
+def background(key: str, fn, check=None):
+    with _lock:
+        if key in _calls:
+            return False
+
+    def run():
+        try:
+            do(key, fn, check)
+        except Exception as error:
+            log.err(
+                "background@single_flight.py: Failed to Refresh %s because %s",
+                key,
+                error,
+            )
+
+    # 로그에 갱신을 일으킨 요청의 ID가 남도록 요청 컨텍스트를 넘겨줌
+    threading.Thread(target=context.wrap(run), daemon=True).start()
+    return True
+
+
+# 프로세스 간 잠금
+# LOCK_TIMEOUT이 지나도록 잠금을 얻지 못하면 잠금 없이 진행
+@contextlib.contextmanager
+def file_lock(key: str, blocking: bool = True):
+    if fcntl is None:
+        yield True
+        return
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    path = os.path.join(LOCK_DIR, re.sub(r"[^0-9A-Za-z_.-]", "_", key) + ".lock")
+    with open(path, "a") as lock_file:
+        deadline = time.monotonic() + (LOCK_TIMEOUT if blocking else 0)
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                locked = True
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    locked = False
+                    break
+                time.sleep(0.05)
+        try:
+            yield locked
+        finally:
+            if locked:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
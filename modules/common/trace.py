@@ -0,0 +1,244 @@
+# ██╗  ██╗██████╗ ███╗   ███╗███████╗ █████╗ ██╗
+# ██║  ██║██╔══██╗████╗ ████║██╔════╝██╔══██╗██║
+# ███████║██║  ██║██╔████╔██║█████╗  ███████║██║
+# ██╔══██║██║  ██║██║╚██╔╝██║██╔══╝  ██╔══██║██║
+# ██║  ██║██████╔╝██║ ╚═╝ ██║███████╗██║  ██║███████╗
+# ╚═╝  ╚═╝╚═════╝ ╚═╝     ╚═╝╚══════╝╚═╝  ╚═╝╚══════╝
+# Copyright 2019-2020, Hyungyo Seo
+# trace.py - 요청 처리 과정을 구간(span)별로 나눠 기록하고, 기록을 요청별 폭포수 그래프로 보여주는 스크립트입니다.
+
+import argparse
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import random
+import threading
+import time
+
+from modules.common import context
+
+# 기록 파일(JSON Lines), 한 줄에 구간 하나
+PATH = os.environ.get("HDMeal_TraceFile", "data/logs/trace.jsonl")
+# 기록할 요청 비율(0~1), 0이면 기록하지 않음
+SAMPLE_RATE = float(os.environ.get("HDMeal_TraceSampleRate", "0"))
+
+# 기록하지 않기로 한 요청 안의 구간
+_UNSAMPLED = object()
+
+_current = contextvars.ContextVar("hdmeal_span", default=None)
+_lock = threading.Lock()
+
+
+# 구간 기록
+# 가장 바깥 구간에서 기록 여부를 정하고, 안쪽 구간은 그 결정을 따름
+# 기록한 구간은 가장 바깥 구간이 끝날 때 한 번에 파일에 씀
+@contextlib.contextmanager
+def span(name: str, **attrs):
+    parent = _current.get()
+    if parent is _UNSAMPLED or (parent is None and random.random() >= SAMPLE_RATE):
+        token = _current.set(_UNSAMPLED)
+        try:
+            yield None
+        finally:
+            _current.reset(token)
+        return
+
+    current = {
+        "trace": parent["trace"] if parent else context.req_id() or new_id(),
+        "id": new_id(),
+        "parent": parent["id"] if parent else None,
+        "name": name,
+        "start": time.time(),
+        "thread": threading.current_thread().name,
+        "attrs": attrs,
+        # 가장 바깥 구간만 끝난 구간 목록을 가짐
+        "root": parent["root"] if parent else {"spans": [], "finished": False},
+    }
+    token = _current.set(current)
+    started = time.perf_counter()
+    try:
+        yield current["attrs"]
+    except BaseException as error:
+        current["attrs"]["error"] = type(error).__name__
+        raise
+    finally:
+        _current.reset(token)
+        current["duration"] = time.perf_counter() - started
+        finish(current, parent is None)
+
+
+# 함수 전체를 구간으로 기록하는 데코레이터
+def traced(name: str = None):
+    def decorator(fn):
+        span_name = name or "%s.%s" % (fn.__module__.rpartition(".")[2], fn.__name__)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.get() is _UNSAMPLED:  # 기록하지 않는 요청은 바로 실행
+                return fn(*args, **kwargs)
+            with span(span_name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# 끝난 구간 모으기, 가장 바깥 구간이 끝나면 모은 구간을 파일에 씀
+# 가장 바깥 구간이 끝난 뒤에 끝난 구간(제한 시간을 넘긴 작업 등)은 따로 씀
+def finish(current: dict, is_root: bool):
+    root = current.pop("root")
+    with _lock:
+        if not is_root and not root["finished"]:
+            root["spans"].append(current)
+            return
+        root["finished"] = True
+        spans = root["spans"] + [current]
+        root["spans"] = []
+        write(spans)
+
+
+def new_id():
+    return "%016x" % random.getrandbits(64)
+
+
+# 파일에 쓰기, _lock을 잡은 상태에서 호출
+def write(spans: list):
+    lines = "".join(
+        json.dumps(item, ensure_ascii=False, default=str) + "\n" for item in spans
+    )
+    try:
+        with open(PATH, "a", encoding="utf-8") as trace_file:
+            trace_file.write(lines)
+    except OSError:
+        pass
+
+
+# 기록 파일 읽기, {trace: [구간...]}
+def load(path: str):
+    traces = {}
+    with open(path, encoding="utf-8") as trace_file:
+        for line in trace_file:
+            try:
+                item = json.loads(line)
+            except ValueError:  # 쓰는 도중에 잘린 줄
+                continue
+            traces.setdefault(item["trace"], []).append(item)
+    return traces
+
+
+# 요청별 폭포수 그래프
+def waterfall(spans: list, width: int = 40):
+    start = min(item["start"] for item in spans)
+    end = max(item["start"] + item["duration"] for item in spans)
+    total = max(end - start, 1e-9)
+    children = {}
+    for item in spans:
+        children.setdefault(item["parent"], []).append(item)
+    ids = {item["id"] for item in spans}
+
+    lines = []
+
+    def draw(item, depth):
+        offset = int((item["start"] - start) / total * width)
+        length = max(int(item["duration"] / total * width), 1)
+        label = " ".join(
+            [item["name"]] + ["%s=%s" % pair for pair in item["attrs"].items()]
+        )
+        lines.append(
+            "%8.1fms %8.1fms |%s%s%s| %s%s"
+            % (
+                (item["start"] - start) * 1000,
+                item["duration"] * 1000,
+                " " * offset,
+                "#" * length,
+                " " * max(width - offset - length, 0),
+                "  " * depth,
+                label,
+            )
+        )
+        for child in sorted(children.get(item["id"], []), key=lambda c: c["start"]):
+            draw(child, depth + 1)
+
+    # 부모 구간이 기록에 없는 구간(잘린 기록)도 맨 위에 그림
+    roots = [item for item in spans if item["parent"] not in ids]
+    for root in sorted(roots, key=lambda item: item["start"]):
+        draw(root, 0)
+    return "\n".join(lines)
+
+
+# 가장 오래 걸린 구간
+def slowest(traces: dict, count: int = 20, name: str = None):
+    spans = [
+        item
+        for items in traces.values()
+        for item in items
+        if name is None or item["name"] == name
+    ]
+    spans.sort(key=lambda item: item["duration"], reverse=True)
+    return "\n".join(
+        "%8.1fms  %s  %s" % (item["duration"] * 1000, item["trace"], item["name"])
+        for item in spans[:count]
+    )
+
+
+# 구간 이름별 횟수, 평균, 최대 시간
+def summary(traces: dict):
+    stats = {}
+    for items in traces.values():
+        for item in items:
+            stat = stats.setdefault(item["name"], [0, 0.0, 0.0])
+            stat[0] += 1
+            stat[1] += item["duration"]
+            stat[2] = max(stat[2], item["duration"])
+    return "\n".join(
+        "%6d %10.1fms %10.1fms  %s" % (count, total / count * 1000, peak * 1000, name)
+        for name, (count, total, peak) in sorted(
+            stats.items(), key=lambda pair: pair[1][1], reverse=True
+        )
+    )
+
+
+# 명령줄
+# python -m modules.common.trace waterfall [요청 ID]
+# python -m modules.common.trace slowest [-n 개수] [--name 구간 이름]
+# python -m modules.common.trace summary
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="요청 처리 구간 기록 보기")
+    parser.add_argument("--file", default=PATH, help="기록 파일")
+    commands = parser.add_subparsers(dest="command", required=True)
+    waterfall_parser = commands.add_parser("waterfall", help="요청별 폭포수 그래프")
+    waterfall_parser.add_argument("req_id", nargs="?", help="요청 ID(없으면 전체)")
+    waterfall_parser.add_argument(
+        "--slowest", type=int, help="가장 오래 걸린 요청 N개만 보기"
+    )
+    slowest_parser = commands.add_parser("slowest", help="가장 오래 걸린 구간")
+    slowest_parser.add_argument("-n", type=int, default=20, help="개수")
+    slowest_parser.add_argument("--name", help="구간 이름")
+    commands.add_parser("summary", help="구간 이름별 횟수, 평균, 최대 시간")
+    args = parser.parse_args()
+
+    traces = load(args.file)
+    if args.command == "waterfall":
+        if args.req_id:
+            selected = [args.req_id] if args.req_id in traces else []
+        else:
+            selected = sorted(traces, key=lambda trace: traces[trace][0]["start"])
+            if args.slowest:
+                selected = sorted(
+                    traces,
+                    key=lambda trace: max(item["duration"] for item in traces[trace]),
+                    reverse=True,
+                )[: args.slowest]
+        if not selected:
+            print("기록이 없습니다.")
+        for trace in selected:
+            print("[#%s]" % trace)
+            print(waterfall(traces[trace]))
+            print()
+    elif args.command == "slowest":
+        print(slowest(traces, args.n, args.name))
+    else:
+        print(summary(traces))
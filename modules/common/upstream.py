@@ -0,0 +1,227 @@
+# ██╗  ██╗██████╗ ███╗   ███╗███████╗ █████╗ ██╗
+# ██║  ██║██╔══██╗████╗ ████║██╔════╝██╔══██╗██║
+# ███████║██║  ██║██╔████╔██║█████╗  ███████║██║
+# ██╔══██║██║  ██║██║╚██╔╝██║██╔══╝  ██╔══██║██║
+# ██║  ██║██████╔╝██║ ╚═╝ ██║███████╗██║  ██║███████╗
+# ╚═╝  ╚═╝╚═════╝ ╚═╝     ╚═╝╚══════╝╚═╝  ╚═╝╚══════╝
+# Copyright 2019-2020, Hyungyo Seo
+# upstream.py - 외부 서버(NEIS, 기상청 등)에 요청을 보내는 공용 HTTP 클라이언트입니다.
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from modules.common import context, log, metrics, trace
+
+TIMEOUT = 2  # 기본 제한 시간(초)
+# 연결 실패, 502/503/504 응답 시 재시도 횟수(읽기 시간 초과는 재시도하지 않음)
+RETRIES = 1
+POOL_HOSTS = 8  # 연결을 유지할 서버 수
+POOL_SIZE = 16  # 서버당 유지할 연결 수
+# 외부 서버 주소, 부하 테스트 등에서 가짜 서버(benchmarks/fake_upstream.py)로 바꿀 때 사용
+NEIS_URL = (os.environ.get("HDMeal_NEISURL") or "https://open.neis.go.kr").rstrip("/")
+KMA_URL = (os.environ.get("HDMeal_KMAURL") or "https://www.kma.go.kr").rstrip("/")
+SEOUL_URL = (
+    os.environ.get("HDMeal_SeoulDataURL") or "http://openapi.seoul.go.kr:8088"
+).rstrip("/")
+# 응답 기록/재생(성능 비교 때 매번 같은 응답을 쓰기 위함)
+# record: 실제 응답을 FIXTURES 폴더에 저장, replay: 저장된 응답으로 대신함, 비워두면 사용 안 함
+MODE = os.environ.get("HDMeal_UpstreamMode", "")
+FIXTURES = os.environ.get("HDMeal_UpstreamFixtures", "data/fixtures")
+# 재생할 때 기록된 응답 시간만큼 기다릴지 여부(false면 바로 응답)
+REPLAY_TIMING = os.environ.get("HDMeal_UpstreamReplayTiming", "true").lower() == "true"
+# 기록 파일에 남기지 않을 인증키
+SECRETS = [
+    token
+    for token in (
+        os.environ.get("HDMeal_NEIS_Token"),
+        os.environ.get("HDMeal_SeoulData_Token"),
+    )
+    if token
+]
+
+# 요청 실패 시 발생하는 예외
+Error = requests.RequestException
+
+_lock = threading.Lock()
+_session = None
+_session_pid = None
+_stats = {}
+
+
+# 세션 가져오기
+# gunicorn 워커끼리 연결을 공유하지 않도록 프로세스마다 따로 만듦
+def session():
+    global _session, _session_pid
+    with _lock:
+        if _session is None or _session_pid != os.getpid():
+            adapter = HTTPAdapter(
+                pool_connections=POOL_HOSTS,
+                pool_maxsize=POOL_SIZE,
+                max_retries=Retry(
+                    total=RETRIES,
+                    connect=RETRIES,
+                    read=0,
+                    status=RETRIES,
+                    backoff_factor=0.2,
+                    status_forcelist=(502, 503, 504),
+                    allowed_methods=frozenset(["GET"]),
+                    raise_on_status=False,
+                ),
+            )
+            _session = requests.Session()
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+            _session_pid = os.getpid()
+        return _session
+
+
+# GET 요청
+# 4xx/5xx 응답이나 연결 실패 시 Error 발생
+def get(url: str, req_id: str, timeout: float = TIMEOUT):
+    host = urllib.parse.urlsplit(url).hostname
+    started = time.perf_counter()
+    try:
+        # 인증키가 들어있는 쿼리 문자열은 기록하지 않음
+        with context.timed("upstream"), trace.span(
+            "upstream.get", host=host, path=urllib.parse.urlsplit(url).path
+        ) as span:
+            if MODE == "replay":
+                response = replay(url)
+            else:
+                response = session().get(url, timeout=timeout)
+                if MODE == "record":
+                    save(url, response)
+            if span is not None:
+                span["status"] = response.status_code
+        response.raise_for_status()
+    except Error as e:
+        record(host, time.perf_counter() - started, False)
+        # 예외 메시지에 인증키가 들어간 URL이 있으므로 지운 메시지로 바꿔서 발생시킴
+        # 호출한 쪽(파서 등)에서 예외를 로그로 남겨도 인증키가 남지 않음
+        error = redacted(e)
+        log.err("get@upstream.py: Failed to Request %s because %s", host, error)
+        raise error from None
+    record(host, time.perf_counter() - started, True)
+    return response
+
+
+# 기록 파일 이름을 정하는 데 쓰는 URL
+# 인증키를 지우고 쿼리 문자열을 정렬해, 인증키나 인자 순서가 달라도 같은 파일을 찾음
+# 서버 주소도 빼므로 가짜 서버에서 기록한 응답을 실제 서버 주소로 재생할 수 있음
+def normalize(url: str):
+    parts = urllib.parse.urlsplit(url)
+    query = sorted(
+        (name, value)
+        for name, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if name.upper() != "KEY"
+    )
+    path = parts.path
+    for secret in SECRETS:
+        path = path.replace(secret, "KEY")
+    if query:
+        return "%s?%s" % (path, urllib.parse.urlencode(query))
+    return path
+
+
+# 문자열에서 인증키 지우기
+# 쿼리 문자열의 KEY 값과 경로에 들어간 인증키(SECRETS)를 모두 지움
+def redact(text: str):
+    text = re.sub(r"(?i)([?&]KEY=)[^&\s'\"]*", r"\1KEY", text)
+    for secret in SECRETS:
+        text = text.replace(secret, "KEY")
+    return text
+
+
+# 메시지에서 인증키를 지운 같은 종류의 예외
+def redacted(e: Error):
+    message = redact(str(e))
+    try:
+        return type(e)(message, request=e.request, response=e.response)
+    except TypeError:
+        return Error(message, request=e.request, response=e.response)
+
+
+# 기록 파일 경로(확장자 제외)
+def fixture_path(url: str):
+    key = normalize(url)
+    return os.path.join(FIXTURES, hashlib.sha1(key.encode("utf-8")).hexdigest()[:16])
+
+
+# 응답 저장, 본문은 받은 그대로 .body 파일에 저장
+def save(url: str, response):
+    path = fixture_path(url)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".body", "wb") as body_file:
+        body_file.write(response.content)
+    with open(path + ".json", "w", encoding="utf-8") as meta_file:
+        json.dump(
+            {
+                "url": normalize(url),
+                "status": response.status_code,
+                "content_type": response.headers.get("Content-Type"),
+                "elapsed": response.elapsed.total_seconds(),
+            },
+            meta_file,
+            ensure_ascii=False,
+            indent=2,
+        )
+
+
+# 저장된 응답 불러오기, 없으면 Error 발생
+def replay(url: str):
+    path = fixture_path(url)
+    try:
+        with open(path + ".json", encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        with open(path + ".body", "rb") as body_file:
+            content = body_file.read()
+    except FileNotFoundError:
+        raise requests.ConnectionError("No Recorded Response for %s" % normalize(url))
+    if REPLAY_TIMING:
+        time.sleep(meta["elapsed"])
+    response = requests.Response()
+    response.status_code = meta["status"]
+    if meta["content_type"]:
+        response.headers["Content-Type"] = meta["content_type"]
+    response._content = content
+    response.url = url
+    return response
+
+
+# 서버별 응답 시간 기록
+def record(host: str, elapsed: float, succeeded: bool):
+    metrics.observe("hdmeal_upstream_request_duration_seconds", elapsed, host=host)
+    if not succeeded:
+        metrics.inc("hdmeal_upstream_errors_total", host=host)
+    with _lock:
+        stat = _stats.setdefault(
+            host, {"requests": 0, "errors": 0, "total": 0.0, "max": 0.0}
+        )
+        stat["requests"] += 1
+        if not succeeded:
+            stat["errors"] += 1
+        stat["total"] += elapsed
+        stat["max"] = max(stat["max"], elapsed)
+
+
+# 서버별 요청 수, 실패 수, 평균/최대 응답 시간(밀리초)
+def stats():
+    with _lock:
+        return {
+            host: {
+                "requests": stat["requests"],
+                "errors": stat["errors"],
+                "avg_ms": round(stat["total"] / stat["requests"] * 1000, 1),
+                "max_ms": round(stat["max"] * 1000, 1),
+            }
+            for host, stat in _stats.items()
+        }
@@ -0,0 +1,656 @@
+# ██╗  ██╗██████╗ ███╗   ███╗███████╗ █████╗ ██╗
+# ██║  ██║██╔══██╗████╗ ████║██╔════╝██╔══██╗██║
+# ███████║██║  ██║██╔████╔██║█████╗  ███████║██║
+# ██╔══██║██║  ██║██║╚██╔╝██║██╔══╝  ██╔══██║██║
+# ██║  ██║██████╔╝██║ ╚═╝ ██║███████╗██║  ██║███████╗
+# ╚═╝  ╚═╝╚═════╝ ╚═╝     ╚═╝╚══════╝╚═╝  ╚═╝╚══════╝
+# Copyright 2019-2020, Hyungyo Seo
+# test_offline.py - 서버를 띄우거나 외부 서버에 접속하지 않고 실행하는 유닛 테스트용 스크립트입니다.
+#
+# 사용법(저장소 최상위 폴더에서):
+#   python -m unittest test_offline
+#
+# 외부 서버는 benchmarks.stub_upstream이 대신 응답하며, 설정과 data 폴더는 벤치마크와 같은 것을 씀
+
+import datetime
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import urllib.parse
+from unittest import mock
+
+from benchmarks import run, stub_upstream
+
+# 모듈을 불러올 때 설정과 data 폴더를 읽으므로 먼저 준비해야 함
+for key, value in run.ENVIRONMENT.items():
+    os.environ.setdefault(key, value)
+workspace = run.workspace()
+os.chdir(workspace)
+sys.path.insert(0, run.ROOT)
+
+import application
+from modules.chatbot import chat, user, user_store
+from modules.common import (
+    cache_store,
+    context,
+    get_data,
+    render_cache,
+    single_flight,
+    upstream,
+)
+from modules.common.parsers import menu_parser, water_temp_parser
+
+stub_upstream.install()
+
+
+def tearDownModule():
+    os.chdir(run.ROOT)
+    shutil.rmtree(workspace, ignore_errors=True)
+
+
+# 지금까지 NEIS에 보낸 요청 수
+def neis_requests():
+    host = urllib.parse.urlsplit(upstream.NEIS_URL).hostname
+    return upstream.stats().get(host, {}).get("requests", 0)
+
+
+class MenuParserTests(unittest.TestCase):
+    def setUp(self):
+        run.purge_cache()
+        self.page_size = stub_upstream.MAX_PAGE_SIZE
+
+    def tearDown(self):
+        stub_upstream.MAX_PAGE_SIZE = self.page_size
+
+    # 한 페이지에 다 들어오지 않으면 다음 페이지를 이어 받아 날짜마다 캐시를 씀
+    def test_parse_range_pagination(self):
+        stub_upstream.MAX_PAGE_SIZE = 5
+        date_from = datetime.date(2020, 6, 1)
+        date_to = datetime.date(2020, 6, 30)
+        weekdays = [
+            date_from + datetime.timedelta(days=i)
+            for i in range(30)
+            if (date_from + datetime.timedelta(days=i)).weekday() < 5
+        ]
+
+        requests = neis_requests()
+        dates = menu_parser.parse_range(date_from, date_to, "test", False)
+        self.assertEqual(dates, weekdays, "빠진 날짜가 있음")
+        self.assertEqual(
+            neis_requests() - requests, 5, "페이지 수가 다름"
+        )  # 22일, 5일씩
+        self.assertEqual(
+            cache_store.keys("meal"),
+            [date.isoformat() for date in weekdays],
+            "캐시가 쓰이지 않음",
+        )
+
+
+class MealTests(unittest.TestCase):
+    def setUp(self):
+        run.purge_cache()
+
+    # 급식이 없는 날도 캐시에 남겨 다시 요청하지 않음
+    def test_no_meal_cached(self):
+        data = get_data.meal(2020, 6, 6, "test", False)  # 토요일
+        self.assertIn("message", data, "급식이 있음")
+        requests = neis_requests()
+        self.assertEqual(get_data.meal(2020, 6, 6, "test", False), data, "캐시와 다름")
+        self.assertEqual(neis_requests(), requests, "다시 요청함")
+
+    # 급식 없음 캐시가 만료되면 그 날만 다시 받아옴
+    def test_no_meal_expired(self):
+        data = get_data.meal(2020, 6, 6, "test", False)
+        expired = datetime.datetime.now() - get_data.MEAL_NEGATIVE_TTL
+        data["Timestamp"] = int(expired.timestamp()) - 1
+        cache_store.write("meal", "2020-06-06", data)
+
+        requests = neis_requests()
+        self.assertIn(
+            "message", get_data.meal(2020, 6, 6, "test", False), "급식이 있음"
+        )
+        self.assertEqual(neis_requests() - requests, 1, "요청 수가 다름")
+        self.assertNotEqual(
+            cache_store.read("meal", "2020-06-06")["Timestamp"],
+            data["Timestamp"],
+            "다시 쓰이지 않음",
+        )
+
+    # 평일에 급식이 없으면 그날 학사일정을 이유로 남기며, 학사일정은 한 번만 받아옴
+    def test_no_meal_reason(self):
+        meal = stub_upstream.meal
+
+        def without_15th(query):
+            data = meal(query)
+            rows = data["mealServiceDietInfo"][1]["row"]
+            rows[:] = [row for row in rows if row["MLSV_YMD"] != "20200615"]
+            data["mealServiceDietInfo"][0]["head"][0]["list_total_count"] = len(rows)
+            return data
+
+        with mock.patch.object(stub_upstream, "meal", without_15th):
+            requests = neis_requests()
+            data = get_data.meal(2020, 6, 15, "test", False)
+        self.assertEqual(data["reason"], "행사 15일", "학사일정이 반영되지 않음")
+        self.assertEqual(
+            neis_requests() - requests, 2, "요청 수가 다름"
+        )  # 급식, 학사일정
+        self.assertIsNone(
+            get_data.meal(2020, 6, 13, "test", False)["reason"], "주말에 이유가 있음"
+        )
+
+
+class SingleFlightTests(unittest.TestCase):
+    # threads개 쓰레드에서 동시에 single_flight.do(key, fn) 실행, [결과 또는 예외] 반환
+    def run_together(self, key: str, fn, threads: int = 5):
+        barrier = threading.Barrier(threads)
+        results = [None] * threads
+
+        def worker(i):
+            barrier.wait()
+            try:
+                results[i] = single_flight.do(key, fn)
+            except Exception as e:
+                results[i] = e
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return results
+
+    # 같은 키로 동시에 들어온 요청은 한 번만 실행하고 결과를 나눠 받음
+    def test_coalesced(self):
+        calls = []
+
+        def fn():
+            calls.append(None)
+            time.sleep(0.2)
+            return "result"
+
+        self.assertEqual(
+            self.run_together("test-coalesced", fn), ["result"] * 5, "결과가 다름"
+        )
+        self.assertEqual(len(calls), 1, "여러 번 실행됨")
+
+    # 실행 중 난 예외는 기다리던 쓰레드에도 전달됨
+    def test_error_shared(self):
+        def fn():
+            time.sleep(0.2)
+            raise ConnectionError
+
+        for result in self.run_together("test-error", fn):
+            self.assertIsInstance(result, ConnectionError, "예외가 전달되지 않음")
+
+    # check가 값을 돌려주면 fn을 실행하지 않음
+    def test_check(self):
+        def fn():
+            self.fail("fn이 실행됨")
+
+        self.assertEqual(
+            single_flight.do("test-check", fn, check=lambda: "cached"), "cached"
+        )
+
+    # 같은 키로 이미 진행 중이면 뒤에서 다시 실행하지 않음
+    def test_background(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def fn():
+            started.set()
+            release.wait(5)
+
+        self.assertTrue(
+            single_flight.background("test-background", fn), "실행되지 않음"
+        )
+        started.wait(5)
+        self.assertFalse(single_flight.background("test-background", fn), "다시 실행됨")
+        release.set()
+
+
+class ScheduleTests(unittest.TestCase):
+    def setUp(self):
+        run.purge_cache()
+
+    # 일정이 없는 달도 빈 리스트로 캐시에 남겨 다시 요청하지 않음
+    def test_empty_month_cached(self):
+        schedule = stub_upstream.schedule
+
+        def without_august(query):
+            if query["AA_FROM_YMD"][4:6] == "08":
+                return {"RESULT": {"CODE": "INFO-200"}}
+            return schedule(query)
+
+        with mock.patch.object(stub_upstream, "schedule", without_august):
+            self.assertEqual(get_data.schdl(2020, 8, 15, "test", False), [])
+            self.assertEqual(cache_store.read("schdl", "2020-08"), [])
+            requests = neis_requests()
+            self.assertEqual(get_data.schdl(2020, 8, 1, "test", False), [])
+            self.assertEqual(neis_requests(), requests, "다시 요청함")
+
+    # 여러 달을 한 번에 받아오며, 일정이 없는 날은 빠짐
+    def test_mass(self):
+        requests = neis_requests()
+        schdls = get_data.schdl_mass(
+            datetime.datetime(2020, 6, 10), datetime.datetime(2020, 8, 5), "test", False
+        )
+        self.assertEqual(neis_requests() - requests, 1, "한 번에 받아오지 않음")
+        self.assertEqual(
+            [schdl[:3] for schdl in schdls],
+            [(2020, 6, 15), (2020, 7, 1), (2020, 7, 15), (2020, 8, 1)],
+        )
+        self.assertEqual(cache_store.keys("schdl"), ["2020-06", "2020-07", "2020-08"])
+
+    # 없는 학년은 오류 메시지로 응답하며, 만들어둔 응답을 찾지 않음
+    def test_grade_out_of_range(self):
+        for grade in ("0", "7", "-1"):
+            params = {"date": datetime.datetime(2020, 6, 15), "grade": grade}
+            self.assertIsNone(
+                chat.render_key("test", "Schedule", params, "test", False)
+            )
+            self.assertEqual(
+                chat.schdl(params, "test", False)[0], ["올바른 숫자를 입력해 주세요."]
+            )
+        params = {"date": datetime.datetime(2020, 6, 15), "grade": "1"}
+        self.assertIsNotNone(chat.render_key("test", "Schedule", params, "test", False))
+        self.assertNotEqual(
+            chat.schdl(params, "test", False)[0], ["올바른 숫자를 입력해 주세요."]
+        )
+
+
+# 저장소 공통 테스트, backend()로 만든 빈 저장소에서 실행
+class CacheStoreTests:
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(dir=workspace)
+        self.store = self.backend()
+
+    def test_read_write(self):
+        self.assertIsNone(self.store.read("meal", "2020-06-01"), "없는 항목이 있음")
+        self.assertIsNone(self.store.stamp("meal", "2020-06-01"), "없는 항목이 있음")
+        self.store.write_many("meal", {"2020-06-01": {"menu": "밥"}, "2020-06-02": {}})
+        self.assertEqual(self.store.read("meal", "2020-06-01"), {"menu": "밥"})
+        self.assertEqual(self.store.read("meal", "2020-06-02"), {})
+        self.assertIsNotNone(self.store.stamp("meal", "2020-06-01"), "스탬프가 없음")
+
+    # 다시 쓰면 스탬프가 바뀜(메모리 캐시와 응답 캐시가 이를 보고 무효화함)
+    def test_stamp_changes(self):
+        self.store.write_many("schdl", {"2020-06": []})
+        stamp = self.store.stamp("schdl", "2020-06")
+        time.sleep(0.01)
+        self.store.write_many("schdl", {"2020-06": [[1, "행사", 0]]})
+        self.assertNotEqual(self.store.stamp("schdl", "2020-06"), stamp, "그대로임")
+
+    def test_keys_and_range(self):
+        self.store.write_many(
+            "meal", {"2020-06-03": 3, "2020-06-01": 1, "2020-07-01": 7}
+        )
+        self.store.write_many("tt", {"2020-06-02": 2})
+        self.assertEqual(
+            self.store.keys("meal"), ["2020-06-01", "2020-06-03", "2020-07-01"]
+        )
+        self.assertEqual(
+            self.store.read_range("meal", "2020-06-01", "2020-06-30"),
+            [("2020-06-01", 1), ("2020-06-03", 3)],
+        )
+
+    def test_delete_and_purge(self):
+        self.store.write_many("meal", {"2020-06-01": 1, "2020-06-02": 2})
+        self.store.write_many("weather", {"": {}})
+        self.store.delete("meal", "2020-06-01")
+        self.store.delete("meal", "2020-06-01")  # 없는 항목은 무시
+        self.assertEqual(self.store.keys("meal"), ["2020-06-02"])
+        self.store.purge()
+        self.assertEqual(self.store.keys("meal"), [])
+        self.assertIsNone(self.store.read("weather", ""), "지워지지 않음")
+
+
+class JSONDirBackendTests(CacheStoreTests, unittest.TestCase):
+    def backend(self):
+        return cache_store.JSONDirBackend(self.directory)
+
+    # 예전 파일 이름을 그대로 씀
+    def test_filenames(self):
+        self.store.write_many("meal", {"2020-06-01": 1})
+        self.store.write_many("schdl", {"2020-06": []})
+        self.store.write_many("tt", {"2020-06-01": 1})
+        self.store.write_many("weather", {"": 1})
+        self.store.write_many("wtemp", {"": 1})
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            [
+                "2020-06-01.json",
+                "Cal-2020-6.json",
+                "TT-2020-06-01.json",
+                "weather.json",
+                "wtemp.json",
+            ],
+        )
+
+    # 예전 버전이 남긴 파일도 읽음, 학사일정 파일은 달에 0을 채우지 않았음
+    def test_legacy_files(self):
+        for filename in ("Cal-2020-6.json", "Cal-2020-11.json", "2020-06-01.json"):
+            with open(os.path.join(self.directory, filename), "w") as legacy_file:
+                legacy_file.write("[]")
+        self.assertEqual(self.store.keys("schdl"), ["2020-06", "2020-11"])
+        self.assertEqual(self.store.read("schdl", "2020-06"), [])
+        self.assertEqual(self.store.keys("meal"), ["2020-06-01"])
+        self.assertEqual(self.store.keys("tt"), [])
+
+
+class SQLiteBackendTests(CacheStoreTests, unittest.TestCase):
+    def backend(self):
+        return cache_store.SQLiteBackend(os.path.join(self.directory, "cache.sqlite3"))
+
+
+# 다른 프로세스처럼 따로 연결해서 사용자의 학년을 바꿈
+def write_grade_elsewhere(uid: str, grade: int):
+    conn = sqlite3.connect(user_store.PATH, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("UPDATE users SET grade = ? WHERE uid = ?", (grade, uid))
+        conn.execute("INSERT INTO changes (uid) VALUES (?)", (uid,))
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+class UserStoreTests(unittest.TestCase):
+    settings = {"Grade": 1, "Class": 2, "Preferences": {"AllergyInfo": "FullText"}}
+
+    # users.json을 한 번만 옮겨옴
+    def test_migrate(self):
+        directory = tempfile.mkdtemp(dir=workspace)
+        json_path = os.path.join(directory, "users.json")
+        with open(json_path, "w", encoding="utf-8") as users_file:
+            json.dump({"user-a": self.settings, "user-b": {"Grade": 3}}, users_file)
+        conn = sqlite3.connect(
+            os.path.join(directory, "users.sqlite3"), isolation_level=None
+        )
+        with mock.patch.object(user_store, "JSON_PATH", json_path):
+            user_store.migrate(conn)
+            with open(json_path, "w", encoding="utf-8") as users_file:
+                json.dump({"user-c": self.settings}, users_file)
+            user_store.migrate(conn)  # 이미 옮겨왔으면 다시 읽지 않음
+
+        self.assertEqual(
+            conn.execute("PRAGMA user_version").fetchone()[0], user_store.SCHEMA_VERSION
+        )
+        self.assertEqual(
+            conn.execute("SELECT uid, grade, class, preferences FROM users").fetchall(),
+            [
+                ("user-a", 1, 2, '{"AllergyInfo": "FullText"}'),
+                ("user-b", 3, None, "{}"),
+            ],
+        )
+        conn.close()
+
+    def test_put_get_delete(self):
+        self.assertIsNone(user_store.get("store-a"), "없는 사용자가 있음")
+        user_store.put("store-a", self.settings)
+        self.assertEqual(user_store.get("store-a"), self.settings)
+        self.assertTrue(user_store.delete("store-a"), "지워지지 않음")
+        self.assertFalse(user_store.delete("store-a"), "없는 사용자가 지워짐")
+        self.assertIsNone(user_store.get("store-a"), "지운 사용자가 있음")
+
+    # 캐시한 정보를 받은 쪽에서 바꿔도 캐시는 그대로임
+    def test_cache_copied(self):
+        user_store.put("store-b", self.settings)
+        data = user_store.get("store-b")
+        data["Preferences"]["AllergyInfo"] = "None"
+        self.assertEqual(user_store.get("store-b"), self.settings, "캐시가 바뀜")
+
+    # 다른 프로세스가 바꾼 사용자는 캐시에서 지우고 다시 읽음
+    def test_invalidated_by_other_process(self):
+        user_store.put("store-c", self.settings)
+        user_store.get("store-c")  # 캐시에 올림
+        write_grade_elsewhere("store-c", 3)
+        self.assertEqual(
+            user_store.get("store-c")["Grade"], 3, "바뀐 정보가 반영되지 않음"
+        )
+
+
+class UserMemoTests(unittest.TestCase):
+    settings = UserStoreTests.settings
+
+    # 같은 요청 안에서는 처음 읽은 정보를 쓰고, 다음 요청에서는 바뀐 정보를 읽음
+    def test_memo_per_request(self):
+        user_store.put("memo-a", self.settings)
+        with context.request("test-1"):
+            self.assertEqual(user.get_user("memo-a", "test-1", False)[0], 1)
+            write_grade_elsewhere("memo-a", 3)
+            self.assertEqual(
+                user.get_user("memo-a", "test-1", False)[0], 1, "요청 중에 바뀜"
+            )
+        with context.request("test-2"):
+            self.assertEqual(
+                user.get_user("memo-a", "test-2", False)[0],
+                3,
+                "바뀐 정보가 반영되지 않음",
+            )
+
+    # 받은 정보를 바꿔도 같은 요청의 다음 조회에는 영향이 없음
+    def test_memo_copied(self):
+        user_store.put("memo-b", self.settings)
+        with context.request("test"):
+            user.get_user("memo-b", "test", False)[2]["AllergyInfo"] = "None"
+            self.assertEqual(
+                user.get_user("memo-b", "test", False)[2],
+                self.settings["Preferences"],
+                "기억해둔 정보가 바뀜",
+            )
+
+    # 사용자 정보를 바꾸면 같은 요청에서도 다시 읽음
+    def test_forget(self):
+        user_store.put("memo-c", self.settings)
+        with context.request("test"):
+            user.get_user("memo-c", "test", False)
+            write_grade_elsewhere("memo-c", 3)
+            user.forget_user("memo-c")
+            self.assertEqual(
+                user.get_user("memo-c", "test", False)[0], 3, "다시 읽지 않음"
+            )
+
+    # 요청 밖에서는 기억하지 않음
+    def test_no_memo_outside_request(self):
+        user_store.put("memo-d", self.settings)
+        user.get_user("memo-d", "test", False)
+        write_grade_elsewhere("memo-d", 3)
+        self.assertEqual(
+            user.get_user("memo-d", "test", False)[0], 3, "요청 밖에서 기억함"
+        )
+
+
+class UpstreamRecordTests(unittest.TestCase):
+    url = (
+        "https://open.neis.go.kr/hub/mealServiceDietInfo?KEY=benchmark&Type=json"
+        "&MLSV_YMD=20200601&pIndex=1"
+    )
+    # 서버 주소, 인증키, 인자 순서만 다른 URL
+    other_url = (
+        "http://127.0.0.1:8900/hub/mealServiceDietInfo?pIndex=1&MLSV_YMD=20200601"
+        "&Type=json&KEY=other"
+    )
+
+    def setUp(self):
+        self.fixtures = tempfile.mkdtemp(dir=workspace)
+
+    # 서버 주소와 인증키를 빼고 인자를 정렬함
+    def test_normalize(self):
+        key = "/hub/mealServiceDietInfo?MLSV_YMD=20200601&Type=json&pIndex=1"
+        self.assertEqual(upstream.normalize(self.url), key)
+        self.assertEqual(upstream.normalize(self.other_url), key)
+        self.assertEqual(
+            upstream.fixture_path(self.url), upstream.fixture_path(self.other_url)
+        )
+
+    # 경로에 들어간 인증키도 지우며, 쿼리 문자열이 없으면 ?를 붙이지 않음
+    def test_normalize_path(self):
+        self.assertEqual(
+            upstream.normalize(
+                "http://openapi.seoul.go.kr:8088/benchmark/json/WPOSInformationTime/1/5/"
+            ),
+            "/KEY/json/WPOSInformationTime/1/5/",
+        )
+
+    def test_record_replay(self):
+        with mock.patch.multiple(upstream, MODE="record", FIXTURES=self.fixtures):
+            recorded = upstream.get(self.url, "test")
+        for filename in os.listdir(self.fixtures):
+            with open(os.path.join(self.fixtures, filename), "rb") as fixture_file:
+                self.assertNotIn(b"KEY=benchmark", fixture_file.read(), "인증키가 남음")
+
+        with mock.patch.multiple(
+            upstream, MODE="replay", FIXTURES=self.fixtures, REPLAY_TIMING=False
+        ):
+            replayed = upstream.get(self.other_url, "test")
+            self.assertEqual(replayed.content, recorded.content, "기록과 다름")
+            self.assertEqual(replayed.status_code, 200)
+            with self.assertRaises(upstream.Error):  # 기록되지 않은 요청
+                upstream.get(self.url.replace("20200601", "20200602"), "test")
+
+
+class UpstreamRedactTests(unittest.TestCase):
+    def assertRedacted(self, output):
+        text = "\n".join(output)
+        self.assertIn("Failed", text)
+        self.assertNotIn("benchmark", text, "인증키가 로그에 남음")
+
+    # 응답 오류 메시지의 URL에서 인증키를 지우며, 파서가 남기는 로그도 마찬가지
+    def test_http_error(self):
+        with mock.patch.object(
+            stub_upstream, "respond", lambda url: (500, "text/plain", b"Error")
+        ), self.assertLogs("crumbs", level="ERROR") as logs:
+            with self.assertRaises(ConnectionError):
+                menu_parser.parse_range(
+                    datetime.date(2020, 6, 1), datetime.date(2020, 6, 5), "test", False
+                )
+        self.assertRedacted(logs.output)
+
+    # 경로에 인증키가 들어간 서버(서울 열린데이터광장)의 연결 실패
+    def test_connection_error(self):
+        def fail(url):
+            raise upstream.Error("Max retries exceeded with url: %s" % url)
+
+        with mock.patch.object(stub_upstream, "respond", fail), self.assertLogs(
+            "crumbs", level="ERROR"
+        ) as logs:
+            with self.assertRaises(ConnectionError):
+                water_temp_parser.get("test", False)
+        self.assertRedacted(logs.output)
+
+
+class ParseItemTests(unittest.TestCase):
+    item = {
+        "DDISH_NM": "현미밥<br/>돼지고기김치찌개9.10.13.<br/>닭갈비5.6.13.15.<br/>우유2.",
+        "CAL_INFO": "812.4 Kcal",
+    }
+
+    def parse(self):
+        with mock.patch.object(menu_parser, "DELICIOUS", ["닭갈비"]):
+            return menu_parser.parse_item(self.item, datetime.date(2020, 6, 1))
+
+    # 알레르기 정보는 n번 비트가 n번 식품인 비트마스크로 저장
+    def test_bitmask(self):
+        data = self.parse()
+        self.assertEqual(data["date"], "2020-06-01(월)")
+        self.assertEqual(data["kcal"], 812.4)
+        self.assertEqual(
+            data["menu"],
+            [
+                ["현미밥", 0],
+                ["돼지고기김치찌개", 1 << 9 | 1 << 10 | 1 << 13],
+                ["⭐닭갈비", 1 << 5 | 1 << 6 | 1 << 13 | 1 << 15],
+                ["우유", 1 << 2],
+            ],
+        )
+
+    # 사용자 설정(AllergyInfo)별 메뉴를 미리 만들어 둠
+    def test_rendered(self):
+        rendered = self.parse()["rendered"]
+        self.assertEqual(rendered["None"], "현미밥\n돼지고기김치찌개\n⭐닭갈비\n우유")
+        self.assertEqual(
+            rendered["Number"],
+            "현미밥\n돼지고기김치찌개(9, 10, 13)\n⭐닭갈비(5, 6, 13, 15)\n우유(2)",
+        )
+        self.assertEqual(
+            rendered["FullText"],
+            "현미밥\n돼지고기김치찌개(새우, 돼지고기, 아황산류)"
+            "\n⭐닭갈비(대두, 밀, 아황산류, 닭고기)\n우유(우유)",
+        )
+
+    # 비트마스크와 번호 표시가 같은 정보를 담음
+    def test_bitmask_matches_numbers(self):
+        data = self.parse()
+        for (name, allergens), line in zip(
+            data["menu"], data["rendered"]["Number"].split("\n")
+        ):
+            numbers = [
+                bit for bit in range(len(menu_parser.ALLERGENS)) if allergens >> bit & 1
+            ]
+            expected = (
+                "%s(%s)" % (name, ", ".join(map(str, numbers))) if numbers else name
+            )
+            self.assertEqual(line, expected)
+
+
+class RenderCacheTests(unittest.TestCase):
+    def setUp(self):
+        run.purge_cache()
+        self.client = application.app.test_client()
+
+    def post(self):
+        response = self.client.post(
+            "/skill/",
+            json=run.skill_body("Meal"),
+            headers={"X-HDMeal-Token": run.TOKEN},
+        )
+        self.assertEqual(response.status_code, 200, "비 정상 응답")
+        return response.data
+
+    # 캐시 항목이 없을 때(스탬프가 None) 만든 응답은 저장하지 않음
+    def test_put_skipped_without_stamp(self):
+        self.post()
+        self.assertEqual(render_cache.stats()["size"], 0, "스탬프 없이 저장됨")
+
+        key = ("Skill", "Meal", "test")
+        render_cache.put(key, (1, None), b"body")
+        self.assertIsNone(render_cache.get(key, (1, None)), "스탬프 없이 저장됨")
+
+    # 캐시 항목이 그대로면 저장해둔 본문을, 새로 쓰이면 다시 만든 본문을 보냄
+    def test_invalidated_by_stamp(self):
+        self.post()  # 급식 캐시 채우기
+        body = self.post()
+        self.assertEqual(render_cache.stats()["size"], 1, "응답이 저장되지 않음")
+        hits = render_cache.stats()["hit"]
+        self.assertEqual(self.post(), body, "저장된 응답과 다름")
+        self.assertEqual(
+            render_cache.stats()["hit"], hits + 1, "저장된 응답을 쓰지 않음"
+        )
+
+        meal = cache_store.read("meal", run.DATE)
+        stamp = cache_store.stamp("meal", run.DATE)
+        meal["rendered"]["Number"] = "새로 쓴 메뉴"
+        cache_store.write("meal", run.DATE, meal)
+        self.assertNotEqual(
+            cache_store.stamp("meal", run.DATE), stamp, "스탬프가 그대로임"
+        )
+
+        invalidated = render_cache.stats()["invalidated"]
+        rebuilt = self.post()
+        self.assertNotEqual(rebuilt, body, "응답을 다시 만들지 않음")
+        self.assertIn(
+            "새로 쓴 메뉴", rebuilt.decode("utf-8"), "새 캐시 항목이 반영되지 않음"
+        )
+        self.assertEqual(
+            render_cache.stats()["invalidated"], invalidated + 1, "무효화되지 않음"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()